@@ -0,0 +1,42 @@
+"""add intro video and medical document hashes
+
+Revision ID: a6c8e0f2b4d7
+Revises: f4b6d8e0a2c5
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "a6c8e0f2b4d7"
+down_revision: Union[str, None] = "f4b6d8e0a2c5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MEDIA = ("intro_video", "medical_documents")
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("profiles")}
+    for media in MEDIA:
+        if f"{media}_hash" not in columns:
+            op.add_column("profiles", sa.Column(f"{media}_hash", sa.String(length=64), nullable=True))
+        op.execute(
+            f"UPDATE profiles SET {media}_hash = encode(sha256({media}_data), 'hex') "
+            f"WHERE {media}_data IS NOT NULL AND {media}_hash IS NULL"
+        )
+        # Uncompressed out-of-line storage lets ranged reads fetch only the chunks they need.
+        op.execute(f"ALTER TABLE profiles ALTER COLUMN {media}_data SET STORAGE EXTERNAL")
+        # The setting only applies to values written from now on. Concatenation
+        # builds a fresh value, so compressed ones are stored again uncompressed
+        # (pg_column_compression needs PostgreSQL 14).
+        op.execute(
+            f"UPDATE profiles SET {media}_data = {media}_data || ''::bytea "
+            f"WHERE pg_column_compression({media}_data) IS NOT NULL"
+        )
+
+
+def downgrade() -> None:
+    for media in MEDIA:
+        op.execute(f"ALTER TABLE profiles ALTER COLUMN {media}_data SET STORAGE EXTENDED")
+        op.drop_column("profiles", f"{media}_hash")
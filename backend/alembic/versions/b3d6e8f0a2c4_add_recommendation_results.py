@@ -0,0 +1,37 @@
+"""add recommendation results
+
+Revision ID: b3d6e8f0a2c4
+Revises: f2a7c8d9e1b0
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "b3d6e8f0a2c4"
+down_revision: Union[str, None] = "f2a7c8d9e1b0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table("recommendation_results"):
+        op.create_table(
+            "recommendation_results",
+            sa.Column("user_id", sa.String(), nullable=False),
+            sa.Column("generation", sa.BigInteger(), nullable=False),
+            sa.Column("model_version", sa.Text(), nullable=False),
+            sa.Column("query_fingerprint", sa.String(length=64), nullable=False),
+            sa.Column("results", sa.JSON(), nullable=False),
+            sa.Column("computed_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("user_id"),
+        )
+        op.create_index(
+            "ix_recommendation_results_generation", "recommendation_results", ["generation"]
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_recommendation_results_generation", table_name="recommendation_results")
+    op.drop_table("recommendation_results")
@@ -0,0 +1,32 @@
+"""add NID image hashes
+
+Revision ID: b8d0f2a4c6e9
+Revises: a6c8e0f2b4d7
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "b8d0f2a4c6e9"
+down_revision: Union[str, None] = "a6c8e0f2b4d7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MEDIA = ("nid_image", "nid_back_image")
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}
+    for media in MEDIA:
+        if f"{media}_hash" not in columns:
+            op.add_column("users", sa.Column(f"{media}_hash", sa.String(length=64), nullable=True))
+        op.execute(
+            f"UPDATE users SET {media}_hash = encode(sha256({media}_data), 'hex') "
+            f"WHERE {media}_data IS NOT NULL AND {media}_hash IS NULL"
+        )
+
+
+def downgrade() -> None:
+    for media in MEDIA:
+        op.drop_column("users", f"{media}_hash")
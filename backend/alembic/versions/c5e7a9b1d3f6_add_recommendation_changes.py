@@ -0,0 +1,29 @@
+"""add recommendation changes
+
+Revision ID: c5e7a9b1d3f6
+Revises: b3d6e8f0a2c4
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "c5e7a9b1d3f6"
+down_revision: Union[str, None] = "b3d6e8f0a2c4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table("recommendation_changes"):
+        # No foreign key: removed users must stay queued so their rows leave the model.
+        op.create_table(
+            "recommendation_changes",
+            sa.Column("user_id", sa.String(), nullable=False),
+            sa.Column("changed_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+            sa.PrimaryKeyConstraint("user_id"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("recommendation_changes")
@@ -0,0 +1,34 @@
+"""add recommendation training progress
+
+Revision ID: d8f0b2c4e6a9
+Revises: c5e7a9b1d3f6
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "d8f0b2c4e6a9"
+down_revision: Union[str, None] = "c5e7a9b1d3f6"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {
+        column["name"] for column in sa.inspect(op.get_bind()).get_columns("recommendation_training_state")
+    }
+    if "progress" not in columns:
+        op.add_column("recommendation_training_state", sa.Column("progress", sa.Text(), nullable=True))
+    if "phase_timings" not in columns:
+        op.add_column("recommendation_training_state", sa.Column("phase_timings", sa.JSON(), nullable=True))
+    if "peak_memory_bytes" not in columns:
+        op.add_column(
+            "recommendation_training_state", sa.Column("peak_memory_bytes", sa.BigInteger(), nullable=True)
+        )
+
+
+def downgrade() -> None:
+    op.drop_column("recommendation_training_state", "peak_memory_bytes")
+    op.drop_column("recommendation_training_state", "phase_timings")
+    op.drop_column("recommendation_training_state", "progress")
@@ -0,0 +1,28 @@
+"""add profile picture hash
+
+Revision ID: e5a7c9d1f3b8
+Revises: d8f0b2c4e6a9
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "e5a7c9d1f3b8"
+down_revision: Union[str, None] = "d8f0b2c4e6a9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("profiles")}
+    if "profile_picture_hash" not in columns:
+        op.add_column("profiles", sa.Column("profile_picture_hash", sa.String(length=64), nullable=True))
+    op.execute(
+        "UPDATE profiles SET profile_picture_hash = encode(sha256(profile_picture_data), 'hex') "
+        "WHERE profile_picture_data IS NOT NULL AND profile_picture_hash IS NULL"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("profiles", "profile_picture_hash")
@@ -0,0 +1,35 @@
+"""add profile picture variants
+
+Revision ID: f4b6d8e0a2c5
+Revises: e5a7c9d1f3b8
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "f4b6d8e0a2c5"
+down_revision: Union[str, None] = "e5a7c9d1f3b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table("profile_picture_variants"):
+        op.create_table(
+            "profile_picture_variants",
+            sa.Column("user_id", sa.String(), nullable=False),
+            sa.Column("size", sa.String(length=16), nullable=False),
+            sa.Column("source_hash", sa.String(length=64), nullable=False),
+            sa.Column("content_type", sa.String(), nullable=False),
+            sa.Column("width", sa.Integer(), nullable=False),
+            sa.Column("height", sa.Integer(), nullable=False),
+            sa.Column("data", sa.LargeBinary(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("user_id", "size"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("profile_picture_variants")
@@ -22,6 +22,15 @@ class Settings:
     EMAIL_VERIFICATION_PIN_TTL_MINUTES = int(os.getenv("EMAIL_VERIFICATION_PIN_TTL_MINUTES", "5"))
     EMAIL_VERIFICATION_MAX_ATTEMPTS = int(os.getenv("EMAIL_VERIFICATION_MAX_ATTEMPTS", "3"))
     EMAIL_VERIFICATION_RESEND_COOLDOWN_SECONDS = int(os.getenv("EMAIL_VERIFICATION_RESEND_COOLDOWN_SECONDS", "60"))
+    # Candidate retrieval backend for published recommendation models: brute, balltree or ivfpq.
+    RECOMMENDATION_INDEX = os.getenv("RECOMMENDATION_INDEX", "brute")
+    # Lowest recall@10 against brute force at which an approximate index is published.
+    RECOMMENDATION_INDEX_MIN_RECALL = float(os.getenv("RECOMMENDATION_INDEX_MIN_RECALL", "0.9"))
+    # Engine behind services.recommendation_service: "v2" or the notebook "knn" model.
+    LEGACY_RECOMMENDATION_ENGINE = os.getenv("LEGACY_RECOMMENDATION_ENGINE", "v2")
+    # Where uploaded media bytes are written: "database" or the content-addressed "local" store.
+    MEDIA_STORE = os.getenv("MEDIA_STORE", "database")
+    MEDIA_ROOT = os.getenv("MEDIA_ROOT", "media")
 
 class DevSettings(Settings):
     """Development settings class"""
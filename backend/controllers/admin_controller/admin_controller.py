@@ -169,6 +169,17 @@ async def get_admin_stats(
         "verification_rate": round((verified_users / total_users * 100), 2) if total_users > 0 else 0
     }
 
+@router.get("/recommendations/engine")
+async def get_recommendation_engine_status(
+    current_admin: User = Depends(get_current_admin_user)
+):
+    """
+    Admin endpoint to inspect the resident recommendation model
+    """
+    from services.recommendation_service_v2 import engine_status
+
+    return engine_status()
+
 @router.get("/reports", response_model=AdminReportsListResponse)
 async def get_admin_reports(
     skip: int = 0,
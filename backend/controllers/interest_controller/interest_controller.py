@@ -11,7 +11,6 @@ from repositories.block_repository import BlockRepository
 from shared.token import get_current_user
 from models.user.user import User
 from typing import Optional
-import base64
 
 router = APIRouter()
 
@@ -142,23 +141,13 @@ async def get_received_interests(
                 continue
             sender_profile = ProfileRepository.get_by_user_id(db, interest.from_user_id)
             
-            # Convert profile picture to base64 if exists
-            profile_picture_base64 = None
-            if sender_profile and sender_profile.profile_picture_data:
-                try:
-                    encoded = base64.b64encode(sender_profile.profile_picture_data).decode('utf-8')
-                    content_type = sender_profile.profile_picture_content_type or "image/jpeg"
-                    profile_picture_base64 = f"data:{content_type};base64,{encoded}"
-                except Exception as e:
-                    print(f"Error encoding profile picture: {e}")
-            
             interest_dict = interest.to_dict()
             interest_dict["from_user"] = {
                 "id": sender.id,
                 "name": sender.name,
                 "age": sender.age,
                 "religion": sender.religion,
-                "profile_picture": profile_picture_base64
+                "profile_picture": sender_profile.profile_picture_url("avatar") if sender_profile else None
             }
             result.append(interest_dict)
         
@@ -189,23 +178,13 @@ async def get_sent_interests(
                 continue
             recipient_profile = ProfileRepository.get_by_user_id(db, interest.to_user_id)
             
-            # Convert profile picture to base64 if exists
-            profile_picture_base64 = None
-            if recipient_profile and recipient_profile.profile_picture_data:
-                try:
-                    encoded = base64.b64encode(recipient_profile.profile_picture_data).decode('utf-8')
-                    content_type = recipient_profile.profile_picture_content_type or "image/jpeg"
-                    profile_picture_base64 = f"data:{content_type};base64,{encoded}"
-                except Exception as e:
-                    print(f"Error encoding profile picture: {e}")
-            
             interest_dict = interest.to_dict()
             interest_dict["to_user"] = {
                 "id": recipient.id,
                 "name": recipient.name,
                 "age": recipient.age,
                 "religion": recipient.religion,
-                "profile_picture": profile_picture_base64
+                "profile_picture": recipient_profile.profile_picture_url("avatar") if recipient_profile else None
             }
             result.append(interest_dict)
         
@@ -432,16 +411,6 @@ async def get_matches(
                 f"user_exists={other_user is not None} profile_exists={other_profile is not None}"
             )
             
-            # Convert profile picture to base64 if exists
-            profile_picture_base64 = None
-            if other_profile and other_profile.profile_picture_data:
-                try:
-                    encoded = base64.b64encode(other_profile.profile_picture_data).decode('utf-8')
-                    content_type = other_profile.profile_picture_content_type or "image/jpeg"
-                    profile_picture_base64 = f"data:{content_type};base64,{encoded}"
-                except Exception as e:
-                    print(f"Error encoding profile picture: {e}")
-            
             match_dict = interest.to_dict()
             nid_verified = other_user.verification_status == "verified"
             photo_verified = other_user.matching_percentage is not None and other_user.matching_percentage >= 70
@@ -451,7 +420,7 @@ async def get_matches(
                 "name": other_user.name,
                 "age": other_user.age,
                 "religion": other_user.religion,
-                "profile_picture": profile_picture_base64,
+                "profile_picture": other_profile.profile_picture_url("card") if other_profile else None,
                 "verification_status": other_user.verification_status,
                 "matching_percentage": other_user.matching_percentage,
                 "nid_verified": nid_verified,
@@ -7,7 +7,6 @@ from repositories.user_repository.user_repository import UserRepository
 from repositories.profile_repository.profile_repository import ProfileRepository
 from shared.token import get_current_user
 from models.user.user import User
-import base64
 
 router = APIRouter()
 
@@ -32,21 +31,11 @@ async def get_notifications(
                 from_profile = ProfileRepository.get_by_user_id(db, notification.from_user_id)
                 
                 if from_user:
-                    # Convert profile picture to base64 if exists
-                    profile_picture_base64 = None
-                    if from_profile and from_profile.profile_picture_data:
-                        try:
-                            encoded = base64.b64encode(from_profile.profile_picture_data).decode('utf-8')
-                            content_type = from_profile.profile_picture_content_type or "image/jpeg"
-                            profile_picture_base64 = f"data:{content_type};base64,{encoded}"
-                        except Exception as e:
-                            print(f"Error encoding profile picture: {e}")
-                    
                     notif_dict["from_user"] = {
                         "id": from_user.id,
                         "name": from_user.name,
                         "age": from_user.age,
-                        "profile_picture": profile_picture_base64
+                        "profile_picture": from_profile.profile_picture_url("avatar") if from_profile else None
                     }
             
             result.append(notif_dict)
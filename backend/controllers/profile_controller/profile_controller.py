@@ -1,14 +1,20 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, Depends, HTTPException, status, Header
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import FileResponse, JSONResponse, Response
 from pydantic import BaseModel
 from typing import Optional, List
 from database import get_db
 from repositories.profile_repository.profile_repository import ProfileRepository
 from repositories.block_repository import BlockRepository
 from shared.token import Token
+from services.profile_picture_variants import PICTURE_VARIANTS, schedule_variants
+from services.media_store import stored_path
+from shared.media_response import blob_chunks, file_response, ranged_response
+from shared.http_cache import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, etag_matches, strong_etag
 from models.profile.profile import Profile
 from models.user.user import User
+from models.profile_picture_variant import ProfilePictureVariant
 import json
 import base64
 import re
@@ -294,6 +300,7 @@ async def create_profile(
 
         # Create profile
         profile = ProfileRepository.create(db, user_id, **profile_dict)
+        schedule_variants(user_id, profile.profile_picture_hash)
 
         return JSONResponse(
             content={
@@ -413,7 +420,10 @@ async def update_profile(
                 user.religion = religion
 
         # Update profile
+        previous_picture_hash = profile.profile_picture_hash
         updated_profile = ProfileRepository.update(db, profile, **profile_dict)
+        if updated_profile.profile_picture_hash != previous_picture_hash:
+            schedule_variants(user_id, updated_profile.profile_picture_hash)
         
         return JSONResponse(
             content={
@@ -499,19 +509,73 @@ async def get_profile_by_user_id(
 @router.get("/profile/picture/{user_id}")
 async def get_profile_picture(
     user_id: str,
+    v: Optional[str] = None,
+    size: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Get profile picture for a user"""
+    """Get profile picture for a user
+
+    ``size`` selects a rendered variant (avatar, card or full); the original
+    upload is served without it, and also while the variant is still being
+    rendered. The ETag is the picture's content hash. URLs carrying the
+    current hash as ``v`` are cached as immutable; a revalidation that still
+    matches is answered with 304 without reading the image.
+    """
     try:
-        profile = ProfileRepository.get_by_user_id(db, user_id)
+        if size is not None and size not in PICTURE_VARIANTS:
+            raise HTTPException(status_code=400, detail=f"Unknown picture size: {size}")
+
+        picture = db.query(Profile.profile_picture_hash, Profile.profile_picture_content_type).filter(
+            Profile.user_id == user_id
+        ).first()
         
-        if not profile or not profile.profile_picture_data:
+        if not picture or not picture.profile_picture_hash:
             raise HTTPException(status_code=404, detail="Profile picture not found")
         
-        return Response(
-            content=profile.profile_picture_data,
-            media_type=profile.profile_picture_content_type or "image/jpeg"
-        )
+        variant = None
+        if size is not None:
+            variant = db.query(ProfilePictureVariant.content_type).filter(
+                ProfilePictureVariant.user_id == user_id,
+                ProfilePictureVariant.size == size,
+                ProfilePictureVariant.source_hash == picture.profile_picture_hash,
+            ).first()
+        
+        # A pending variant falls back to the original, which must not be cached as the variant.
+        immutable = v == picture.profile_picture_hash and (size is None or variant is not None)
+        etag = strong_etag(picture.profile_picture_hash if variant is None else f"{picture.profile_picture_hash}-{size}")
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL,
+        }
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        
+        # The bytes must belong to the hash the ETag was built from; a picture
+        # replaced in between is reported missing rather than cached under the old URL.
+        if variant is not None:
+            data = db.query(ProfilePictureVariant.data).filter(
+                ProfilePictureVariant.user_id == user_id,
+                ProfilePictureVariant.size == size,
+                ProfilePictureVariant.source_hash == picture.profile_picture_hash,
+            ).scalar()
+            media_type = variant.content_type
+        else:
+            current = db.query(Profile.profile_picture_data).filter(
+                Profile.user_id == user_id, Profile.profile_picture_hash == picture.profile_picture_hash
+            ).first()
+            if current is None:
+                raise HTTPException(status_code=404, detail="Profile picture not found")
+            data = current.profile_picture_data
+            media_type = picture.profile_picture_content_type or "image/jpeg"
+            if not data:
+                path = stored_path(picture.profile_picture_hash)
+                if path is not None:
+                    return FileResponse(path, media_type=media_type, headers=headers)
+        if not data:
+            raise HTTPException(status_code=404, detail="Profile picture not found")
+        
+        return Response(content=data, media_type=media_type, headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -519,21 +583,63 @@ async def get_profile_picture(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _stored_media_response(
+    db: Session,
+    user_id: str,
+    data_column,
+    hash_column,
+    content_type_column,
+    default_content_type: str,
+    not_found: str,
+    range_header: Optional[str],
+    if_range: Optional[str],
+    if_none_match: Optional[str],
+):
+    """Stream one profile media item, honouring Range, If-Range and If-None-Match
+
+    Content still in the row is read in chunks; content moved to the media
+    store is served from its file.
+    """
+    media = db.query(
+        hash_column.label("hash"), content_type_column.label("content_type"), func.length(data_column).label("size")
+    ).filter(Profile.user_id == user_id).first()
+    
+    if not media or not media.hash:
+        raise HTTPException(status_code=404, detail=not_found)
+    
+    etag = strong_etag(media.hash)
+    media_type = media.content_type or default_content_type
+    if not media.size:
+        path = stored_path(media.hash)
+        if path is None:
+            raise HTTPException(status_code=404, detail=not_found)
+        return file_response(path, etag, media_type, range_header, if_range, if_none_match)
+    
+    criteria = (Profile.user_id == user_id, hash_column == media.hash)
+    return ranged_response(
+        lambda start, end: blob_chunks(data_column, criteria, start, end),
+        size=media.size,
+        etag=etag,
+        media_type=media_type,
+        range_header=range_header,
+        if_range=if_range,
+        if_none_match=if_none_match,
+    )
+
+
 @router.get("/profile/video/{user_id}")
 async def get_intro_video(
     user_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Get intro video for a user"""
+    """Stream intro video for a user; Range requests let players seek"""
     try:
-        profile = ProfileRepository.get_by_user_id(db, user_id)
-        
-        if not profile or not profile.intro_video_data:
-            raise HTTPException(status_code=404, detail="Intro video not found")
-        
-        return Response(
-            content=profile.intro_video_data,
-            media_type=profile.intro_video_content_type or "video/mp4"
+        return _stored_media_response(
+            db, user_id, Profile.intro_video_data, Profile.intro_video_hash, Profile.intro_video_content_type,
+            "video/mp4", "Intro video not found", range_header, if_range, if_none_match
         )
     except HTTPException:
         raise
@@ -545,18 +651,17 @@ async def get_intro_video(
 @router.get("/profile/documents/{user_id}")
 async def get_medical_documents(
     user_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Get medical documents for a user"""
+    """Stream medical documents for a user; Range requests let viewers fetch pages on demand"""
     try:
-        profile = ProfileRepository.get_by_user_id(db, user_id)
-        
-        if not profile or not profile.medical_documents_data:
-            raise HTTPException(status_code=404, detail="Medical documents not found")
-        
-        return Response(
-            content=profile.medical_documents_data,
-            media_type=profile.medical_documents_content_type or "application/pdf"
+        return _stored_media_response(
+            db, user_id, Profile.medical_documents_data, Profile.medical_documents_hash,
+            Profile.medical_documents_content_type, "application/pdf", "Medical documents not found",
+            range_header, if_range, if_none_match
         )
     except HTTPException:
         raise
@@ -645,15 +750,6 @@ async def browse_users(
                 elif received_interest.status == "accepted":
                     interest_status = "accepted"
             
-            # Convert profile picture to base64 if exists
-            profile_picture_base64 = None
-            if profile and profile.profile_picture_data:
-                try:
-                    encoded = base64.b64encode(profile.profile_picture_data).decode('utf-8')
-                    content_type = profile.profile_picture_content_type or "image/jpeg"
-                    profile_picture_base64 = f"data:{content_type};base64,{encoded}"
-                except Exception as e:
-                    print(f"Error encoding profile picture: {e}")
             
             nid_verified = user.verification_status == "verified"
             photo_verified = user.matching_percentage is not None and user.matching_percentage >= 70
@@ -668,7 +764,7 @@ async def browse_users(
                 "location": profile.location if profile else None,
                 "profession": profile.profession if profile else None,
                 "academic_background": profile.academic_background if profile else None,
-                "profile_picture": profile_picture_base64,
+                "profile_picture": profile.profile_picture_url("card") if profile else None,
                 "interest_status": interest_status,
                 "verification_status": user.verification_status,
                 "matching_percentage": user.matching_percentage,
@@ -730,7 +826,9 @@ async def get_recommendations(
         print(f"[RECOMMENDATIONS] Current user ID: {current_user_id}")
 
         from repositories.interest_repository.interest_repository import InterestRepository
-        from services.recommendation_service_v2 import get_recommendations as ml_recommend, is_ready
+        from services.recommendation_service_v2 import (
+            add_match_explanations, get_recommendations as ml_recommend, is_ready,
+        )
         blocked_ids = BlockRepository.get_blocked_user_ids(db, current_user_id)
 
         print("[RECOMMENDATIONS] Checking if ML model is ready...")
@@ -738,8 +836,7 @@ async def get_recommendations(
 
         # Get ML-ranked user_id list (or None if user not in model index) - fetch more for pagination
         ranked_matches = ml_recommend(current_user_id, db, top_n=100) if ml_ready else None
-        reasons_by_id = {item["user_id"]: item["reason_tags"] for item in (ranked_matches or [])}
-        explanations_by_id = {item["user_id"]: item.get("match_explanation") for item in (ranked_matches or [])}
+        matches_by_id = {item["user_id"]: item for item in (ranked_matches or [])}
         ranked_ids = [item["user_id"] for item in ranked_matches] if ranked_matches else None
         print(f"[RECOMMENDATIONS] ML ready: {ml_ready}, Ranked IDs count: {len(ranked_ids) if ranked_ids else 0}")
 
@@ -769,7 +866,11 @@ async def get_recommendations(
         total_count = len(ranked_ids)
         offset = (page - 1) * limit
         paginated_ids = ranked_ids[offset:offset + limit]
-        
+
+        # Explanations are only built for the page being returned.
+        page_matches = [matches_by_id[uid] for uid in paginated_ids if uid in matches_by_id]
+        add_match_explanations(current_user_id, db, page_matches)
+
         result = []
         print(f"[RECOMMENDATIONS] Processing {len(paginated_ids)} user IDs from page {page}...")
         for uid in paginated_ids:
@@ -797,15 +898,6 @@ async def get_recommendations(
                 elif received_interest.status == "accepted":
                     interest_status = "accepted"
 
-            # Profile picture
-            profile_picture_base64 = None
-            if profile and profile.profile_picture_data:
-                try:
-                    encoded = base64.b64encode(profile.profile_picture_data).decode('utf-8')
-                    content_type = profile.profile_picture_content_type or "image/jpeg"
-                    profile_picture_base64 = f"data:{content_type};base64,{encoded}"
-                except Exception as e:
-                    print(f"Error encoding profile picture: {e}")
 
             nid_verified = user.verification_status == "verified"
             photo_verified = user.matching_percentage is not None and user.matching_percentage >= 70
@@ -819,7 +911,7 @@ async def get_recommendations(
                 "location": profile.location if profile else None,
                 "profession": profile.profession if profile else None,
                 "academic_background": profile.academic_background if profile else None,
-                "profile_picture": profile_picture_base64,
+                "profile_picture": profile.profile_picture_url("card") if profile else None,
                 "interest_status": interest_status,
                 "verification_status": user.verification_status,
                 "matching_percentage": user.matching_percentage,
@@ -840,8 +932,8 @@ async def get_recommendations(
                 "preferred_age_max": profile.preferred_age_max if profile else None,
                 "living_with_in_laws": profile.living_with_in_laws if profile else None,
                 "willing_to_relocate": profile.willing_to_relocate if profile else None,
-                "recommendation_reasons": reasons_by_id.get(user.id, []),
-                "match_explanation": explanations_by_id.get(user.id)
+                "recommendation_reasons": matches_by_id.get(user.id, {}).get("reason_tags", []),
+                "match_explanation": matches_by_id.get(user.id, {}).get("match_explanation")
             })
 
         has_more = (offset + len(result)) < total_count
@@ -870,6 +962,31 @@ async def get_recommendations(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/users/recommendations/{user_id}/explanation")
+async def get_recommendation_explanation(
+    user_id: str,
+    authorization: str = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Explain why a user is recommended to the current user, built on demand."""
+    try:
+        current_user_id = get_current_user_id(authorization, db)
+        from services.recommendation_service_v2 import get_match_explanation
+
+        if user_id == current_user_id or user_id in BlockRepository.get_blocked_user_ids(db, current_user_id):
+            raise HTTPException(status_code=404, detail="No recommendation explanation for this user")
+        explanation = get_match_explanation(current_user_id, user_id, db)
+        if explanation is None:
+            raise HTTPException(status_code=404, detail="No recommendation explanation for this user")
+        return JSONResponse(content={"user_id": user_id, "match_explanation": explanation}, status_code=200)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"[RECOMMENDATIONS ERROR] {type(e).__name__}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/users/{user_id}/profile/full")
 async def get_full_profile(
     user_id: str,
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from controllers.profile_controller import profile_controller
+from controllers.profile_controller.profile_controller import get_profile_picture, get_recommendation_explanation
+from database import Base
+from models.profile.profile import Profile
+from models.profile_picture_variant import ProfilePictureVariant
+from repositories.block_repository import BlockRepository
+from services import recommendation_service_v2
+from shared.http_cache import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL
+
+
+@pytest.fixture
+def db(tmp_path):
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'profiles.db'}")
+    Base.metadata.create_all(test_engine, tables=[Profile.__table__, ProfilePictureVariant.__table__])
+    session = sessionmaker(bind=test_engine)()
+    session.add(Profile("user-1", profile_picture_data=b"original", profile_picture_content_type="image/png"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _picture(db, **params):
+    params = {"v": None, "size": None, "if_none_match": None, **params}
+    return asyncio.run(get_profile_picture("user-1", db=db, **params))
+
+
+def test_pending_variant_falls_back_to_the_original_without_immutable_caching(db):
+    digest = db.query(Profile.profile_picture_hash).scalar()
+
+    original = _picture(db, v=digest)
+    assert original.body == b"original"
+    assert original.headers["etag"] == f'"{digest}"'
+    assert original.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+
+    pending = _picture(db, v=digest, size="card")
+    assert pending.body == b"original"
+    assert pending.media_type == "image/png"
+    assert pending.headers["etag"] == f'"{digest}"'
+    assert pending.headers["cache-control"] == REVALIDATE_CACHE_CONTROL
+
+    with pytest.raises(HTTPException) as unknown:
+        _picture(db, size="huge")
+    assert unknown.value.status_code == 400
+
+
+def test_matching_revalidation_is_answered_without_reading_the_picture(db):
+    digest = db.query(Profile.profile_picture_hash).scalar()
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    response = _picture(db, v=digest, if_none_match=f'"{digest}"')
+
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == f'"{digest}"'
+    assert statements and not any("profile_picture_data" in statement for statement in statements)
+
+
+def test_variant_has_its_own_etag_and_only_current_variants_are_served(db):
+    digest = db.query(Profile.profile_picture_hash).scalar()
+    db.add(ProfilePictureVariant(
+        user_id="user-1", size="card", source_hash=digest,
+        content_type="image/webp", width=320, height=240, data=b"card",
+    ))
+    db.commit()
+
+    card = _picture(db, v=digest, size="card")
+    assert card.body == b"card"
+    assert card.media_type == "image/webp"
+    assert card.headers["etag"] == f'"{digest}-card"'
+    assert card.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert _picture(db, size="card", if_none_match=f'"{digest}-card"').status_code == 304
+    # The original's ETag does not validate the variant.
+    assert _picture(db, size="card", if_none_match=f'"{digest}"').status_code == 200
+
+    # A variant rendered from a replaced picture is ignored.
+    db.query(ProfilePictureVariant).update({"source_hash": "0" * 64})
+    db.commit()
+    assert _picture(db, size="card").body == b"original"
+
+
+@pytest.mark.parametrize("size", [None, "card"])
+def test_picture_replaced_between_lookup_and_read_is_not_served_under_the_old_etag(db, size):
+    digest = db.query(Profile.profile_picture_hash).scalar()
+    db.add(ProfilePictureVariant(
+        user_id="user-1", size="card", source_hash=digest,
+        content_type="image/webp", width=320, height=240, data=b"card",
+    ))
+    db.commit()
+    bind = db.get_bind()
+    replaced = []
+
+    def replace_before_the_read(conn, cursor, statement, parameters, context, executemany):
+        # Another upload and its re-render commit after the ETag was chosen.
+        if not replaced and statement.lstrip().startswith("SELECT") and (
+            "profile_picture_data" in statement or "profile_picture_variants.data" in statement
+        ):
+            replaced.append(True)
+            with bind.connect() as other:
+                other.exec_driver_sql(
+                    "UPDATE profiles SET profile_picture_hash = 'new', profile_picture_data = x'6e6577'"
+                )
+                other.exec_driver_sql("UPDATE profile_picture_variants SET source_hash = 'new', data = x'6e6577'")
+                other.commit()
+
+    event.listen(bind, "before_cursor_execute", replace_before_the_read)
+    with pytest.raises(HTTPException) as missing:
+        _picture(db, v=digest, size=size)
+    assert replaced and missing.value.status_code == 404
+
+
+def test_recommendation_explanation_is_not_found_for_self_blocked_and_ineligible_users(monkeypatch):
+    explained = []
+
+    def get_match_explanation(current_user_id, candidate_id, db):
+        explained.append(candidate_id)
+        return {"summary": "match"} if candidate_id == "match" else None
+
+    monkeypatch.setattr(profile_controller, "get_current_user_id", lambda authorization, db: "me")
+    monkeypatch.setattr(BlockRepository, "get_blocked_user_ids", staticmethod(lambda db, user_id: {"blocked"}))
+    monkeypatch.setattr(recommendation_service_v2, "get_match_explanation", get_match_explanation)
+
+    def explain(user_id):
+        return asyncio.run(get_recommendation_explanation(user_id, authorization="Bearer token", db=None))
+
+    assert explain("match").status_code == 200
+    for user_id in ("me", "blocked", "ineligible"):
+        with pytest.raises(HTTPException) as missing:
+            explain(user_id)
+        assert missing.value.status_code == 404
+    # Self and blocked users are refused before anything is scored.
+    assert explained == ["match", "ineligible"]
@@ -5,11 +5,13 @@ from datetime import date, datetime, timezone
 from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Response
-from sqlalchemy.orm import Session
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session, undefer
 from database import get_db
 from models.user.user import User
 from models.verification_rejection import VerificationRejection
 from repositories.profile_repository.profile_repository import ProfileRepository
+from services.media_store import read_media, stored_path
 from shared.token import get_current_user, get_current_admin_user
 from pydantic import BaseModel, Field
 import base64
@@ -427,9 +429,9 @@ def _build_pending_user_response(user: User) -> PendingVerificationUserResponse:
         verification_status=_optional_string(getattr(user, "verification_status", None)) or "",
         verification_notes=_optional_string(getattr(user, "verification_notes", None)),
         guardian_verification_status=_optional_string(getattr(user, "guardian_verification_status", None)) or "",
-        has_nid_image=isinstance(getattr(user, "nid_image_data", None), (bytes, bytearray)),
+        has_nid_image=_optional_bool(getattr(user, "has_nid_image", None)) or False,
         nid_image_filename=_optional_string(getattr(user, "nid_image_filename", None)),
-        has_nid_back_image=isinstance(getattr(user, "nid_back_image_data", None), (bytes, bytearray)),
+        has_nid_back_image=_optional_bool(getattr(user, "has_nid_back_image", None)) or False,
         nid_back_image_filename=_optional_string(getattr(user, "nid_back_image_filename", None)),
         created_at=_optional_isoformat(getattr(user, "created_at", None)) or "",
         ocr_name=_optional_string(getattr(user, "ocr_name", None)),
@@ -485,9 +487,9 @@ def _build_status_response(user: User, rejection_notes: Optional[str]) -> Verifi
         ocr_dob_match=comparison_payload["ocr_dob_match"],
         ocr_review_status=comparison_payload["ocr_review_status"],
         admin_review_notes=comparison_payload["admin_review_notes"],
-        has_nid_image=isinstance(getattr(user, "nid_image_data", None), (bytes, bytearray)),
+        has_nid_image=_optional_bool(getattr(user, "has_nid_image", None)) or False,
         nid_image_filename=_optional_string(getattr(user, "nid_image_filename", None)),
-        has_nid_back_image=isinstance(getattr(user, "nid_back_image_data", None), (bytes, bytearray)),
+        has_nid_back_image=_optional_bool(getattr(user, "has_nid_back_image", None)) or False,
         nid_back_image_filename=_optional_string(getattr(user, "nid_back_image_filename", None)),
     )
 
@@ -759,6 +761,16 @@ async def update_ocr_confirmation(
         ocr_confirmed=current_user.ocr_confirmed,
     )
 
+def _nid_image_response(data, digest, content_type, not_found: str) -> Response:
+    """Serve an NID scan from its row, or from the media store once it has been moved there."""
+    media_type = content_type or "image/jpeg"
+    if data:
+        return Response(content=data, media_type=media_type)
+    path = stored_path(digest)
+    if path is None:
+        raise HTTPException(status_code=404, detail=not_found)
+    return FileResponse(path, media_type=media_type)
+
 @router.get("/image")
 async def get_verification_image(
     current_user: User = Depends(get_current_user),
@@ -767,12 +779,9 @@ async def get_verification_image(
     """
     Get the NID image for the current user
     """
-    if not current_user.nid_image_data:
-        raise HTTPException(status_code=404, detail="No NID image found")
-    
-    return Response(
-        content=current_user.nid_image_data,
-        media_type=current_user.nid_image_content_type or "image/jpeg"
+    return _nid_image_response(
+        current_user.nid_image_data, current_user.nid_image_hash,
+        current_user.nid_image_content_type, "No NID image found"
     )
 
 @router.get("/image/{user_id}")
@@ -784,16 +793,15 @@ async def get_user_verification_image(
     """
     Admin endpoint to get NID image for any user
     """
-    user = db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
+    user = db.query(User).options(undefer(User.nid_image_data)).filter(
+        User.id == user_id, User.is_deleted == False
+    ).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if not user.nid_image_data:
-        raise HTTPException(status_code=404, detail="No NID image found for this user")
-    
-    return Response(
-        content=user.nid_image_data,
-        media_type=user.nid_image_content_type or "image/jpeg"
+    return _nid_image_response(
+        user.nid_image_data, user.nid_image_hash,
+        user.nid_image_content_type, "No NID image found for this user"
     )
 
 @router.get("/image-back")
@@ -804,12 +812,9 @@ async def get_verification_back_image(
     """
     Get the NID back-side image for the current user
     """
-    if not current_user.nid_back_image_data:
-        raise HTTPException(status_code=404, detail="No NID back-side image found")
-
-    return Response(
-        content=current_user.nid_back_image_data,
-        media_type=current_user.nid_back_image_content_type or "image/jpeg"
+    return _nid_image_response(
+        current_user.nid_back_image_data, current_user.nid_back_image_hash,
+        current_user.nid_back_image_content_type, "No NID back-side image found"
     )
 
 @router.get("/image-back/{user_id}")
@@ -821,16 +826,15 @@ async def get_user_verification_back_image(
     """
     Admin endpoint to get NID back-side image for any user
     """
-    user = db.query(User).filter(User.id == user_id, User.is_deleted == False).first()
+    user = db.query(User).options(undefer(User.nid_back_image_data)).filter(
+        User.id == user_id, User.is_deleted == False
+    ).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if not user.nid_back_image_data:
-        raise HTTPException(status_code=404, detail="No NID back-side image found for this user")
-
-    return Response(
-        content=user.nid_back_image_data,
-        media_type=user.nid_back_image_content_type or "image/jpeg"
+    return _nid_image_response(
+        user.nid_back_image_data, user.nid_back_image_hash,
+        user.nid_back_image_content_type, "No NID back-side image found for this user"
     )
 
 @router.get("/image-base64")
@@ -841,11 +845,12 @@ async def get_verification_image_base64(
     """
     Get the NID image as base64 encoded string for the current user
     """
-    if not current_user.nid_image_data:
+    image_data = read_media(current_user.nid_image_data, current_user.nid_image_hash)
+    if not image_data:
         raise HTTPException(status_code=404, detail="No NID image found")
     
     # Convert binary data to base64
-    image_base64 = base64.b64encode(current_user.nid_image_data).decode('utf-8')
+    image_base64 = base64.b64encode(image_data).decode('utf-8')
     
     return {
         "image_data": image_base64,
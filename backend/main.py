@@ -14,6 +14,7 @@ from create_db import create_database
 from middlewares import cors_middleware
 from middlewares import static_middleware
 from services.retraining_coordinator import install_session_hooks, watcher
+from services import profile_picture_variants
 
 app = FastAPI()
 
@@ -37,6 +38,7 @@ def start_retraining_watcher():
 @app.on_event("shutdown")
 def stop_retraining_watcher():
     watcher.stop()
+    profile_picture_variants.shutdown()
 
 # Include routers
 app.include_router(auth_controller.router, prefix="/auth", tags=["auth"])
@@ -7,4 +7,7 @@ from models.block import Block
 from models.report import Report
 from models.verification_rejection import VerificationRejection
 from models.recommendation_training_state import RecommendationTrainingState
+from models.recommendation_result import RecommendationResult
+from models.recommendation_change import RecommendationChange
 from models.email_verification_code import EmailVerificationCode
+from models.profile_picture_variant import ProfilePictureVariant
@@ -1,8 +1,9 @@
 import uuid
 from datetime import datetime, timezone
 from sqlalchemy import Column, String, Boolean, Date, DateTime, Integer, Text, Float, ForeignKey, LargeBinary
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, deferred, relationship, validates
 from database import Base
+from services.media_store import store_media
 
 
 class Profile(Base):
@@ -27,10 +28,15 @@ class Profile(Base):
     marital_status = Column(String, nullable=True)
     hobbies = Column(Text, nullable=True)
     
+    # Media bytes are deferred so ordinary profile queries never transfer them,
+    # and are NULL once moved to the media store. Each *_hash is the SHA-256 of
+    # the content wherever it lives; the has_* flags are computed from it in SQL.
     # Intro Video - stored as binary
-    intro_video_data = Column(LargeBinary, nullable=True)
+    intro_video_data = deferred(Column(LargeBinary, nullable=True))
     intro_video_filename = Column(String, nullable=True)
     intro_video_content_type = Column(String, nullable=True)
+    intro_video_hash = Column(String(64), nullable=True)
+    has_intro_video = column_property(intro_video_hash.isnot(None))
     
     # Health Information
     medical_history = Column(Text, nullable=True)
@@ -44,9 +50,11 @@ class Profile(Base):
     disability_description = Column(Text, nullable=True)
     
     # Medical Documents - stored as binary
-    medical_documents_data = Column(LargeBinary, nullable=True)
+    medical_documents_data = deferred(Column(LargeBinary, nullable=True))
     medical_documents_filename = Column(String, nullable=True)
     medical_documents_content_type = Column(String, nullable=True)
+    medical_documents_hash = Column(String(64), nullable=True)
+    has_medical_documents = column_property(medical_documents_hash.isnot(None))
     
     # Physical Attributes
     height = Column(Float, nullable=True)  # in cm
@@ -60,9 +68,11 @@ class Profile(Base):
     interests = Column(Text, nullable=True)
     
     # Profile Picture - stored as binary
-    profile_picture_data = Column(LargeBinary, nullable=True)
+    profile_picture_data = deferred(Column(LargeBinary, nullable=True))
     profile_picture_filename = Column(String, nullable=True)
     profile_picture_content_type = Column(String, nullable=True)
+    # Also versions the picture URL and serves as its ETag
+    profile_picture_hash = Column(String(64), nullable=True)
     
     # Partner and Marriage Preferences
     preferred_age_min = Column(Integer, nullable=True)
@@ -112,6 +122,20 @@ class Profile(Base):
             if hasattr(self, key):
                 setattr(self, key, value)
 
+    @validates("profile_picture_data", "intro_video_data", "medical_documents_data")
+    def _store_media(self, key, value):
+        return store_media(self, key, value)
+
+    def profile_picture_url(self, size=None):
+        """Cacheable picture URL for list responses, or None without a picture
+
+        ``size`` names a rendered variant (avatar, card or full).
+        """
+        if not self.profile_picture_hash:
+            return None
+        url = f"/api/profile/picture/{self.user_id}?v={self.profile_picture_hash}"
+        return f"{url}&size={size}" if size else url
+
     def update_profile(self, **kwargs):
         """Update profile fields"""
         for key, value in kwargs.items():
@@ -129,17 +153,6 @@ class Profile(Base):
 
     def to_dict(self):
         """Convert profile to dictionary"""
-        # Convert profile picture to base64 if exists
-        profile_picture_base64 = None
-        if self.profile_picture_data:
-            try:
-                import base64
-                encoded = base64.b64encode(self.profile_picture_data).decode('utf-8')
-                content_type = self.profile_picture_content_type or "image/jpeg"
-                profile_picture_base64 = f"data:{content_type};base64,{encoded}"
-            except Exception as e:
-                print(f"Error encoding profile picture: {e}")
-        
         return {
             'id': self.id,
             'user_id': self.user_id,
@@ -157,7 +170,7 @@ class Profile(Base):
             'profession': self.profession,
             'marital_status': self.marital_status,
             'hobbies': self.hobbies,
-            'has_intro_video': bool(self.intro_video_data),
+            'has_intro_video': bool(self.has_intro_video),
             'intro_video_filename': self.intro_video_filename,
             'medical_history': self.medical_history,
             'overall_health_status': self.overall_health_status,
@@ -168,7 +181,7 @@ class Profile(Base):
             'fertility_awareness': self.fertility_awareness,
             'disability': self.disability,
             'disability_description': self.disability_description,
-            'has_medical_documents': bool(self.medical_documents_data),
+            'has_medical_documents': bool(self.has_medical_documents),
             'medical_documents_filename': self.medical_documents_filename,
             'height': self.height,
             'weight': self.weight,
@@ -177,8 +190,8 @@ class Profile(Base):
             'alcohol_consumption': self.alcohol_consumption,
             'chronic_illness': self.chronic_illness,
             'interests': self.interests,
-            'has_profile_picture': bool(self.profile_picture_data),
-            'profile_picture': profile_picture_base64,
+            'has_profile_picture': bool(self.profile_picture_hash),
+            'profile_picture': self.profile_picture_url(),
             'profile_picture_filename': self.profile_picture_filename,
             'preferred_age_min': self.preferred_age_min,
             'preferred_age_max': self.preferred_age_max,
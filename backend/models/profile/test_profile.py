@@ -0,0 +1,33 @@
+import hashlib
+
+from models.profile.profile import Profile
+
+
+def test_profile_picture_hash_follows_data():
+    profile = Profile("user-1", profile_picture_data=b"first")
+
+    assert profile.profile_picture_hash == hashlib.sha256(b"first").hexdigest()
+    assert profile.profile_picture_url() == f"/api/profile/picture/user-1?v={profile.profile_picture_hash}"
+    assert profile.profile_picture_url("card").endswith("&size=card")
+
+    profile.update_profile(profile_picture_data=b"second")
+
+    assert profile.profile_picture_hash == hashlib.sha256(b"second").hexdigest()
+
+
+def test_profile_without_picture_has_no_url():
+    profile = Profile("user-1")
+
+    assert profile.profile_picture_url() is None
+    assert profile.to_dict()["profile_picture"] is None
+    assert profile.to_dict()["has_profile_picture"] is False
+
+
+def test_clearing_the_picture_stops_advertising_it():
+    profile = Profile("user-1", profile_picture_data=b"first")
+
+    profile.profile_picture_data = None
+
+    assert profile.profile_picture_hash is None
+    assert profile.profile_picture_url() is None
+    assert profile.to_dict()["profile_picture"] is None
@@ -0,0 +1,25 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, LargeBinary, String
+
+from database import Base
+
+
+class ProfilePictureVariant(Base):
+    """A resized, metadata-free rendition of one user's profile picture."""
+
+    __tablename__ = "profile_picture_variants"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    size = Column(String(16), primary_key=True)
+    # profile_picture_hash of the original it was rendered from; stale when they differ
+    source_hash = Column(String(64), nullable=False)
+    content_type = Column(String, nullable=False)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
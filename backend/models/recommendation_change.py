@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, String
+
+from database import Base
+
+
+class RecommendationChange(Base):
+    """A user whose profile changed since the last published recommendation model."""
+
+    __tablename__ = "recommendation_changes"
+
+    user_id = Column(String, primary_key=True)
+    changed_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKey, JSON, String, Text
+
+from database import Base
+
+
+class RecommendationResult(Base):
+    """Precomputed top-ranked matches for one user and one model generation."""
+
+    __tablename__ = "recommendation_results"
+
+    user_id = Column(String, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    generation = Column(BigInteger, nullable=False, index=True)
+    model_version = Column(Text, nullable=False)
+    query_fingerprint = Column(String(64), nullable=False)
+    results = Column(JSON, nullable=False)
+    computed_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import BigInteger, Column, DateTime, Integer, Text
+from sqlalchemy import BigInteger, Column, DateTime, Integer, JSON, Text
 
 from database import Base
 
@@ -18,6 +18,10 @@ class RecommendationTrainingState(Base):
     started_at = Column(DateTime(timezone=True), nullable=True)
     finished_at = Column(DateTime(timezone=True), nullable=True)
     last_error = Column(Text, nullable=True)
+    # Current phase of the running trainer, its per-phase seconds and peak RSS.
+    progress = Column(Text, nullable=True)
+    phase_timings = Column(JSON, nullable=True)
+    peak_memory_bytes = Column(BigInteger, nullable=True)
     updated_at = Column(
         DateTime(timezone=True),
         nullable=False,
@@ -4,7 +4,9 @@ from datetime import date, datetime, timezone
 from typing import Optional
 
 from sqlalchemy import Column, String, Boolean, Date, DateTime, Text, LargeBinary, Integer, Float, JSON
+from sqlalchemy.orm import column_property, deferred, validates
 from database import Base
+from services.media_store import store_media
 
 
 class User(Base):
@@ -41,12 +43,18 @@ class User(Base):
         timezone.utc), nullable=False)
     
     # NID Verification fields
-    nid_image_data = Column(LargeBinary, nullable=True)  # Binary data of uploaded NID image
+    # Scan bytes are deferred: only the NID image endpoints read them. They are
+    # NULL once moved to the media store; *_hash is the SHA-256 of the content.
+    nid_image_data = deferred(Column(LargeBinary, nullable=True))  # Binary data of uploaded NID image
     nid_image_filename = Column(String, nullable=True)  # Original filename
     nid_image_content_type = Column(String, nullable=True)  # MIME type (image/jpeg, etc.)
-    nid_back_image_data = Column(LargeBinary, nullable=True)
+    nid_image_hash = Column(String(64), nullable=True)
+    has_nid_image = column_property(nid_image_hash.isnot(None))
+    nid_back_image_data = deferred(Column(LargeBinary, nullable=True))
     nid_back_image_filename = Column(String, nullable=True)
     nid_back_image_content_type = Column(String, nullable=True)
+    nid_back_image_hash = Column(String(64), nullable=True)
+    has_nid_back_image = column_property(nid_back_image_hash.isnot(None))
     verification_status = Column(String, default="not_submitted")  # not_submitted, pending, verified, rejected
     verification_notes = Column(Text, nullable=True)  # Additional notes for verification
     verified_at = Column(DateTime, nullable=True)  # When verification was completed
@@ -105,6 +113,10 @@ class User(Base):
         self.email = email
         return self
 
+    @validates("nid_image_data", "nid_back_image_data")
+    def _store_media(self, key, value):
+        return store_media(self, key, value)
+
     def archive(self):
         self.is_archived = True
         return self
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""Benchmark recommender stages on the bundled CSV and synthetic populations.
+
+``normalize`` compares ``normalize_profiles`` with the per-cell baseline.
+``suite`` times training and ranking on synthetic populations, measures
+ranking quality of each retrieval index, and writes a JSON report that a
+later run can be checked against with ``--baseline``.
+"""
+
+import argparse
+import ast
+import json
+import multiprocessing
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy
+import sklearn
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from recommender import (
+    DEFAULT_CSV, INTEREST_COLS, NUMERIC_COLS, RECALL_K, REQUIRED_COLUMNS, CandidatePool, PoolSegment,
+    ProfileStore, _recommendation, _text, build_index, fit_model, normalize_profiles, sort_by_partition,
+    top_k_order, transform_query,
+)
+
+SUITE_SIZES = [1_000, 10_000, 100_000]
+SUITE_VARIANTS = ["brute", "ivfpq"]
+# Latency percentiles reported for every timed stage.
+PERCENTILES = (50, 95, 99)
+# Absolute overlap@k loss against a baseline report that counts as a regression.
+OVERLAP_TOLERANCE = 0.02
+
+
+def synthetic_profiles(count: int, seed: int = 0, csv_path: Path | str = DEFAULT_CSV) -> pd.DataFrame:
+    """Draw ``count`` profiles with the bundled CSV's schema.
+
+    Every column is resampled independently from the CSV, numbers are
+    jittered, a few values go missing, and a long tail of rare locations,
+    professions and interests grows the vocabularies the way a real user
+    base does.
+    """
+    source = pd.read_csv(csv_path)
+    rng = np.random.default_rng(seed)
+    profiles = pd.DataFrame({
+        column: source[column].to_numpy(dtype=object)[rng.integers(0, len(source), count)]
+        for column in source.columns
+    })
+    profiles["user_id"] = np.arange(1, count + 1)
+    profiles["email"] = [f"user{index:07d}@synthetic.test" for index in range(1, count + 1)]
+    for column, spread in (("age", 3), ("height", 6), ("weight", 6)):
+        values = pd.to_numeric(profiles[column], errors="coerce") + rng.integers(-spread, spread + 1, count)
+        values[rng.random(count) < 0.02] = np.nan
+        profiles[column] = values
+    profiles["age"] = profiles["age"].clip(18, 70)
+
+    def long_tail(column: str, label: str, share: float) -> None:
+        rare = rng.random(count) < share
+        ids = rng.zipf(1.5, int(rare.sum())) % max(count // 20, 1)
+        profiles.loc[rare, column] = [f"{label} {value}" for value in ids]
+
+    long_tail("location", "Town", 0.1)
+    long_tail("profession", "Occupation", 0.05)
+    tokens = sorted({
+        item.strip() for column in INTEREST_COLS
+        for value in source[column].dropna() for item in str(value).split(",") if item.strip()
+    })
+    for column in INTEREST_COLS:
+        picks = rng.integers(0, len(tokens), (count, 3))
+        rare = rng.zipf(1.3, count) % max(count // 10, 1)
+        profiles[column] = [
+            ", ".join([tokens[a], tokens[b], tokens[c]] + ([f"interest {r}"] if r > 3 else []))
+            for (a, b, c), r in zip(picks, rare)
+        ]
+    return profiles
+
+
+def reference_normalize_profiles(profiles: pd.DataFrame) -> pd.DataFrame:
+    """The original per-cell implementation of ``normalize_profiles``, kept as the baseline."""
+
+    def parse_list(value):
+        if isinstance(value, list):
+            return [_text(item) for item in value if _text(item) != "unknown"]
+        if value is None or pd.isna(value) or not str(value).strip():
+            return []
+        try:
+            parsed = ast.literal_eval(str(value))
+        except (SyntaxError, ValueError):
+            parsed = []
+        if not isinstance(parsed, list):
+            return []
+        return [_text(item) for item in parsed if _text(item) != "unknown"]
+
+    def interest_tokens(row):
+        tokens = set()
+        for column in INTEREST_COLS:
+            value = row[column]
+            if value is None or pd.isna(value):
+                continue
+            tokens.update(_text(item) for item in str(value).split(",") if item.strip())
+        tokens.discard("unknown")
+        return sorted(tokens)
+
+    result = profiles.copy()
+    result["user_id"] = result["user_id"].astype(str)
+    for column in NUMERIC_COLS + [
+        "preferred_age_min", "preferred_age_max", "preferred_height_min",
+        "preferred_height_max", "preferred_weight_min", "preferred_weight_max",
+    ]:
+        result[column] = pd.to_numeric(result[column], errors="coerce")
+    for column in NUMERIC_COLS:
+        result[column] = result[column].fillna(result[column].median())
+    for column in REQUIRED_COLUMNS - set(NUMERIC_COLS) - {
+        "preferred_age_min", "preferred_age_max", "preferred_height_min",
+        "preferred_height_max", "preferred_weight_min", "preferred_weight_max",
+    }:
+        if column not in {"user_id", "name", "necessary_preferences"}:
+            result[column] = result[column].map(_text)
+    result["name"] = result["name"].fillna("Unknown").astype(str).str.strip()
+    result["necessary_preferences"] = result["necessary_preferences"].map(parse_list)
+    result["genetic_conditions"] = result["genetic_conditions"].map(parse_list)
+    result["interest_tokens"] = result.apply(interest_tokens, axis=1)
+    return result
+
+
+def frames_identical(left: pd.DataFrame, right: pd.DataFrame) -> bool:
+    """Same columns, dtypes and cell values, including the type of every object cell."""
+    if list(left.columns) != list(right.columns) or not left.index.equals(right.index):
+        return False
+    for column in left.columns:
+        a, b = left[column], right[column]
+        if a.dtype != b.dtype:
+            return False
+        if a.dtype != object:
+            if not a.equals(b):
+                return False
+            continue
+        for x, y in zip(a, b):
+            if type(x) is not type(y):
+                return False
+            if isinstance(x, float) and np.isnan(x) and np.isnan(y):
+                continue
+            if x != y:
+                return False
+    return True
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def benchmark_normalize(sizes: list[int], repeat: int = 3, seed: int = 0) -> list[dict]:
+    report = []
+    for size in sizes:
+        profiles = pd.read_csv(DEFAULT_CSV) if size == 0 else synthetic_profiles(size, seed)
+        reference = _best_of(lambda: reference_normalize_profiles(profiles), repeat)
+        current = _best_of(lambda: normalize_profiles(profiles), repeat)
+        report.append({
+            "profiles": len(profiles),
+            "source": "csv" if size == 0 else "synthetic",
+            "reference_seconds": round(reference, 4),
+            "seconds": round(current, 4),
+            "speedup": round(reference / current, 1),
+            "identical": frames_identical(reference_normalize_profiles(profiles), normalize_profiles(profiles)),
+        })
+    return report
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _latency(samples: list[float]) -> dict[str, float]:
+    """Percentiles of ``samples`` (seconds) in milliseconds."""
+    values = np.percentile(np.asarray(samples) * 1000.0, PERCENTILES)
+    return {
+        "count": len(samples),
+        **{f"p{percentile}_ms": round(float(value), 3) for percentile, value in zip(PERCENTILES, values)},
+    }
+
+
+def _timed(func):
+    started = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started
+
+
+def _benchmark_size(size: int, variants: list[str], queries: int, top_k: int, repeat: int, seed: int) -> dict:
+    """Run every suite stage for one synthetic population.
+
+    Runs in its own process, so ``peak_rss_mb`` is this size's high-water
+    mark; each stage records the peak reached by the time it finished.
+    """
+    profiles = sort_by_partition(normalize_profiles(synthetic_profiles(size, seed)))
+    fits = []
+    for _ in range(repeat):
+        (artifact, features), seconds = _timed(lambda: fit_model(profiles))
+        fits.append(seconds)
+    report = {
+        "profiles": size,
+        "feature_count": int(features.shape[1]),
+        "nnz": int(features.nnz),
+        "fit": {**_latency(fits), "peak_rss_mb": _peak_rss_mb()},
+    }
+
+    store = ProfileStore.from_frame(profiles)
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(profiles), min(queries, len(profiles)), replace=False)
+    rows = [profiles.iloc[row] for row in sample]
+    transforms = [_timed(lambda: transform_query(query, artifact))[1] for query in rows]
+    report["transform"] = {**_latency(transforms), "peak_rss_mb": _peak_rss_mb()}
+
+    variant_reports, top_ids = {}, {}
+    for kind in variants:
+        index, build_seconds = _timed(lambda: build_index(features, kind, store.table["partitions"][:, 2:]))
+        pool = CandidatePool([PoolSegment(store, features, index, 0, None)])
+        latencies, strict, returned, ranked = [], 0, 0, []
+        for row, query in zip(sample, rows):
+            vector = features[row].toarray().ravel()
+            scored, rank_seconds = _timed(lambda: pool.rank(query, vector))
+            result, format_seconds = _timed(lambda: _recommendation(pool, query, scored, top_k))
+            latencies.append(rank_seconds + format_seconds)
+            strict += sum(match["strict_compatible"] for match in result["matches"])
+            returned += result["match_count"]
+            order = top_k_order(scored, pool.user_ids[scored["rows"]], max(RECALL_K))
+            ranked.append(pool.user_ids[scored["rows"][order]].tolist())
+        top_ids[kind] = ranked
+        variant_reports[kind] = {
+            "build_seconds": round(build_seconds, 3),
+            "recommend": _latency(latencies),
+            "strict_rate": round(strict / returned, 4) if returned else None,
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+        del pool, index
+
+    reference = variants[0]
+    for kind in variants:
+        overlap = {}
+        for k in RECALL_K:
+            shares = [
+                len(set(found[:k]) & set(expected[:k])) / min(k, len(expected))
+                for found, expected in zip(top_ids[kind], top_ids[reference]) if expected
+            ]
+            overlap[str(k)] = round(float(np.mean(shares)), 4) if shares else None
+        variant_reports[kind][f"overlap_at_k_vs_{reference}"] = overlap
+    report["variants"] = variant_reports
+    report["peak_rss_mb"] = _peak_rss_mb()
+    return report
+
+
+def _regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Compare p95 latencies and overlap against a previous report of the same sizes."""
+    found = []
+    previous = {entry["profiles"]: entry for entry in baseline.get("sizes", [])}
+    for entry in report["sizes"]:
+        before = previous.get(entry["profiles"])
+        if before is None:
+            continue
+        stages = [("fit", entry["fit"], before["fit"]), ("transform", entry["transform"], before["transform"])]
+        for kind, variant in entry["variants"].items():
+            if kind in before["variants"]:
+                stages.append((f"{kind} recommend", variant["recommend"], before["variants"][kind]["recommend"]))
+                for key, overlap in variant.items():
+                    if not key.startswith("overlap_at_k"):
+                        continue
+                    for k, value in overlap.items():
+                        old = before["variants"][kind].get(key, {}).get(k)
+                        if value is not None and old is not None and value < old - OVERLAP_TOLERANCE:
+                            found.append(f"{entry['profiles']} profiles: {kind} overlap@{k} fell from {old} to {value}")
+        for name, now, then in stages:
+            if now["p95_ms"] > then["p95_ms"] * (1.0 + tolerance):
+                found.append(f"{entry['profiles']} profiles: {name} p95 rose from {then['p95_ms']}ms to {now['p95_ms']}ms")
+    return found
+
+
+def run_suite(
+    sizes: list[int] = SUITE_SIZES,
+    variants: list[str] = SUITE_VARIANTS,
+    queries: int = 200,
+    top_k: int = 10,
+    repeat: int = 3,
+    seed: int = 0,
+) -> dict:
+    """Benchmark every size in a fresh process and collect the report.
+
+    The first variant is the reference for overlap@k, so keep the exact
+    ``brute`` index first.
+    """
+    sizes_report = []
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        print(f"[BENCHMARK] {size} profiles", file=sys.stderr, flush=True)
+        with context.Pool(1) as pool:
+            sizes_report.append(pool.apply(_benchmark_size, (size, variants, queries, top_k, repeat, seed)))
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "scipy": scipy.__version__, "scikit-learn": sklearn.__version__, "machine": platform.machine(),
+        },
+        "config": {"variants": variants, "queries": queries, "top_k": top_k, "repeat": repeat, "seed": seed},
+        "sizes": sizes_report,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    normalize = commands.add_parser("normalize", help="time normalize_profiles against the per-cell baseline")
+    normalize.add_argument(
+        "--sizes", type=int, nargs="+", default=[0, 50_000],
+        help="synthetic population sizes; 0 means the bundled 500-profile CSV",
+    )
+    normalize.add_argument("--repeat", type=int, default=3)
+    normalize.add_argument("--seed", type=int, default=0)
+    suite = commands.add_parser("suite", help="time fit, transform and recommend and score ranking quality")
+    suite.add_argument("--sizes", type=int, nargs="+", default=SUITE_SIZES)
+    suite.add_argument(
+        "--variants", nargs="+", default=SUITE_VARIANTS,
+        help="retrieval indexes to compare; the first is the overlap reference",
+    )
+    suite.add_argument("--queries", type=int, default=200, help="query users sampled per size")
+    suite.add_argument("--top-k", type=int, default=10)
+    suite.add_argument("--repeat", type=int, default=3, help="fit_model runs per size")
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--output", type=Path, help="write the JSON report here instead of stdout")
+    suite.add_argument("--baseline", type=Path, help="earlier report to check for regressions")
+    suite.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="allowed relative p95 slowdown against --baseline",
+    )
+    args = parser.parse_args()
+
+    if args.command == "normalize":
+        report = benchmark_normalize(args.sizes, args.repeat, args.seed)
+        print(json.dumps(report, indent=2))
+        return 0 if all(row["identical"] for row in report) else 1
+
+    report = run_suite(args.sizes, args.variants, args.queries, args.top_k, args.repeat, args.seed)
+    if args.baseline:
+        report["regressions"] = _regressions(
+            report, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance
+        )
+        for regression in report["regressions"]:
+            print(f"[BENCHMARK] Regression: {regression}", file=sys.stderr)
+    text = json.dumps(report, indent=2) + "\n"
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+    else:
+        sys.stdout.write(text)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,24 +4,42 @@ from __future__ import annotations
 import json
 import os
 import shutil
+import sys
+import time
 import uuid
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Iterable, Iterator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 import joblib
+import numpy as np
 import pandas as pd
-from sqlalchemy import text
+from sqlalchemy import JSON, bindparam, text
 
+from config import get_settings
 from database import engine
 from recommendation.recommender import (
-    DEFAULT_ARTIFACTS, FEATURE_WEIGHTS, MODEL_VERSION, RecommendationError,
-    fit_model, normalize_profiles,
+    DEFAULT_ARTIFACTS, FEATURE_WEIGHTS, MODEL_VERSION, OVERLAY_FILE, REMOVED_FILE, RecommendationError,
+    PROFILE_STORE_DIR, ProfileAccumulator, ProfileStore, build_index, fill_numeric_defaults, fit_model, has_features,
+    load_artifacts, load_features, load_index, normalize_profiles, save_features, save_index,
+    sort_by_partition, transform_profiles, vocabulary_drift,
 )
 
 ADVISORY_LOCK_ID = 714_202_606
 VERSIONS_DIR = DEFAULT_ARTIFACTS / "versions"
 ACTIVE_POINTER = DEFAULT_ARTIFACTS / "active.json"
 RETAINED_VERSIONS = 5
+# An overlay larger than this share of the base (or row count) triggers a full refit.
+OVERLAY_MAX_FRACTION = 0.05
+OVERLAY_MAX_ROWS = 5000
+# Share of overlay rows with categories or interests the base encoders never saw.
+DRIFT_MAX_FRACTION = 0.2
 
 PROFILE_COLUMNS = [
     "location", "academic_background", "profession", "marital_status", "blood_group",
@@ -31,14 +49,83 @@ PROFILE_COLUMNS = [
     "preferred_weight_min", "preferred_weight_max", "preferred_religion",
     "preferred_education", "preferred_profession", "preferred_location", "specific_location",
     "lifestyle_pref_smoking", "lifestyle_pref_alcohol", "lifestyle_pref_dietary_match",
-    "necessary_preferences", "medical_history", "overall_health_status",
-    "long_term_condition", "long_term_condition_description", "fertility_awareness",
-    "disability", "disability_description", "chronic_illness", "genetic_conditions",
+    "necessary_preferences",
 ]
+# Rows streamed per server-side cursor batch during full training.
+FETCH_CHUNK_ROWS = 5000
+# Columns read by fetch_database_profiles, including its eligibility filters.
+# Commits touching only other columns never queue a retrain.
+TRACKED_USER_COLUMNS = frozenset({
+    "name", "age", "gender", "religion", "preferred_age_from", "preferred_age_to",
+    "is_deleted", "is_archived", "is_admin",
+})
+TRACKED_PROFILE_COLUMNS = frozenset(PROFILE_COLUMNS) | {
+    "user_id", "preferred_age_min", "preferred_age_max", "is_completed",
+}
+
+
+def _peak_memory_bytes() -> int | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class TrainingProgress:
+    """Per-phase wall times of one run, mirrored into ``recommendation_training_state``.
+
+    Without a connection (tests, direct calls) timings are only collected.
+    Memory is the trainer process's peak resident size, which persists
+    across runs of the long-lived trainer worker.
+    """
+
+    def __init__(self, connection=None) -> None:
+        self.connection = connection
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        self.report(name)
+        with self.timer(name):
+            yield
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Add to a phase's time without reporting; for work interleaved per chunk."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(self.timings.get(name, 0.0) + time.perf_counter() - started, 3)
+
+    def report(self, progress: str) -> None:
+        if self.connection is None:
+            return
+        self.connection.execute(text("""
+            UPDATE recommendation_training_state
+            SET progress = :progress, phase_timings = :timings,
+                peak_memory_bytes = :peak, updated_at = NOW()
+            WHERE id = 1
+        """).bindparams(bindparam("timings", type_=JSON)), {
+            "progress": progress, "timings": self.timings, "peak": _peak_memory_bytes(),
+        })
+        self.connection.commit()
+
+
+# The last published full version, kept loaded so overlays skip reading it.
+_warm_base: tuple[Path, dict, ProfileStore] | None = None
 
 
-def fetch_database_profiles(connection) -> pd.DataFrame:
+def _load_base(base_dir: Path) -> tuple[dict, ProfileStore]:
+    global _warm_base
+    if _warm_base is None or _warm_base[0] != base_dir:
+        _warm_base = (base_dir, *load_artifacts(base_dir))
+    return _warm_base[1], _warm_base[2]
+
+
+def _profiles_query(user_ids: list[str] | None):
     profile_select = ",\n            ".join(f"p.{column}" for column in PROFILE_COLUMNS)
+    only_users = "AND u.id IN :user_ids" if user_ids is not None else ""
     query = text(f"""
         SELECT
             u.id AS user_id, u.name, u.age, u.gender, u.religion,
@@ -50,62 +137,250 @@ def fetch_database_profiles(connection) -> pd.DataFrame:
         WHERE p.is_completed = TRUE
           AND u.is_deleted = FALSE
           AND u.is_archived = FALSE
+          {only_users}
     """)
-    return pd.read_sql_query(query, connection)
+    return query if user_ids is None else query.bindparams(bindparam("user_ids", expanding=True))
+
+
+def iter_database_profiles(
+    connection, user_ids: list[str] | None = None, chunk_size: int = FETCH_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    """Stream eligible completed profiles through a server-side cursor.
+
+    Only the columns the model and scoring rules read are selected; the
+    sensitive health fields stay in the database.
+    """
+    if user_ids is not None and not user_ids:
+        return
+    params = {} if user_ids is None else {"user_ids": list(user_ids)}
+    result = connection.execution_options(stream_results=True, max_row_buffer=chunk_size).execute(
+        _profiles_query(user_ids), params
+    )
+    columns = list(result.keys())
+    for rows in result.partitions(chunk_size):
+        yield pd.DataFrame.from_records(rows, columns=columns)
+
+
+def fetch_database_profiles(connection, user_ids: list[str] | None = None) -> pd.DataFrame:
+    """Fetch every eligible completed profile, or only those of ``user_ids``."""
+    chunks = list(iter_database_profiles(connection, user_ids))
+    if not chunks:
+        return pd.DataFrame(columns=["user_id", "name", "age", "gender", "religion",
+                                     "preferred_age_min", "preferred_age_max", *PROFILE_COLUMNS])
+    return pd.concat(chunks, ignore_index=True)
 
 
-def _publish(profiles: pd.DataFrame, generation: int) -> Path:
-    normalized = normalize_profiles(profiles)
+def _timed(chunks: Iterable[pd.DataFrame], progress: TrainingProgress, name: str) -> Iterator[pd.DataFrame]:
+    iterator = iter(chunks)
+    while True:
+        with progress.timer(name):
+            chunk = next(iterator, None)
+        if chunk is None:
+            return
+        yield chunk
+
+
+def _publish(
+    profiles: pd.DataFrame | Iterable[pd.DataFrame],
+    generation: int,
+    progress: TrainingProgress | None = None,
+) -> Path:
+    """Fit and publish a full version from a frame or a stream of raw profile chunks."""
+    global _warm_base
+    progress = progress or TrainingProgress()
+    accumulator = ProfileAccumulator()
+    progress.report("fetch")
+    for chunk in _timed([profiles] if isinstance(profiles, pd.DataFrame) else profiles, progress, "fetch"):
+        with progress.timer("normalize"):
+            accumulator.add(chunk)
+    with progress.phase("normalize"):
+        # Contiguous (gender, religion) partitions let queries skip ineligible rows.
+        normalized = sort_by_partition(accumulator.profiles())
     if len(normalized) < 2:
         raise RecommendationError("At least two eligible completed profiles are required")
-    artifact, matrix = fit_model(normalized)
-    artifact["id_source"] = "database"
+    print(f"[TRAIN] Training with {len(normalized)} eligible profiles")
+    with progress.phase("fit"):
+        artifact, features = fit_model(normalized, accumulator.vocabulary())
+        del accumulator
+        artifact["id_source"] = "database"
+        store = ProfileStore.from_frame(normalized)
+        retrieval = build_index(features, get_settings().RECOMMENDATION_INDEX, store.table["partitions"][:, 2:])
 
     DEFAULT_ARTIFACTS.mkdir(parents=True, exist_ok=True)
     VERSIONS_DIR.mkdir(parents=True, exist_ok=True)
     version = f"g{generation}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}"
     staging = DEFAULT_ARTIFACTS / f".staging-{uuid.uuid4().hex}"
+    staging.mkdir()
+    try:
+        with progress.phase("dump"):
+            joblib.dump(artifact, staging / "knn_model.joblib")
+            metadata = {
+                "model_version": MODEL_VERSION,
+                "generation": generation,
+                "profile_count": len(normalized),
+                "feature_count": features.shape[1],
+                "features": save_features(features, staging),
+                "index": save_index(retrieval, features, staging, get_settings().RECOMMENDATION_INDEX_MIN_RECALL),
+                "profile_store": store.save(staging / PROFILE_STORE_DIR),
+                "feature_weights": FEATURE_WEIGHTS,
+                "source": "database",
+                "trained_at": datetime.now(timezone.utc).isoformat(),
+            }
+            (staging / "metadata.json").write_text(json.dumps(metadata, indent=2) + "\n")
+
+        with progress.phase("validate"):
+            # Validate every file before publishing the version.
+            loaded_artifact = joblib.load(staging / "knn_model.joblib")
+            loaded_profiles = ProfileStore.open(staging / PROFILE_STORE_DIR)
+            if loaded_artifact.get("model_version") != MODEL_VERSION or len(loaded_profiles) != len(normalized):
+                raise RecommendationError("Generated artifact validation failed")
+            if not has_features(staging):
+                raise RecommendationError("Generated feature matrix is missing")
+            load_index(staging, load_features(staging, loaded_artifact, loaded_profiles))
+
+        final = _activate(staging, version, generation)
+        # The mapped arrays follow the directory rename.
+        _warm_base = (final, loaded_artifact, loaded_profiles)
+        return final
+    finally:
+        if staging.exists():
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _overlay_base(version_dir: Path) -> Path | None:
+    spec = version_dir / OVERLAY_FILE
+    if not spec.is_file():
+        return None
+    return VERSIONS_DIR / json.loads(spec.read_text(encoding="utf-8"))["base"]
+
+
+def _activate(staging: Path, version: str, generation: int) -> Path:
+    """Move a validated staging directory into place, repoint, and prune old versions."""
     final = VERSIONS_DIR / version
+    os.replace(staging, final)
+    pointer_tmp = DEFAULT_ARTIFACTS / "active.json.tmp"
+    pointer_tmp.write_text(json.dumps({"version": version, "generation": generation}) + "\n")
+    os.replace(pointer_tmp, ACTIVE_POINTER)
+    old_versions = sorted(
+        (path for path in VERSIONS_DIR.iterdir() if path.is_dir() and path != final),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+    kept = [final, *old_versions[:RETAINED_VERSIONS - 1]]
+    # Overlays are unusable without the full version they were built on.
+    bases = {base for base in map(_overlay_base, kept) if base is not None}
+    for old_version in old_versions[RETAINED_VERSIONS - 1:]:
+        if old_version not in bases:
+            shutil.rmtree(old_version, ignore_errors=True)
+    return final
+
+
+def _publish_overlay(
+    changes: pd.DataFrame,
+    changed_ids: set[str],
+    generation: int,
+    active_dir: Path,
+    progress: TrainingProgress | None = None,
+) -> Path | None:
+    """Publish changed profiles on top of the active model without refitting it.
+
+    Changed rows are encoded with the base version's scaler and encoders and
+    replace their base rows through an overlay. Returns None when the overlay
+    has outgrown :data:`OVERLAY_MAX_FRACTION` / :data:`OVERLAY_MAX_ROWS` or
+    too many of its rows hold vocabulary the encoders never saw; the caller
+    then refits from scratch.
+    """
+    progress = progress or TrainingProgress()
+    base_dir = _overlay_base(active_dir) or active_dir
+    artifact, base = _load_base(base_dir)
+    with progress.phase("normalize"):
+        if base_dir == active_dir:
+            previous = pd.DataFrame()
+            removed = np.zeros(len(base), dtype=bool)
+        else:
+            store_dir = active_dir / PROFILE_STORE_DIR
+            previous = ProfileStore.open(store_dir).frame() if store_dir.is_dir() else pd.DataFrame()
+            removed = np.zeros(len(base), dtype=bool)
+            removed[np.load(active_dir / REMOVED_FILE)] = True
+
+        parts = [] if previous.empty else [previous[~previous["user_id"].isin(changed_ids)]]
+        if not changes.empty:
+            parts.append(normalize_profiles(fill_numeric_defaults(changes, artifact)))
+        overlay = sort_by_partition(pd.concat(parts, ignore_index=True)) if parts else pd.DataFrame()
+        removed |= np.isin(np.asarray(base.user_ids, dtype=str), list(changed_ids))
+
+    if len(overlay) > min(OVERLAY_MAX_ROWS, OVERLAY_MAX_FRACTION * len(base)):
+        print(f"[TRAIN] Overlay of {len(overlay)} rows is too large; refitting")
+        return None
+    drift = float(vocabulary_drift(overlay, artifact).mean()) if len(overlay) else 0.0
+    if drift > DRIFT_MAX_FRACTION:
+        print(f"[TRAIN] {drift:.0%} of overlay rows have unseen vocabulary; refitting")
+        return None
+
+    VERSIONS_DIR.mkdir(parents=True, exist_ok=True)
+    version = f"g{generation}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-delta"
+    staging = DEFAULT_ARTIFACTS / f".staging-{uuid.uuid4().hex}"
     staging.mkdir()
     try:
-        joblib.dump(artifact, staging / "knn_model.joblib")
-        joblib.dump(normalized, staging / "profiles.joblib")
+        (staging / OVERLAY_FILE).write_text(json.dumps({"base": base_dir.name}) + "\n")
+        np.save(staging / REMOVED_FILE, np.flatnonzero(removed))
         metadata = {
             "model_version": MODEL_VERSION,
             "generation": generation,
-            "profile_count": len(normalized),
-            "feature_count": matrix.shape[1],
-            "feature_weights": FEATURE_WEIGHTS,
+            "base": base_dir.name,
+            "profile_count": int(len(base) - removed.sum() + len(overlay)),
+            "overlay_count": len(overlay),
+            "removed_count": int(removed.sum()),
+            "vocabulary_drift": drift,
             "source": "database",
             "trained_at": datetime.now(timezone.utc).isoformat(),
         }
+        if len(overlay):
+            with progress.phase("fit"):
+                features = transform_profiles(overlay, artifact)
+                store = ProfileStore.from_frame(overlay)
+                retrieval = build_index(
+                    features, get_settings().RECOMMENDATION_INDEX, store.table["partitions"][:, 2:]
+                )
+            with progress.phase("dump"):
+                metadata["features"] = save_features(features, staging)
+                metadata["index"] = save_index(
+                    retrieval, features, staging, get_settings().RECOMMENDATION_INDEX_MIN_RECALL
+                )
+                metadata["profile_store"] = store.save(staging / PROFILE_STORE_DIR)
         (staging / "metadata.json").write_text(json.dumps(metadata, indent=2) + "\n")
 
-        # Validate every file before publishing the version.
-        loaded_artifact = joblib.load(staging / "knn_model.joblib")
-        loaded_profiles = joblib.load(staging / "profiles.joblib")
-        if loaded_artifact.get("model_version") != MODEL_VERSION or len(loaded_profiles) != len(normalized):
-            raise RecommendationError("Generated artifact validation failed")
-
-        os.replace(staging, final)
-        pointer_tmp = DEFAULT_ARTIFACTS / "active.json.tmp"
-        pointer_tmp.write_text(json.dumps({"version": version, "generation": generation}) + "\n")
-        os.replace(pointer_tmp, ACTIVE_POINTER)
-        old_versions = sorted(
-            (path for path in VERSIONS_DIR.iterdir() if path.is_dir() and path != final),
-            key=lambda path: path.stat().st_mtime,
-            reverse=True,
-        )
-        for old_version in old_versions[RETAINED_VERSIONS - 1:]:
-            shutil.rmtree(old_version, ignore_errors=True)
-        return final
+        if len(overlay):
+            with progress.phase("validate"):
+                loaded_profiles = ProfileStore.open(staging / PROFILE_STORE_DIR)
+                if len(loaded_profiles) != len(overlay):
+                    raise RecommendationError("Generated overlay validation failed")
+                load_index(staging, load_features(staging, artifact, loaded_profiles))
+        return _activate(staging, version, generation)
     finally:
         if staging.exists():
             shutil.rmtree(staging, ignore_errors=True)
 
 
-def run_database_training() -> bool:
-    """Run one requested generation, returning False when another trainer owns the lock."""
+def _active_version_dir() -> Path | None:
+    try:
+        version = json.loads(ACTIVE_POINTER.read_text(encoding="utf-8"))["version"]
+    except (OSError, KeyError, TypeError, json.JSONDecodeError):
+        return None
+    path = VERSIONS_DIR / version
+    return path if path.is_dir() else None
+
+
+def run_database_training(precompute: bool = True, full_refit: bool = False) -> bool:
+    """Run one requested generation, returning False when another trainer owns the lock.
+
+    Users queued in ``recommendation_changes`` are published as an overlay on
+    the active model when possible; ``full_refit`` or an empty queue refits
+    everything. With ``precompute`` the per-user results of a full refit are
+    stored after the lock is released, so the next generation can start
+    meanwhile; a failure there leaves the model active and the API keeps
+    ranking live.
+    """
     with engine.connect() as connection:
         acquired = connection.execute(
             text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": ADVISORY_LOCK_ID}
@@ -129,12 +404,36 @@ def run_database_training() -> bool:
                 WHERE id = 1
             """))
             connection.commit()
+            progress = TrainingProgress(connection)
 
-            print(f"[TRAIN] Fetching eligible database profiles for generation {generation}")
-            profiles = fetch_database_profiles(connection)
+            claimed_at = connection.execute(text("SELECT NOW()")).scalar()
+            changed_ids = set(connection.execute(text("""
+                SELECT user_id FROM recommendation_changes WHERE changed_at <= :claimed_at
+            """), {"claimed_at": claimed_at}).scalars())
             connection.commit()
-            print(f"[TRAIN] Training with {len(profiles)} eligible profiles")
-            published = _publish(profiles, generation)
+
+            published = None
+            active_dir = _active_version_dir()
+            if changed_ids and active_dir is not None and not full_refit and len(changed_ids) <= OVERLAY_MAX_ROWS:
+                print(f"[TRAIN] Publishing {len(changed_ids)} changed users for generation {generation}")
+                with progress.phase("fetch"):
+                    changes = fetch_database_profiles(connection, sorted(changed_ids))
+                    connection.commit()
+                published = _publish_overlay(changes, changed_ids, generation, active_dir, progress)
+            if published is None:
+                print(f"[TRAIN] Streaming eligible database profiles for generation {generation}")
+                # A separate connection: progress commits would close the server-side cursor.
+                with engine.connect() as reader:
+                    published = _publish(iter_database_profiles(reader), generation, progress)
+            refitted = _overlay_base(published) is None
+
+            if changed_ids:
+                # Users changed again after the claim keep a newer timestamp and stay queued.
+                connection.execute(text("""
+                    DELETE FROM recommendation_changes
+                    WHERE changed_at <= :claimed_at AND user_id IN :user_ids
+                """).bindparams(bindparam("user_ids", expanding=True)),
+                    {"claimed_at": claimed_at, "user_ids": sorted(changed_ids)})
 
             connection.execute(text("""
                 UPDATE recommendation_training_state
@@ -145,8 +444,8 @@ def run_database_training() -> bool:
                 WHERE id = 1
             """), {"generation": generation})
             connection.commit()
-            print(f"[TRAIN] Published generation {generation}: {published}")
-            return True
+            print(f"[TRAIN] Published generation {generation}: {published} {progress.timings}")
+            progress.report("done")
         except Exception as exc:
             connection.rollback()
             connection.execute(text("""
@@ -163,3 +462,15 @@ def run_database_training() -> bool:
                 text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": ADVISORY_LOCK_ID}
             )
             connection.commit()
+
+    # Cached lists of the base version stay valid under an overlay. The state
+    # row now belongs to the next generation, and lists of a newer generation
+    # win if its run finishes first.
+    if precompute and refitted:
+        from recommendation.precompute import precompute_recommendations
+
+        try:
+            precompute_recommendations(published, generation)
+        except Exception as exc:
+            print(f"[PRECOMPUTE] Failed: {exc}")
+    return True
@@ -0,0 +1,155 @@
+"""Process-wide resident copy of the active recommendation model."""
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+from recommendation.recommender import (
+    DEFAULT_ARTIFACTS, CandidatePool, load_candidate_pool, load_runtime_version,
+)
+
+
+def _pointer_signature(pointer: Path) -> Optional[tuple[int, int, int]]:
+    """Identify the current ``active.json`` without reading it.
+
+    Publishing replaces the pointer with ``os.replace``, so the inode changes
+    on every swap; size and mtime cover filesystems that reuse inodes.
+    """
+    try:
+        stat = pointer.stat()
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """One immutable model version; requests keep a reference for their lifetime."""
+
+    artifact: dict[str, Any]
+    profiles: CandidatePool
+    version: str
+    generation: Optional[int]
+    signature: Optional[tuple[int, int, int]]
+    loaded_at: datetime
+    load_seconds: float
+
+
+class RecommendationEngine:
+    """Hold the active model in memory and hot-swap it when the pointer moves.
+
+    Each call to :meth:`current` costs one ``stat`` of ``active.json``. Artifacts
+    are only deserialized when that signature changes, and the new version is
+    published by a single reference assignment, so concurrent requests either
+    see the old model or the new one, never a mix.
+    """
+
+    def __init__(self, artifacts_dir: Path | str = DEFAULT_ARTIFACTS) -> None:
+        self.artifacts_dir = Path(artifacts_dir)
+        self._pointer = self.artifacts_dir / "active.json"
+        self._lock = threading.Lock()
+        self._model: Optional[LoadedModel] = None
+        self._failed_signature: Optional[tuple[int, int, int]] = None
+        self._swap_count = 0
+        self._last_swap_seconds: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    def current(self) -> LoadedModel:
+        """Return the active model, loading or swapping it first when needed."""
+        signature = _pointer_signature(self._pointer)
+        model = self._model
+        if model is not None and (model.signature == signature or signature == self._failed_signature):
+            return model
+
+        with self._lock:
+            # Another request may have finished the swap while we waited.
+            model = self._model
+            if model is not None and (model.signature == signature or signature == self._failed_signature):
+                return model
+            started = time.perf_counter()
+            try:
+                loaded = self._load(signature)
+            except Exception as exc:
+                self._last_error = str(exc)
+                if model is None:
+                    raise
+                # Keep serving the previous version rather than retrying the
+                # same broken pointer on every request.
+                self._failed_signature = signature
+                print(f"[RECOMMENDATION] Keeping model {model.version}; reload failed: {exc}")
+                return model
+            self._model = loaded
+            self._failed_signature = None
+            self._last_error = None
+            self._swap_count += 1
+            self._last_swap_seconds = time.perf_counter() - started
+            print(
+                f"[RECOMMENDATION] Loaded model {loaded.version} in "
+                f"{loaded.load_seconds:.3f}s"
+            )
+            return loaded
+
+    def is_ready(self) -> bool:
+        try:
+            self.current()
+            return True
+        except Exception:
+            return False
+
+    def stats(self) -> dict[str, Any]:
+        """Describe the resident model and the cost of the most recent swap."""
+        model = self._model
+        return {
+            "loaded": model is not None,
+            "version": model.version if model else None,
+            "generation": model.generation if model else None,
+            "profile_count": model.profiles.live_count if model else 0,
+            "overlay_count": model.profiles.overlay_count if model else 0,
+            "index": model.profiles.segments[0].index.kind if model else None,
+            "loaded_at": model.loaded_at.isoformat() if model else None,
+            "load_seconds": round(model.load_seconds, 6) if model else None,
+            "last_swap_seconds": (
+                round(self._last_swap_seconds, 6) if self._last_swap_seconds is not None else None
+            ),
+            "swap_count": self._swap_count,
+            "last_error": self._last_error,
+        }
+
+    def _load(self, signature: Optional[tuple[int, int, int]]) -> LoadedModel:
+        started = time.perf_counter()
+        artifact, profiles, selected = load_runtime_version(self.artifacts_dir)
+        return _loaded_model(artifact, profiles, selected, signature, started)
+
+
+def _loaded_model(
+    artifact: dict[str, Any],
+    profiles: CandidatePool,
+    selected: dict[str, Any],
+    signature: Optional[tuple[int, int, int]],
+    started: float,
+) -> LoadedModel:
+    return LoadedModel(
+        artifact=artifact,
+        profiles=profiles,
+        version=selected["version"],
+        generation=selected["generation"],
+        signature=signature,
+        loaded_at=datetime.now(timezone.utc),
+        load_seconds=time.perf_counter() - started,
+    )
+
+
+def load_model_version(version_dir: Path | str, generation: Optional[int]) -> LoadedModel:
+    """Load one published version directly, bypassing ``active.json``."""
+    started = time.perf_counter()
+    path = Path(version_dir)
+    artifact, profiles = load_candidate_pool(path)
+    selected = {"version": path.name, "generation": generation, "path": path}
+    return _loaded_model(artifact, profiles, selected, None, started)
+
+
+recommendation_engine = RecommendationEngine()
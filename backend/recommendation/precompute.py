@@ -0,0 +1,200 @@
+"""Precompute every eligible user's ranked recommendations for one model version."""
+from __future__ import annotations
+
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+import pandas as pd
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import load_only
+
+from database import SessionLocal
+from models.profile.profile import Profile
+from models.recommendation_result import RecommendationResult
+from models.user.user import User
+from recommendation.database_training import ACTIVE_POINTER, VERSIONS_DIR, _overlay_base
+from recommendation.engine import LoadedModel, load_model_version
+from recommendation.recommender import REQUIRED_COLUMNS
+from services.recommendation_service_v2 import (
+    RESULT_LIMIT, _eligible_candidate_query, _query_row, query_fingerprint, rank_query,
+)
+
+BATCH_SIZE = 200
+WRITE_BATCH_SIZE = 500
+
+_USER_COLUMNS = (
+    User.id, User.name, User.age, User.gender, User.religion,
+    User.preferred_age_from, User.preferred_age_to,
+    User.is_admin, User.is_deleted, User.is_archived,
+)
+_PROFILE_COLUMNS = tuple(
+    getattr(Profile, column.name) for column in Profile.__table__.columns
+    if column.name in REQUIRED_COLUMNS | {"user_id", "is_completed", "preferred_age_min", "preferred_age_max"}
+)
+
+# Set once per worker process by _init_worker.
+_worker_model: Optional[LoadedModel] = None
+_worker_eligible: frozenset[str] = frozenset()
+
+
+def _init_worker(version_dir: str, generation: int, eligible_ids: frozenset[str]) -> None:
+    global _worker_model, _worker_eligible
+    # Arrays are memory-mapped, so every worker shares the same page cache.
+    _worker_model = load_model_version(version_dir, generation)
+    _worker_eligible = eligible_ids
+
+
+def _rank_batch(batch: list[tuple[str, pd.Series]]) -> list[dict[str, Any]]:
+    rows = []
+    for user_id, query in batch:
+        results = rank_query(_worker_model, query, RESULT_LIMIT, _worker_eligible.intersection)
+        rows.append({
+            "user_id": user_id,
+            "query_fingerprint": query_fingerprint(query),
+            "results": results,
+        })
+    return rows
+
+
+def _query_batches(db) -> Iterator[list[tuple[str, pd.Series]]]:
+    """Yield the query rows of every public, completed user without loading media columns."""
+    query = (
+        db.query(User, Profile)
+        .join(Profile, Profile.user_id == User.id)
+        .filter(
+            User.is_deleted == False, User.is_archived == False, User.is_admin == False,
+            Profile.is_completed == True,
+        )
+        .options(load_only(*_USER_COLUMNS), load_only(*_PROFILE_COLUMNS))
+        .order_by(User.id)
+        .yield_per(BATCH_SIZE)
+    )
+    batch: list[tuple[str, pd.Series]] = []
+    for user, profile in query:
+        batch.append((user.id, _query_row(user, profile)))
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _ranked(pool, batches: Iterable[list[tuple[str, pd.Series]]], window: int) -> Iterator[list[dict[str, Any]]]:
+    """Rank batches with at most ``window`` in flight, so query rows keep streaming.
+
+    ``Executor.map`` would read every batch up front and hold all users' query
+    rows in memory at once.
+    """
+    in_flight: set[Future] = set()
+    for batch in batches:
+        if len(in_flight) >= window:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        in_flight.add(pool.submit(_rank_batch, batch))
+    while in_flight:
+        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def _write(db, rows: list[dict[str, Any]], generation: int, version: str) -> None:
+    computed_at = datetime.now(timezone.utc)
+    statement = insert(RecommendationResult).values([
+        {**row, "generation": generation, "model_version": version, "computed_at": computed_at}
+        for row in rows
+    ])
+    excluded = statement.excluded
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[RecommendationResult.user_id],
+        set_={
+            "generation": excluded.generation,
+            "model_version": excluded.model_version,
+            "query_fingerprint": excluded.query_fingerprint,
+            "results": excluded.results,
+            "computed_at": excluded.computed_at,
+        },
+        # A slower job for an older generation must not overwrite newer lists.
+        where=RecommendationResult.generation <= excluded.generation,
+    ))
+    db.commit()
+
+
+def precompute_recommendations(
+    version_dir: Path | str,
+    generation: int,
+    workers: Optional[int] = None,
+) -> int:
+    """Rank every eligible user against one published version and store the results.
+
+    Returns the number of users written. Results are stamped with the
+    generation and version so the API only serves them while that model is
+    active; rows from older generations are removed at the end.
+    """
+    started = time.perf_counter()
+    path = Path(version_dir)
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    written = 0
+    # Query rows stream from their own session so commits cannot close the cursor.
+    reader, db = SessionLocal(), SessionLocal()
+    try:
+        eligible_ids = frozenset(row.id for row in _eligible_candidate_query(reader).all())
+        print(f"[PRECOMPUTE] Ranking {len(eligible_ids)} eligible users with {workers} workers")
+        pending: list[dict[str, Any]] = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(str(path), generation, eligible_ids),
+        ) as pool:
+            for rows in _ranked(pool, _query_batches(reader), 2 * workers):
+                pending.extend(rows)
+                if len(pending) >= WRITE_BATCH_SIZE:
+                    _write(db, pending, generation, path.name)
+                    written += len(pending)
+                    pending = []
+        if pending:
+            _write(db, pending, generation, path.name)
+            written += len(pending)
+        db.execute(delete(RecommendationResult).where(RecommendationResult.generation < generation))
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        reader.close()
+        db.close()
+    print(
+        f"[PRECOMPUTE] Stored recommendations for {written} users of generation "
+        f"{generation} in {time.perf_counter() - started:.1f}s"
+    )
+    return written
+
+
+def precompute_active_version() -> int:
+    """Precompute the full version behind the active model unless it already has lists.
+
+    Runs as its own job after a publish, so ranking every user never holds
+    the trainer lock. Overlays share their base's lists.
+    """
+    try:
+        pointer = json.loads(ACTIVE_POINTER.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return 0
+    version_dir = VERSIONS_DIR / pointer["version"]
+    base_dir = _overlay_base(version_dir) or version_dir
+    db = SessionLocal()
+    try:
+        stored = db.query(RecommendationResult.user_id).filter(
+            RecommendationResult.model_version == base_dir.name
+        ).first()
+    finally:
+        db.close()
+    if stored is not None:
+        return 0
+    return precompute_recommendations(base_dir, pointer["generation"])
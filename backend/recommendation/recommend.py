@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
-"""Recommend matches for an existing user in the trained CSV dataset."""
+"""Recommend matches for existing users in the trained CSV dataset.
+
+With ``--user-ids-file`` or ``--all`` one JSON object per user is written as
+JSON Lines while the batch is ranked.
+"""
 
 import argparse
 import json
 import sys
 from pathlib import Path
 
-from recommender import DEFAULT_ARTIFACTS, RecommendationError, recommend
+from recommender import DEFAULT_ARTIFACTS, RecommendationError, recommend, recommend_many
 
 
 def _print_human(result: dict) -> None:
@@ -27,13 +31,40 @@ def _print_human(result: dict) -> None:
             print(f"   Relaxed: {', '.join(match['relaxed_preferences'])}")
 
 
+def _read_user_ids(path: Path):
+    with sys.stdin if str(path) == "-" else path.open(encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                yield line.strip()
+
+
+def _print_batch(args) -> int:
+    user_ids = None if args.all else _read_user_ids(args.user_ids_file)
+    missing = 0
+    try:
+        for result in recommend_many(user_ids, args.top_k, args.artifacts_dir):
+            missing += "error" in result
+            print(json.dumps(result), flush=True)
+    except (RecommendationError, OSError) as exc:
+        print(f"Recommendation failed: {exc}", file=sys.stderr)
+        return 1
+    if missing:
+        print(f"{missing} user(s) not found", file=sys.stderr)
+    return 1 if missing else 0
+
+
 def main() -> int:
-    parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument("--user-id", required=True)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    users = parser.add_mutually_exclusive_group(required=True)
+    users.add_argument("--user-id")
+    users.add_argument("--user-ids-file", type=Path, help="one user ID per line; - reads standard input")
+    users.add_argument("--all", action="store_true", help="every user in the model")
     parser.add_argument("--top-k", type=int, default=5)
     parser.add_argument("--artifacts-dir", type=Path, default=DEFAULT_ARTIFACTS)
     parser.add_argument("--json", action="store_true", dest="as_json")
     args = parser.parse_args()
+    if args.user_id is None:
+        return _print_batch(args)
     try:
         result = recommend(args.user_id, args.top_k, args.artifacts_dir)
     except (RecommendationError, OSError) as exc:
@@ -3,21 +3,31 @@
 from __future__ import annotations
 
 import ast
+import hashlib
+import itertools
 import json
 import math
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator
 
 import joblib
 import numpy as np
 import pandas as pd
-from sklearn.neighbors import NearestNeighbors
+from scipy import sparse
+from sklearn.neighbors import BallTree
 from sklearn.preprocessing import MultiLabelBinarizer, OneHotEncoder, StandardScaler, normalize
 
 
 MODEL_VERSION = 1
 DEFAULT_CSV = Path(__file__).with_name("quboolmatch_diverse_500_profiles.csv")
 DEFAULT_ARTIFACTS = Path(__file__).with_name("artifacts")
+FEATURES_FILE = "features.npy"
+# The CSR matrix is stored as its three arrays, each mappable on its own.
+SPARSE_FEATURE_FILES = {part: f"features.{part}.npy" for part in ("data", "indices", "indptr")}
+PROFILE_STORE_DIR = "profile_store"
+PROFILE_STORE_FORMAT = 1
 
 NUMERIC_COLS = ["age", "height", "weight"]
 BACKGROUND_COLS = [
@@ -55,6 +65,10 @@ REQUIRED_COLUMNS = {
     *SENSITIVE_TEXT_COLS, "genetic_conditions",
 }
 
+# Everything except the sensitive fields, which neither fit_model nor the
+# scoring rules read; database training does not fetch those at all.
+MODEL_INPUT_COLUMNS = REQUIRED_COLUMNS - set(SENSITIVE_TEXT_COLS) - {"genetic_conditions"}
+
 NO_PREFERENCE = {"", "unknown", "none", "nopreference", "anywhere"}
 NECESSARY_KEYS = {"age", "height", "religion", "education", "location", "lifestyle"}
 
@@ -90,10 +104,22 @@ def _parse_list(value: Any) -> list[str]:
         return [_text(item) for item in value if _text(item) != "unknown"]
     if value is None or pd.isna(value) or not str(value).strip():
         return []
-    try:
-        parsed = ast.literal_eval(str(value))
-    except (SyntaxError, ValueError):
-        parsed = []
+    raw = str(value)
+    parsed = None
+    if "\\" not in raw:
+        # A JSON list of strings without escapes reads the same as the Python
+        # literal, so the much faster parser can be tried first.
+        try:
+            parsed = json.loads(raw)
+        except ValueError:
+            parsed = None
+        if not isinstance(parsed, list) or not all(isinstance(item, str) for item in parsed):
+            parsed = None
+    if parsed is None:
+        try:
+            parsed = ast.literal_eval(raw)
+        except (SyntaxError, ValueError):
+            parsed = []
     if not isinstance(parsed, list):
         return []
     return [_text(item) for item in parsed if _text(item) != "unknown"]
@@ -126,9 +152,14 @@ def load_profiles(csv_path: Path | str) -> pd.DataFrame:
     return normalize_profiles(profiles)
 
 
-def normalize_profiles(profiles: pd.DataFrame) -> pd.DataFrame:
-    """Validate and normalize profiles from CSV or database rows."""
-    missing = sorted(REQUIRED_COLUMNS - set(profiles.columns))
+def normalize_profiles(profiles: pd.DataFrame, fill_numeric: bool = True) -> pd.DataFrame:
+    """Validate and normalize profiles from CSV or database rows.
+
+    Sensitive columns are normalized when present but not required. Without
+    ``fill_numeric`` missing numbers are left as NaN, for callers that fill
+    them with medians of a larger table (see :class:`ProfileAccumulator`).
+    """
+    missing = sorted(MODEL_INPUT_COLUMNS - set(profiles.columns))
     if missing:
         raise RecommendationError(f"Profiles are missing required columns: {', '.join(missing)}")
     if profiles.empty:
@@ -143,44 +174,160 @@ def normalize_profiles(profiles: pd.DataFrame) -> pd.DataFrame:
         "preferred_height_max", "preferred_weight_min", "preferred_weight_max",
     ]:
         result[column] = pd.to_numeric(result[column], errors="coerce")
-    for column in NUMERIC_COLS:
-        if result[column].isna().all():
-            raise RecommendationError(f"Numeric column has no usable values: {column}")
-        result[column] = result[column].fillna(result[column].median())
+    if fill_numeric:
+        _fill_numeric_medians(result)
     for column in REQUIRED_COLUMNS - set(NUMERIC_COLS) - {
         "preferred_age_min", "preferred_age_max", "preferred_height_min",
         "preferred_height_max", "preferred_weight_min", "preferred_weight_max",
     }:
-        if column not in {"user_id", "name", "necessary_preferences"}:
-            result[column] = result[column].map(_text)
+        if column not in {"user_id", "name", "necessary_preferences"} and column in result:
+            result[column] = _unique_map(result[column], _text)
     result["name"] = result["name"].fillna("Unknown").astype(str).str.strip()
-    result["necessary_preferences"] = result["necessary_preferences"].map(_parse_list)
-    result["genetic_conditions"] = result["genetic_conditions"].map(_parse_list)
-    result["interest_tokens"] = result.apply(_interest_tokens, axis=1)
+    result["necessary_preferences"] = _parse_list_column(result["necessary_preferences"])
+    if "genetic_conditions" in result:
+        result["genetic_conditions"] = _parse_list_column(result["genetic_conditions"])
+    result["interest_tokens"] = _interest_token_column(result)
     return result
 
 
-def _new_one_hot_encoder() -> OneHotEncoder:
+def _parse_list_column(values: pd.Series) -> pd.Series:
+    """``values.map(_parse_list)``, parsing each distinct string once."""
+    cells = values.to_numpy(dtype=object)
+    try:
+        uniques = pd.unique(cells)
+    except TypeError:  # already-parsed lists are unhashable
+        return values.map(_parse_list)
+    parsed = {value: _parse_list(value) for value in uniques[~pd.isna(uniques)]}
+    return pd.Series(
+        [[] if missing else list(parsed[value]) for value, missing in zip(cells, pd.isna(cells))],
+        index=values.index, dtype=object,
+    )
+
+
+def _interest_token_column(profiles: pd.DataFrame) -> pd.Series:
+    """:func:`_interest_tokens` for every row, via split/explode instead of a row apply."""
+    rows = []
+    tokens = []
+    for column in INTEREST_COLS:
+        values = profiles[column].reset_index(drop=True)
+        # Blank items normalise to "unknown" and are dropped with it below.
+        split = values[values.notna()].astype(str).str.split(",").explode()
+        rows.append(split.index.to_numpy())
+        tokens.append(_unique_map(split, _text).to_numpy(dtype=object))
+    pairs = pd.DataFrame({"row": np.concatenate(rows), "token": np.concatenate(tokens)})
+    pairs = pairs[pairs["token"] != "unknown"].drop_duplicates().sort_values(["row", "token"])
+    offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs["row"].to_numpy(dtype=np.int64), minlength=len(profiles)), out=offsets[1:])
+    token_list = pairs["token"].tolist()
+    return pd.Series(
+        [token_list[start:stop] for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())],
+        index=profiles.index, dtype=object,
+    )
+
+
+def _fill_numeric_medians(profiles: pd.DataFrame) -> None:
+    for column in NUMERIC_COLS:
+        if profiles[column].isna().all():
+            raise RecommendationError(f"Numeric column has no usable values: {column}")
+        profiles[column] = profiles[column].fillna(profiles[column].median())
+
+
+ENCODED_COLS = {"background": BACKGROUND_COLS, "lifestyle": LIFESTYLE_COLS, "household": HOUSEHOLD_COLS}
+
+
+class ProfileAccumulator:
+    """Normalize profiles chunk by chunk while collecting the encoder vocabularies.
+
+    ``fit_model(acc.profiles(), acc.vocabulary())`` produces the same
+    artifact outputs as ``fit_model(normalize_profiles(all_rows))``, but the
+    raw rows only ever exist one chunk at a time.
+    """
+
+    def __init__(self) -> None:
+        self._parts: list[pd.DataFrame] = []
+        self._categories: dict[str, set[str]] = {
+            column: set() for columns in ENCODED_COLS.values() for column in columns
+        }
+        self._tokens: set[str] = set()
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        if chunk.empty:
+            return
+        part = normalize_profiles(chunk, fill_numeric=False)
+        for column, values in self._categories.items():
+            values.update(part[column].unique())
+        for tokens in part["interest_tokens"]:
+            self._tokens.update(tokens)
+        self._parts.append(part)
+
+    def profiles(self) -> pd.DataFrame:
+        """All normalized rows, with missing numbers filled from the full table."""
+        if not self._parts:
+            raise RecommendationError("Profiles contain no rows")
+        result = pd.concat(self._parts, ignore_index=True) if len(self._parts) > 1 else self._parts[0]
+        self._parts = [result]
+        if result["user_id"].duplicated().any():
+            raise RecommendationError("user_id values must be present and unique")
+        _fill_numeric_medians(result)
+        return result
+
+    def vocabulary(self) -> dict[str, list[str]]:
+        return {
+            **{column: sorted(values) for column, values in self._categories.items()},
+            "interest_tokens": sorted(self._tokens),
+        }
+
+
+def _new_one_hot_encoder(categories: Any = "auto") -> OneHotEncoder:
     try:
-        return OneHotEncoder(handle_unknown="ignore", sparse_output=False)
+        return OneHotEncoder(categories=categories, handle_unknown="ignore", sparse_output=True)
     except TypeError:  # scikit-learn < 1.2
-        return OneHotEncoder(handle_unknown="ignore", sparse=False)
+        return OneHotEncoder(categories=categories, handle_unknown="ignore", sparse=True)
 
 
-def _weighted_block(matrix: np.ndarray, weight: float) -> np.ndarray:
+def _weighted_block(matrix: Any, weight: float) -> sparse.csr_matrix:
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
     if matrix.shape[1] == 0:
         return matrix
     return normalize(matrix, norm="l2") * math.sqrt(weight)
 
 
-def fit_model(profiles: pd.DataFrame) -> tuple[dict[str, Any], np.ndarray]:
+def _feature_matrix(blocks: list[sparse.csr_matrix]) -> sparse.csr_matrix:
+    """Join the weighted blocks into unit-length float32 CSR rows.
+
+    Blocks are normalized in float64 and only the finished rows are rounded,
+    which keeps every stored cosine within float32 precision of the exact one.
+    """
+    matrix = normalize(sparse.hstack(blocks, format="csr"), norm="l2")
+    matrix.sort_indices()
+    return matrix.astype(np.float32)
+
+
+def dense_rows(features: Any) -> np.ndarray:
+    """The rows of a sparse or dense feature matrix as a float32 ndarray."""
+    if sparse.issparse(features):
+        return features.toarray()
+    return np.asarray(features, dtype=np.float32)
+
+
+def fit_model(
+    profiles: pd.DataFrame, vocabulary: dict[str, list[str]] | None = None
+) -> tuple[dict[str, Any], sparse.csr_matrix]:
+    """Fit the scaler and encoders; ``vocabulary`` supplies precollected categories.
+
+    The feature matrix stays sparse: one-hot and interest columns are almost
+    all zero, so memory grows with the non-zeros rather than the vocabulary.
+    """
     scaler = StandardScaler()
     encoders = {
-        "background": _new_one_hot_encoder(),
-        "lifestyle": _new_one_hot_encoder(),
-        "household": _new_one_hot_encoder(),
+        name: _new_one_hot_encoder(
+            "auto" if vocabulary is None else [vocabulary[column] for column in columns]
+        )
+        for name, columns in ENCODED_COLS.items()
     }
-    interests = MultiLabelBinarizer()
+    interests = MultiLabelBinarizer(
+        classes=None if vocabulary is None else vocabulary["interest_tokens"], sparse_output=True
+    )
     blocks = [
         _weighted_block(scaler.fit_transform(profiles[NUMERIC_COLS]), FEATURE_WEIGHTS["numeric"]),
         _weighted_block(encoders["background"].fit_transform(profiles[BACKGROUND_COLS]), FEATURE_WEIGHTS["background"]),
@@ -188,25 +335,24 @@ def fit_model(profiles: pd.DataFrame) -> tuple[dict[str, Any], np.ndarray]:
         _weighted_block(encoders["household"].fit_transform(profiles[HOUSEHOLD_COLS]), FEATURE_WEIGHTS["household"]),
         _weighted_block(interests.fit_transform(profiles["interest_tokens"]), FEATURE_WEIGHTS["interests"]),
     ]
-    matrix = normalize(np.hstack(blocks), norm="l2")
-    if not np.isfinite(matrix).all():
+    matrix = _feature_matrix(blocks)
+    if not np.isfinite(matrix.data).all():
         raise RecommendationError("Feature matrix contains non-finite values")
-    knn = NearestNeighbors(metric="cosine", algorithm="brute")
-    knn.fit(matrix)
     artifact = {
         "model_version": MODEL_VERSION,
         "feature_weights": FEATURE_WEIGHTS,
         "scaler": scaler,
         "encoders": encoders,
         "interests": interests,
-        "knn": knn,
         "feature_count": int(matrix.shape[1]),
         "profile_count": int(len(profiles)),
+        # Missing values are filled with the median; kept to encode later rows alike.
+        "numeric_medians": {column: float(profiles[column].median()) for column in NUMERIC_COLS},
     }
     return artifact, matrix
 
 
-def transform_profiles(profiles: pd.DataFrame, artifact: dict[str, Any]) -> np.ndarray:
+def transform_profiles(profiles: pd.DataFrame, artifact: dict[str, Any]) -> sparse.csr_matrix:
     encoders = artifact["encoders"]
     blocks = [
         _weighted_block(artifact["scaler"].transform(profiles[NUMERIC_COLS]), FEATURE_WEIGHTS["numeric"]),
@@ -215,20 +361,457 @@ def transform_profiles(profiles: pd.DataFrame, artifact: dict[str, Any]) -> np.n
         _weighted_block(encoders["household"].transform(profiles[HOUSEHOLD_COLS]), FEATURE_WEIGHTS["household"]),
         _weighted_block(artifact["interests"].transform(profiles["interest_tokens"]), FEATURE_WEIGHTS["interests"]),
     ]
-    return normalize(np.hstack(blocks), norm="l2")
+    return _feature_matrix(blocks)
+
+
+def transform_query(query: pd.Series, artifact: dict[str, Any]) -> np.ndarray:
+    """Encode one normalized profile row as a dense query vector."""
+    return dense_rows(transform_profiles(pd.DataFrame([query]), artifact))[0]
+
+
+def fill_numeric_defaults(profiles: pd.DataFrame, artifact: dict[str, Any]) -> pd.DataFrame:
+    """Fill missing numeric values the way the artifact's training run did.
+
+    :func:`normalize_profiles` uses the medians of whatever rows it is given,
+    which for a handful of changed profiles may be none at all.
+    """
+    medians = artifact.get("numeric_medians") or dict(zip(NUMERIC_COLS, artifact["scaler"].mean_))
+    result = profiles.copy()
+    for column in NUMERIC_COLS:
+        result[column] = pd.to_numeric(result[column], errors="coerce").fillna(medians[column])
+    return result
+
+
+def vocabulary_drift(profiles: pd.DataFrame, artifact: dict[str, Any]) -> np.ndarray:
+    """Flag normalized rows holding categories or interests the encoders never saw.
+
+    Unseen values encode as all-zero blocks, so such rows rank worse than
+    they would after a refit.
+    """
+    drift = np.zeros(len(profiles), dtype=bool)
+    for name, columns in (("background", BACKGROUND_COLS), ("lifestyle", LIFESTYLE_COLS), ("household", HOUSEHOLD_COLS)):
+        for column, categories in zip(columns, artifact["encoders"][name].categories_):
+            drift |= ~profiles[column].isin(categories).to_numpy()
+    known = set(artifact["interests"].classes_)
+    drift |= np.fromiter((not known.issuperset(tokens) for tokens in profiles["interest_tokens"]), dtype=bool, count=len(profiles))
+    return drift
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_features(matrix: Any, artifacts_dir: Path | str) -> dict[str, Any]:
+    """Write the normalized feature matrix as float32 CSR arrays and describe it for metadata."""
+    path = Path(artifacts_dir)
+    features = sparse.csr_matrix(matrix, dtype=np.float32)
+    features.sort_indices()
+    checksums = {}
+    for part, name in SPARSE_FEATURE_FILES.items():
+        np.save(path / name, np.ascontiguousarray(getattr(features, part)))
+        checksums[part] = _file_sha256(path / name)
+    return {
+        "format": "csr",
+        "files": SPARSE_FEATURE_FILES,
+        "dtype": "float32",
+        "shape": list(features.shape),
+        "nnz": int(features.nnz),
+        "sha256": checksums,
+    }
+
+
+def has_features(artifacts_dir: Path | str) -> bool:
+    path = Path(artifacts_dir)
+    return (path / FEATURES_FILE).is_file() or all(
+        (path / name).is_file() for name in SPARSE_FEATURE_FILES.values()
+    )
+
+
+def load_features(
+    artifacts_dir: Path | str,
+    artifact: dict[str, Any],
+    profiles: ProfileStore,
+) -> sparse.csr_matrix | np.ndarray:
+    """Map the persisted feature matrix read-only.
 
+    Every process mapping the same version shares the pages through the OS
+    cache. Artifacts trained before the matrix was persisted have no feature
+    files; their matrix is rebuilt from the encoders instead. Older versions
+    stored a dense ``features.npy``, which is still mapped as is.
+    """
+    path = Path(artifacts_dir)
+    if not has_features(path):
+        return transform_profiles(profiles.frame(), artifact)
+    try:
+        expected = json.loads((path / "metadata.json").read_text(encoding="utf-8"))["features"]
+    except (KeyError, TypeError, json.JSONDecodeError, OSError) as exc:
+        raise RecommendationError(f"Feature matrix in {path} has no metadata entry") from exc
+    if expected.get("format") != "csr":
+        features_path = path / FEATURES_FILE
+        if _file_sha256(features_path) != expected["sha256"]:
+            raise RecommendationError(f"Feature matrix checksum mismatch in {path}")
+        features = np.load(features_path, mmap_mode="r")
+    else:
+        arrays = {}
+        for part, name in SPARSE_FEATURE_FILES.items():
+            if _file_sha256(path / name) != expected["sha256"][part]:
+                raise RecommendationError(f"Feature matrix checksum mismatch in {path}")
+            arrays[part] = np.load(path / name, mmap_mode="r")
+        features = sparse.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]), shape=tuple(expected["shape"]), copy=False
+        )
+    if features.shape != (len(profiles), expected["shape"][1]):
+        raise RecommendationError(f"Feature matrix in {path} does not match the profiles")
+    return features
+
+
+INDEX_DIR = "index"
+ANN_CANDIDATES = 2000
+RECALL_K = (10, 100)
+RECALL_SAMPLE = 200
+# An approximate index below this recall@10 is published as brute force instead.
+MIN_INDEX_RECALL = 0.9
+
+
+def _top_similar(similarity: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(similarity))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    top = np.argpartition(-similarity, k - 1)[:k]
+    return top[np.argsort(-similarity[top], kind="stable")]
+
+
+class BruteForceIndex:
+    """Exact cosine similarity against every feature row."""
+
+    kind = "brute"
+    exact = True
+
+    def __init__(self, features: np.ndarray, params: dict[str, Any] | None = None) -> None:
+        self.features = features
+        self.params = params or {}
+
+    @classmethod
+    def build(cls, features: np.ndarray, **params: Any) -> BruteForceIndex:
+        return cls(features, params)
+
+    def search(self, query_vector: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        similarity = self.features @ np.asarray(query_vector, dtype=np.float32).ravel()
+        rows = _top_similar(similarity, k)
+        return rows, similarity[rows].astype(np.float64)
+
+    def save(self, directory: Path) -> None:
+        pass
+
+    @classmethod
+    def load(cls, directory: Path, features: np.ndarray, params: dict[str, Any]) -> BruteForceIndex:
+        return cls(features, params)
+
+
+class BallTreeIndex:
+    """Ball tree over the unit-length vectors; cosine is ``1 - d**2 / 2``."""
+
+    kind = "balltree"
+    exact = False
+
+    def __init__(self, tree: BallTree, params: dict[str, Any]) -> None:
+        self.tree = tree
+        self.params = params
+
+    @classmethod
+    def build(cls, features: np.ndarray, leaf_size: int = 40, **params: Any) -> BallTreeIndex:
+        tree = BallTree(dense_rows(features).astype(np.float64), leaf_size=leaf_size)
+        return cls(tree, {"leaf_size": leaf_size, **params})
+
+    def search(self, query_vector: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        k = min(k, self.tree.data.shape[0])
+        distances, rows = self.tree.query(np.asarray(query_vector, dtype=np.float64).reshape(1, -1), k=k)
+        return rows[0], 1.0 - distances[0] ** 2 / 2.0
+
+    def save(self, directory: Path) -> None:
+        joblib.dump(self.tree, directory / "balltree.joblib")
+
+    @classmethod
+    def load(cls, directory: Path, features: np.ndarray, params: dict[str, Any]) -> BallTreeIndex:
+        return cls(joblib.load(directory / "balltree.joblib"), params)
+
+
+def _nearest_centroid(data: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    squared = (centroids ** 2).sum(axis=1)
+    labels = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk):
+        block = data[start:start + chunk]
+        labels[start:start + chunk] = np.argmin(squared - 2.0 * block @ centroids.T, axis=1)
+    return labels
+
+
+def _kmeans(data: np.ndarray, clusters: int, iterations: int, rng: np.random.Generator) -> np.ndarray:
+    """Plain Lloyd iterations; empty clusters keep their previous centroid."""
+    clusters = min(clusters, len(data))
+    centroids = data[rng.choice(len(data), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest_centroid(data, centroids)
+        counts = np.bincount(labels, minlength=clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+class IVFPQIndex:
+    """Inverted file over k-means lists with product-quantized residuals.
+
+    A query scans the ``n_probe`` lists whose centroids are most similar,
+    scores their members from per-subspace lookup tables (``q . c`` plus the
+    quantized residual), and re-ranks the best ``rerank`` of those exactly
+    against the feature rows.
+    """
+
+    kind = "ivfpq"
+    exact = False
+    _ARRAYS = ("centroids", "codebooks", "codes", "ids", "offsets")
+
+    def __init__(self, arrays: dict[str, np.ndarray], features: np.ndarray, params: dict[str, Any]) -> None:
+        self.arrays = arrays
+        self.features = features
+        self.params = params
+
+    @classmethod
+    def build(
+        cls,
+        features: np.ndarray,
+        n_lists: int | None = None,
+        n_subspaces: int = 16,
+        n_codes: int = 256,
+        n_probe: int = 8,
+        rerank: int = 4,
+        iterations: int = 20,
+        seed: int = 0,
+        **params: Any,
+    ) -> IVFPQIndex:
+        rng = np.random.default_rng(seed)
+        data = dense_rows(features)
+        rows, dimensions = data.shape
+        n_lists = n_lists or max(1, int(math.sqrt(rows)))
+        centroids = _kmeans(data, n_lists, iterations, rng)
+        labels = _nearest_centroid(data, centroids)
+
+        width = math.ceil(dimensions / n_subspaces)
+        residuals = np.zeros((rows, n_subspaces * width), dtype=np.float32)
+        residuals[:, :dimensions] = data - centroids[labels]
+        residuals = residuals.reshape(rows, n_subspaces, width)
+        codebooks = np.zeros((n_subspaces, min(n_codes, rows), width), dtype=np.float32)
+        codes = np.empty((rows, n_subspaces), dtype=np.uint8)
+        for subspace in range(n_subspaces):
+            codebooks[subspace] = _kmeans(residuals[:, subspace], n_codes, iterations, rng)
+            codes[:, subspace] = _nearest_centroid(residuals[:, subspace], codebooks[subspace])
+
+        ids = np.argsort(labels, kind="stable").astype(np.int32)
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=len(centroids)), out=offsets[1:])
+        arrays = {
+            "centroids": centroids.astype(np.float32),
+            "codebooks": codebooks,
+            "codes": codes[ids],
+            "ids": ids,
+            "offsets": offsets,
+        }
+        return cls(arrays, features, {
+            "n_lists": len(centroids), "n_subspaces": n_subspaces, "n_codes": int(codebooks.shape[1]),
+            "n_probe": n_probe, "rerank": rerank, "iterations": iterations, "seed": seed, **params,
+        })
+
+    def search(self, query_vector: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        arrays = self.arrays
+        query = np.asarray(query_vector, dtype=np.float32).ravel()
+        n_subspaces, _, width = arrays["codebooks"].shape
+        padded = np.zeros(n_subspaces * width, dtype=np.float32)
+        padded[:len(query)] = query
+        tables = np.einsum("mkw,mw->mk", arrays["codebooks"], padded.reshape(n_subspaces, width))
+
+        coarse = arrays["centroids"] @ query
+        probe = _top_similar(coarse, self.params["n_probe"])
+        offsets = arrays["offsets"]
+        spans = [np.arange(offsets[lst], offsets[lst + 1]) for lst in probe]
+        members = np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+        if not len(members):
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        base = np.repeat(coarse[probe], [len(span) for span in spans])
+        codes = arrays["codes"][members]
+        approximate = base + tables[np.arange(n_subspaces), codes].sum(axis=1)
+
+        shortlist = members[_top_similar(approximate, k * self.params["rerank"])]
+        rows = arrays["ids"][shortlist]
+        exact = self.features[rows] @ query
+        top = _top_similar(exact, k)
+        return rows[top], exact[top].astype(np.float64)
+
+    def save(self, directory: Path) -> None:
+        for name in self._ARRAYS:
+            np.save(directory / f"{name}.npy", self.arrays[name])
+
+    @classmethod
+    def load(cls, directory: Path, features: np.ndarray, params: dict[str, Any]) -> IVFPQIndex:
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in cls._ARRAYS}
+        return cls(arrays, features, params)
+
+
+INDEX_BACKENDS = {index.kind: index for index in (BruteForceIndex, BallTreeIndex, IVFPQIndex)}
+
+
+class PartitionedIndex:
+    """One retrieval index per contiguous (gender, religion) partition.
+
+    ``search`` only visits the partitions passed in ``spans`` (all of them by
+    default) and merges their best rows.
+    """
+
+    def __init__(self, kind: str, parts: list[tuple[int, int, Any]]) -> None:
+        self.kind = kind
+        self.exact = INDEX_BACKENDS[kind].exact
+        self.parts = parts
+
+    def search(
+        self, query_vector: np.ndarray, k: int, spans: np.ndarray | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        wanted = None if spans is None else {(int(start), int(stop)) for start, stop in spans}
+        rows, similarity = [np.empty(0, dtype=np.intp)], [np.empty(0)]
+        for start, stop, index in self.parts:
+            if wanted is not None and (start, stop) not in wanted:
+                continue
+            part_rows, part_similarity = index.search(query_vector, k)
+            rows.append(np.asarray(part_rows, dtype=np.intp) + start)
+            similarity.append(part_similarity)
+        rows, similarity = np.concatenate(rows), np.concatenate(similarity)
+        top = _top_similar(similarity, k)
+        return rows[top], similarity[top]
+
+    def save(self, directory: Path) -> dict[str, Any]:
+        parts = []
+        for number, (start, stop, index) in enumerate(self.parts):
+            part_dir = directory / f"p{number}"
+            part_dir.mkdir(parents=True, exist_ok=True)
+            index.save(part_dir)
+            parts.append({"start": start, "stop": stop, "params": index.params})
+        spec = {"kind": self.kind, "partitions": parts}
+        (directory / "index.json").write_text(json.dumps(spec) + "\n", encoding="utf-8")
+        return spec
+
+
+def build_index(
+    features: np.ndarray,
+    kind: str = "brute",
+    partitions: np.ndarray | None = None,
+    **params: Any,
+) -> PartitionedIndex:
+    """Build a candidate-retrieval index over the normalized feature rows.
+
+    ``partitions`` holds ``(start, stop)`` row ranges, e.g. the last two
+    columns of ``table["partitions"]``; each gets its own sub-index over its
+    slice of ``features``. Without it the whole matrix is one partition.
+    """
+    if kind not in INDEX_BACKENDS:
+        raise RecommendationError(f"Unknown index backend: {kind}")
+    spans = [(0, features.shape[0])] if partitions is None else [(int(a), int(b)) for a, b in partitions]
+    return PartitionedIndex(kind, [
+        (start, stop, INDEX_BACKENDS[kind].build(features[start:stop], **params))
+        for start, stop in spans
+    ])
+
+
+def index_recall(index, features: np.ndarray, sample: int = RECALL_SAMPLE, seed: int = 0) -> dict[str, Any]:
+    """Measure recall@k of ``index`` against exact brute-force neighbours."""
+    exact = BruteForceIndex(features)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(features.shape[0], min(sample, features.shape[0]), replace=False)
+    hits = {k: 0.0 for k in RECALL_K}
+    seconds = 0.0
+    for row in queries:
+        query = dense_rows(features[row:row + 1])[0]
+        started = time.perf_counter()
+        found, _ = index.search(query, max(RECALL_K))
+        seconds += time.perf_counter() - started
+        expected, _ = exact.search(query, max(RECALL_K))
+        for k in RECALL_K:
+            size = min(k, len(expected))
+            hits[k] += len(set(found[:k].tolist()) & set(expected[:k].tolist())) / size
+    return {
+        "sample": len(queries),
+        "recall_at_k": {str(k): round(hits[k] / len(queries), 4) for k in RECALL_K},
+        "mean_query_ms": round(seconds / len(queries) * 1000.0, 4),
+    }
 
-def train(csv_path: Path | str, artifacts_dir: Path | str) -> dict[str, Any]:
-    profiles = load_profiles(csv_path)
-    artifact, matrix = fit_model(profiles)
+
+def save_index(
+    index: PartitionedIndex,
+    features: np.ndarray,
+    artifacts_dir: Path | str,
+    min_recall: float = MIN_INDEX_RECALL,
+) -> dict[str, Any]:
+    """Persist ``index`` under ``index/`` and describe it, with recall, for metadata.
+
+    An approximate index whose recall@10 is below ``min_recall`` is replaced
+    by brute force over the same partitions; its measurements are kept under
+    ``rejected``.
+    """
+    recall = index_recall(index, features)
+    rejected = {}
+    if not index.exact and recall["recall_at_k"]["10"] < min_recall:
+        print(
+            f"[TRAIN] {index.kind} recall@10 {recall['recall_at_k']['10']} is below {min_recall}; "
+            "publishing brute force instead"
+        )
+        rejected = {"rejected": {"kind": index.kind, **recall}}
+        index = PartitionedIndex(BruteForceIndex.kind, [
+            (start, stop, BruteForceIndex.build(features[start:stop])) for start, stop, _ in index.parts
+        ])
+        recall = index_recall(index, features)
+    directory = Path(artifacts_dir) / INDEX_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    spec = index.save(directory)
+    return {"kind": spec["kind"], "partition_count": len(spec["partitions"]), **recall, **rejected}
+
+
+def load_index(artifacts_dir: Path | str, features: np.ndarray) -> PartitionedIndex:
+    """Open the artifact's retrieval index; artifacts without one use brute force."""
+    directory = Path(artifacts_dir) / INDEX_DIR
+    spec_path = directory / "index.json"
+    if not spec_path.is_file():
+        return PartitionedIndex("brute", [(0, features.shape[0], BruteForceIndex(features))])
+    try:
+        spec = json.loads(spec_path.read_text(encoding="utf-8"))
+        backend = INDEX_BACKENDS[spec["kind"]]
+        parts = [
+            (part["start"], part["stop"], backend.load(
+                directory / f"p{number}", features[part["start"]:part["stop"]], part["params"]
+            ))
+            for number, part in enumerate(spec["partitions"])
+        ]
+    except (KeyError, TypeError, json.JSONDecodeError) as exc:
+        raise RecommendationError(f"Retrieval index in {directory} is invalid") from exc
+    return PartitionedIndex(spec["kind"], parts)
+
+
+def train(csv_path: Path | str, artifacts_dir: Path | str, index: str = "brute") -> dict[str, Any]:
+    profiles = sort_by_partition(load_profiles(csv_path))
+    artifact, features = fit_model(profiles)
+    store = ProfileStore.from_frame(profiles)
+    retrieval = build_index(features, index, store.table["partitions"][:, 2:])
     output = Path(artifacts_dir)
     output.mkdir(parents=True, exist_ok=True)
     joblib.dump(artifact, output / "knn_model.joblib")
-    joblib.dump(profiles, output / "profiles.joblib")
     metadata = {
         "model_version": MODEL_VERSION,
         "profile_count": len(profiles),
-        "feature_count": matrix.shape[1],
+        "feature_count": features.shape[1],
+        "features": save_features(features, output),
+        "index": save_index(retrieval, features, output),
+        "profile_store": store.save(output / PROFILE_STORE_DIR),
         "feature_weights": FEATURE_WEIGHTS,
         "source_csv": str(Path(csv_path).resolve()),
     }
@@ -236,31 +819,48 @@ def train(csv_path: Path | str, artifacts_dir: Path | str) -> dict[str, Any]:
     return metadata
 
 
-def load_artifacts(artifacts_dir: Path | str) -> tuple[dict[str, Any], pd.DataFrame]:
+def load_artifacts(artifacts_dir: Path | str) -> tuple[dict[str, Any], ProfileStore]:
     path = Path(artifacts_dir)
-    model_path, profiles_path = path / "knn_model.joblib", path / "profiles.joblib"
-    if not model_path.is_file() or not profiles_path.is_file():
+    model_path, store_path = path / "knn_model.joblib", path / PROFILE_STORE_DIR
+    # Artifacts trained before the columnar store carry a pickled DataFrame.
+    profiles_path = path / "profiles.joblib"
+    if not model_path.is_file() or not (store_path.is_dir() or profiles_path.is_file()):
         raise RecommendationError(f"Artifacts not found in {path}; run train_knn.py first")
     artifact = joblib.load(model_path)
-    profiles = joblib.load(profiles_path)
     if artifact.get("model_version") != MODEL_VERSION:
         raise RecommendationError("Artifact version is incompatible; retrain the model")
-    return artifact, profiles
+    if store_path.is_dir():
+        return artifact, ProfileStore.open(store_path)
+    return artifact, ProfileStore.from_frame(joblib.load(profiles_path))
 
 
-def load_runtime_artifacts(artifacts_dir: Path | str = DEFAULT_ARTIFACTS) -> tuple[dict[str, Any], pd.DataFrame]:
-    """Load the atomically selected DB model, or the tracked bootstrap model."""
+def load_runtime_version(
+    artifacts_dir: Path | str = DEFAULT_ARTIFACTS,
+) -> tuple[dict[str, Any], CandidatePool, dict[str, Any]]:
+    """Load the active model and report which version was actually selected."""
     root = Path(artifacts_dir)
     pointer = root / "active.json"
     if pointer.is_file():
         try:
-            selected = json.loads(pointer.read_text(encoding="utf-8"))["version"]
-            version_dir = root / "versions" / selected
-            return load_artifacts(version_dir)
-        except (KeyError, json.JSONDecodeError, OSError, RecommendationError):
+            selected = json.loads(pointer.read_text(encoding="utf-8"))
+            version_dir = root / "versions" / selected["version"]
+            artifact, profiles = load_candidate_pool(version_dir)
+            return artifact, profiles, {
+                "version": selected["version"],
+                "generation": selected.get("generation"),
+                "path": version_dir,
+            }
+        except (KeyError, TypeError, json.JSONDecodeError, OSError, RecommendationError):
             # A bad runtime pointer must not take down recommendations.
             pass
-    return load_artifacts(root)
+    artifact, profiles = load_candidate_pool(root)
+    return artifact, profiles, {"version": "bootstrap", "generation": None, "path": root}
+
+
+def load_runtime_artifacts(artifacts_dir: Path | str = DEFAULT_ARTIFACTS) -> tuple[dict[str, Any], CandidatePool]:
+    """Load the atomically selected DB model, or the tracked bootstrap model."""
+    artifact, profiles, _ = load_runtime_version(artifacts_dir)
+    return artifact, profiles
 
 
 def _education_group(value: Any) -> str:
@@ -407,6 +1007,764 @@ def _priority_key(
     )
 
 
+# Columnar scoring. The row-wise helpers above remain the reference semantics;
+# the functions below evaluate the same rules for every candidate at once.
+DIMENSIONS = ["age", "height", "weight", "religion", "education", "profession", "location", "lifestyle"]
+NO_MATCH, MATCH, NOT_SPECIFIED = 0, 1, -1
+UNSEEN_CODE = -1  # query value absent from the candidate vocabulary
+UNSET_CODE = -2  # preference disabled, so the dimension is not scored
+_LOCATION_SAME_CITY, _LOCATION_SPECIFIC = 1, 2
+
+
+def _unique_map(values: pd.Series, func) -> pd.Series:
+    """Apply a scalar normaliser once per distinct value."""
+    try:
+        uniques = pd.unique(values.to_numpy(dtype=object))
+    except TypeError:  # unhashable cells, such as lists that were already parsed
+        return values.map(func)
+    uniques = uniques[~pd.isna(uniques)]
+    return values.map({value: func(value) for value in uniques}).where(~values.isna(), func(None))
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (not isinstance(value, (list, tuple, set, dict, np.ndarray)) and pd.isna(value))
+
+
+def _encode(values: pd.Series, vocabulary: dict[str, int], extend: bool) -> np.ndarray:
+    if extend:
+        for value in pd.unique(values.to_numpy(dtype=object)):
+            vocabulary.setdefault(value, len(vocabulary))
+    return values.map(vocabulary).fillna(UNSEEN_CODE).to_numpy(dtype=np.int32)
+
+
+def _numeric(frame: pd.DataFrame, column: str) -> np.ndarray:
+    return pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _scoring_columns(frame: pd.DataFrame, vocabulary: dict[str, int], extend: bool) -> dict[str, np.ndarray]:
+    """Encode the fields read by the preference rules as aligned NumPy arrays.
+
+    Every categorical value shares one vocabulary, so cross-column rules such
+    as "candidate location equals owner's specific location" become integer
+    comparisons.
+    """
+    text = {
+        column: _unique_map(frame[column], _text)
+        for column in (
+            "gender", "religion", "location", "specific_location", "profession",
+            "dietary_preference", "preferred_religion", "preferred_education",
+            "preferred_profession", "preferred_location", "lifestyle_pref_smoking",
+            "lifestyle_pref_alcohol",
+        )
+    }
+
+    def codes(values: pd.Series, disabled: pd.Series | None = None) -> np.ndarray:
+        encoded = _encode(values, vocabulary, extend)
+        if disabled is not None:
+            encoded[disabled.to_numpy(dtype=bool)] = UNSET_CODE
+        return encoded
+
+    def habit_preference(values: pd.Series) -> np.ndarray:
+        return np.where(values.isin(NO_PREFERENCE), NOT_SPECIFIED, (values == "occasional").astype(np.int8)).astype(np.int8)
+
+    required = np.zeros(len(frame), dtype=np.uint8)
+    for row, preferences in enumerate(frame["necessary_preferences"]):
+        for key in set(preferences) & NECESSARY_KEYS:
+            required[row] |= 1 << DIMENSIONS.index(key)
+
+    location_preference = text["preferred_location"]
+    return {
+        "user_id": frame["user_id"].astype(str).to_numpy(dtype=str),
+        "age": _numeric(frame, "age"),
+        "height": _numeric(frame, "height"),
+        "weight": _numeric(frame, "weight"),
+        **{
+            f"{field}_{bound}": _numeric(frame, f"preferred_{field}_{bound}")
+            for field in ("age", "height", "weight") for bound in ("min", "max")
+        },
+        "gender": codes(text["gender"]),
+        "religion": codes(text["religion"]),
+        "religion_alias": codes(_unique_map(frame["religion"], _religion_value)),
+        "education": codes(_unique_map(frame["academic_background"], _education_group)),
+        "profession": codes(_unique_map(text["profession"], lambda value: PROFESSION_GROUPS.get(value, value))),
+        "location": codes(text["location"]),
+        "specific_location": codes(text["specific_location"]),
+        "dietary": codes(text["dietary_preference"]),
+        "smokes": _unique_map(frame["smoking_habit"], _bool).to_numpy(dtype=bool),
+        "drinks": _unique_map(frame["alcohol_consumption"], _bool).to_numpy(dtype=bool),
+        "pref_religion": codes(text["preferred_religion"], text["preferred_religion"].isin(NO_PREFERENCE)),
+        "pref_education": codes(text["preferred_education"], text["preferred_education"].isin(NO_PREFERENCE)),
+        "pref_profession": codes(
+            text["preferred_profession"], text["preferred_profession"] == "any respectful profession"
+        ),
+        "pref_location": np.select(
+            [location_preference == "samecity", location_preference == "specific"],
+            [_LOCATION_SAME_CITY, _LOCATION_SPECIFIC], 0,
+        ).astype(np.int8),
+        "pref_smoking": habit_preference(text["lifestyle_pref_smoking"]),
+        "pref_alcohol": habit_preference(text["lifestyle_pref_alcohol"]),
+        "pref_dietary_match": _unique_map(frame["lifestyle_pref_dietary_match"], _bool).to_numpy(dtype=bool),
+        "required": required,
+    }
+
+
+def build_scoring_table(profiles: pd.DataFrame) -> dict[str, Any]:
+    """Precompute the columnar arrays used to score a whole candidate pool."""
+    vocabulary: dict[str, int] = {}
+    columns = _scoring_columns(profiles, vocabulary, extend=True)
+    return {
+        "columns": columns,
+        "vocabulary": vocabulary,
+        "size": len(profiles),
+        "partitions": _partition_runs(columns),
+    }
+
+
+def sort_by_partition(profiles: pd.DataFrame) -> pd.DataFrame:
+    """Order profiles so each (gender, religion alias) partition is one contiguous block."""
+    gender = _unique_map(profiles["gender"], _text).to_numpy(dtype=str)
+    religion = _unique_map(profiles["religion"], _religion_value).to_numpy(dtype=str)
+    return profiles.iloc[np.lexsort((religion, gender))].reset_index(drop=True)
+
+
+def _partition_runs(columns: dict[str, np.ndarray]) -> np.ndarray | None:
+    """Return ``[gender, religion_alias, start, stop]`` for each partition.
+
+    Rows sorted with :func:`sort_by_partition` give exactly one run per
+    partition. Tables that were not sorted (older artifacts) return ``None``
+    and are filtered with a full-table mask instead.
+    """
+    gender, alias = np.asarray(columns["gender"]), np.asarray(columns["religion_alias"])
+    if not len(gender):
+        return np.empty((0, 4), dtype=np.int64)
+    change = np.flatnonzero((gender[1:] != gender[:-1]) | (alias[1:] != alias[:-1])) + 1
+    starts = np.concatenate([[0], change])
+    stops = np.concatenate([change, [len(gender)]])
+    runs = np.column_stack([gender[starts], alias[starts], starts, stops]).astype(np.int64)
+    if len(np.unique(runs[:, :2], axis=0)) != len(runs):
+        return None
+    return runs
+
+
+def eligible_spans(query: pd.Series, table: dict[str, Any]) -> np.ndarray | None:
+    """Row ranges of the partitions a query may match, or ``None`` for unsorted tables.
+
+    Covers the gender and religion rules of :func:`eligible_candidates`; the
+    query's own row is removed by the caller.
+    """
+    partitions = table.get("partitions")
+    if partitions is None:
+        return None
+    vocabulary = table["vocabulary"]
+    keep = partitions[:, 0] != vocabulary.get(_text(query.get("gender")), UNSEEN_CODE)
+    religion = _religion_filter_value(query)
+    if religion is not None:
+        keep &= partitions[:, 1] == vocabulary.get(religion, UNSEEN_CODE)
+    return partitions[keep, 2:]
+
+
+STORE_NUMERIC_COLS = NUMERIC_COLS + [
+    "preferred_age_min", "preferred_age_max", "preferred_height_min",
+    "preferred_height_max", "preferred_weight_min", "preferred_weight_max",
+]
+STORE_LIST_COLS = ["necessary_preferences", "interest_tokens"]
+# Sensitive fields never affect ranking, so they are not published at all.
+STORE_TEXT_COLS = sorted(
+    REQUIRED_COLUMNS - set(STORE_NUMERIC_COLS) - set(STORE_LIST_COLS)
+    - set(SENSITIVE_TEXT_COLS) - {"user_id", "genetic_conditions"}
+)
+
+
+def _string_blob(values: Iterable[Any]) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [str(value).encode("utf-8") for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+class ProfileStore:
+    """Columnar, read-only copy of the profiles an artifact was trained on.
+
+    Text columns are codes into one shared vocabulary, numeric columns are
+    fixed-width ``float64`` and list columns use a CSR layout (offsets plus
+    codes). A saved store is opened with ``mmap_mode="r"``, so workers share
+    its pages and only the rows that are displayed are decoded. The scoring
+    table is persisted alongside it and needs no rebuilding at load time.
+    """
+
+    def __init__(self, arrays: dict[str, np.ndarray], table: dict[str, Any]) -> None:
+        self._arrays = arrays
+        self.table = table
+        self._words: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return self.table["size"]
+
+    @property
+    def user_ids(self) -> np.ndarray:
+        return self.table["columns"]["user_id"]
+
+    def find(self, user_id: Any) -> int | None:
+        matches = np.flatnonzero(self.user_ids == str(user_id))
+        return int(matches[0]) if len(matches) else None
+
+    def _word(self, code: int) -> str | None:
+        if code < 0:
+            return None
+        data, offsets = self._arrays["vocabulary.data"], self._arrays["vocabulary.offsets"]
+        return data[offsets[code]:offsets[code + 1]].tobytes().decode("utf-8")
+
+    def _list(self, column: str, index: int) -> list[str]:
+        offsets = self._arrays[f"{column}.offsets"]
+        codes = self._arrays[f"{column}.values"][offsets[index]:offsets[index + 1]]
+        return [self._word(int(code)) for code in codes]
+
+    def row(self, index: int) -> pd.Series:
+        """Decode one profile for scoring a query or displaying a match."""
+        index = int(index)
+        values: dict[str, Any] = {"user_id": str(self.user_ids[index])}
+        values.update({column: self._word(int(self._arrays[column][index])) for column in STORE_TEXT_COLS})
+        values.update({column: float(self._arrays[column][index]) for column in STORE_NUMERIC_COLS})
+        values.update({column: self._list(column, index) for column in STORE_LIST_COLS})
+        return pd.Series(values, name=index)
+
+    def frame(self) -> pd.DataFrame:
+        """Decode every row, e.g. to rebuild features for an older artifact."""
+        if self._words is None:
+            data, offsets = self._arrays["vocabulary.data"], self._arrays["vocabulary.offsets"]
+            text = data.tobytes()
+            words = [text[offsets[code]:offsets[code + 1]].decode("utf-8") for code in range(len(offsets) - 1)]
+            # Code -1 (missing) indexes the trailing None.
+            self._words = np.array(words + [None], dtype=object)
+        columns: dict[str, Any] = {"user_id": np.asarray(self.user_ids, dtype=str)}
+        columns.update({column: self._words[self._arrays[column]] for column in STORE_TEXT_COLS})
+        columns.update({column: np.asarray(self._arrays[column]) for column in STORE_NUMERIC_COLS})
+        for column in STORE_LIST_COLS:
+            offsets = self._arrays[f"{column}.offsets"]
+            values = self._words[self._arrays[f"{column}.values"]]
+            columns[column] = [values[offsets[index]:offsets[index + 1]].tolist() for index in range(len(self))]
+        return pd.DataFrame(columns)
+
+    @classmethod
+    def from_frame(cls, profiles: pd.DataFrame) -> ProfileStore:
+        """Encode normalized profiles in memory."""
+        lists = {column: profiles[column].tolist() for column in STORE_LIST_COLS}
+        flat = {
+            column: np.array([item for items in lists[column] for item in items], dtype=object)
+            for column in STORE_LIST_COLS
+        }
+        pieces = [profiles[column].to_numpy(dtype=object) for column in STORE_TEXT_COLS]
+        pieces += [flat[column] for column in STORE_LIST_COLS]
+        codes, vocabulary = pd.factorize(np.concatenate(pieces)) if pieces else (np.empty(0), [])
+        codes = codes.astype(np.int32)
+
+        arrays: dict[str, np.ndarray] = {}
+        start = 0
+        for column in STORE_TEXT_COLS:
+            arrays[column] = codes[start:start + len(profiles)]
+            start += len(profiles)
+        for column in STORE_LIST_COLS:
+            arrays[f"{column}.values"] = codes[start:start + len(flat[column])]
+            start += len(flat[column])
+            offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+            np.cumsum([len(items) for items in lists[column]], out=offsets[1:])
+            arrays[f"{column}.offsets"] = offsets
+        for column in STORE_NUMERIC_COLS:
+            arrays[column] = pd.to_numeric(profiles[column], errors="coerce").to_numpy(dtype=np.float64)
+        arrays["vocabulary.data"], arrays["vocabulary.offsets"] = _string_blob(vocabulary)
+        return cls(arrays, build_scoring_table(profiles))
+
+    def save(self, directory: Path | str) -> dict[str, Any]:
+        """Write one ``.npy`` per array plus a manifest; return metadata for the artifact."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        for name, values in self._arrays.items():
+            np.save(path / f"{name}.npy", np.ascontiguousarray(values))
+        for name, values in self.table["columns"].items():
+            np.save(path / f"scoring.{name}.npy", np.ascontiguousarray(values))
+        vocabulary = sorted(self.table["vocabulary"], key=self.table["vocabulary"].get)
+        manifest = {
+            "format": PROFILE_STORE_FORMAT,
+            "row_count": len(self),
+            "arrays": sorted(self._arrays),
+            "scoring_columns": list(self.table["columns"]),
+            "scoring_vocabulary": vocabulary,
+        }
+        (path / "manifest.json").write_text(json.dumps(manifest) + "\n", encoding="utf-8")
+        return {"directory": path.name, "format": PROFILE_STORE_FORMAT, "row_count": len(self)}
+
+    @classmethod
+    def open(cls, directory: Path | str) -> ProfileStore:
+        """Memory-map a saved store read-only."""
+        path = Path(directory)
+        try:
+            manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as exc:
+            raise RecommendationError(f"Profile store manifest is unreadable in {path}") from exc
+        if manifest.get("format") != PROFILE_STORE_FORMAT:
+            raise RecommendationError("Profile store format is incompatible; retrain the model")
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in manifest["arrays"]}
+        columns = {
+            name: np.load(path / f"scoring.{name}.npy", mmap_mode="r")
+            for name in manifest["scoring_columns"]
+        }
+        table = {
+            "columns": columns,
+            "vocabulary": {value: code for code, value in enumerate(manifest["scoring_vocabulary"])},
+            "size": manifest["row_count"],
+        }
+        if any(len(values) != table["size"] for values in columns.values()):
+            raise RecommendationError(f"Profile store in {path} has inconsistent row counts")
+        table["partitions"] = _partition_runs(columns)
+        return cls(arrays, table)
+
+
+def _query_columns(query: pd.Series, table: dict[str, Any]) -> dict[str, np.ndarray]:
+    return _scoring_columns(pd.DataFrame([query]), table["vocabulary"], extend=False)
+
+
+def eligible_candidates(query: pd.Series, table: dict[str, Any]) -> np.ndarray:
+    """Vectorized :func:`_candidate_is_eligible` over the whole table."""
+    columns, vocabulary = table["columns"], table["vocabulary"]
+    mask = columns["user_id"] != str(query.get("user_id"))
+    mask &= columns["gender"] != vocabulary.get(_text(query.get("gender")), UNSEEN_CODE)
+    religion = _religion_filter_value(query)
+    if religion is not None:
+        mask &= columns["religion_alias"] == vocabulary.get(religion, UNSEEN_CODE)
+    return mask
+
+
+def _take(columns: dict[str, np.ndarray], rows: np.ndarray) -> dict[str, np.ndarray]:
+    return {key: values[rows] for key, values in columns.items()}
+
+
+def _range_codes(owner: dict[str, np.ndarray], candidate: dict[str, np.ndarray], field: str) -> np.ndarray:
+    low, high, value = owner[f"{field}_min"], owner[f"{field}_max"], candidate[field]
+    unknown = np.isnan(low) | np.isnan(high) | np.isnan(value)
+    return np.where(unknown, NOT_SPECIFIED, (low <= value) & (value <= high))
+
+
+def _category_codes(preference: np.ndarray, value: np.ndarray) -> np.ndarray:
+    return np.where(preference == UNSET_CODE, NOT_SPECIFIED, value == preference)
+
+
+def _directional_codes(owner: dict[str, np.ndarray], candidate: dict[str, np.ndarray]) -> np.ndarray:
+    """Evaluate :func:`_directional_preferences` dimensions as a (rows, 8) array.
+
+    Either side may be a single broadcast row; values are ``MATCH``,
+    ``NO_MATCH`` or ``NOT_SPECIFIED`` (the ``None`` of the row-wise rules).
+    """
+    kind = owner["pref_location"]
+    location = np.where(
+        kind == _LOCATION_SAME_CITY, candidate["location"] == owner["location"],
+        np.where(kind == _LOCATION_SPECIFIC, candidate["location"] == owner["specific_location"], NOT_SPECIFIED),
+    )
+
+    smoking_set, alcohol_set = owner["pref_smoking"] != NOT_SPECIFIED, owner["pref_alcohol"] != NOT_SPECIFIED
+    diet_set = owner["pref_dietary_match"]
+    lifestyle_ok = (
+        (~smoking_set | (candidate["smokes"] == (owner["pref_smoking"] == MATCH)))
+        & (~alcohol_set | (candidate["drinks"] == (owner["pref_alcohol"] == MATCH)))
+        & (~diet_set | (candidate["dietary"] == owner["dietary"]))
+    )
+    lifestyle = np.where(smoking_set | alcohol_set | diet_set, lifestyle_ok, NOT_SPECIFIED)
+
+    dimensions = [
+        _range_codes(owner, candidate, "age"),
+        _range_codes(owner, candidate, "height"),
+        _range_codes(owner, candidate, "weight"),
+        _category_codes(owner["pref_religion"], candidate["religion"]),
+        _category_codes(owner["pref_education"], candidate["education"]),
+        _category_codes(owner["pref_profession"], candidate["profession"]),
+        location,
+        lifestyle,
+    ]
+    return np.stack(np.broadcast_arrays(*dimensions), axis=1).astype(np.int8)
+
+
+def _required_bits(required: np.ndarray) -> np.ndarray:
+    """Expand required bitmasks into a (rows, 8) boolean array."""
+    return ((required[:, None] >> np.arange(len(DIMENSIONS), dtype=np.uint8)) & 1).astype(bool)
+
+
+def _directional_scores(codes: np.ndarray, required: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    weights = np.where(required, 2.0, 1.0)
+    possible = np.where(codes != NOT_SPECIFIED, weights, 0.0).sum(axis=1)
+    total = np.where(codes == MATCH, weights, 0.0).sum(axis=1)
+    score = np.divide(total, possible, out=np.ones_like(total), where=possible > 0)
+    failures = (required & (codes == NO_MATCH)).sum(axis=1)
+    return score, failures
+
+
+def score_candidates(
+    query: pd.Series,
+    table: dict[str, Any],
+    rows: np.ndarray,
+    similarity: np.ndarray,
+    query_columns: dict[str, np.ndarray] | None = None,
+) -> dict[str, np.ndarray]:
+    """Score query -> candidate and candidate -> query for many rows in one batch.
+
+    Produces the same values the row-wise ``_directional_preferences`` and
+    ``_priority_key`` would, as arrays aligned with ``rows``. ``query_columns``
+    may carry the query's encoded row when it was encoded with others.
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    if query_columns is None:
+        query_columns = _query_columns(query, table)
+    candidates = _take(table["columns"], rows)
+
+    a_to_b = _directional_codes(query_columns, candidates).reshape(len(rows), len(DIMENSIONS))
+    b_to_a = _directional_codes(candidates, query_columns).reshape(len(rows), len(DIMENSIONS))
+    query_required = np.broadcast_to(_required_bits(query_columns["required"]), a_to_b.shape)
+    candidate_required = _required_bits(candidates["required"])
+
+    a_score, a_failures = _directional_scores(a_to_b, query_required)
+    b_score, b_failures = _directional_scores(b_to_a, candidate_required)
+    mutual = ((query_required | candidate_required) & (a_to_b == MATCH) & (b_to_a == MATCH)).sum(axis=1)
+    similarity = np.asarray(similarity, dtype=np.float64)
+    preference = (a_score + b_score) / 2.0
+    return {
+        "rows": rows,
+        "a_to_b": a_to_b,
+        "b_to_a": b_to_a,
+        "query_required": query_columns["required"][0],
+        "candidate_required": candidates["required"],
+        "a_score": a_score,
+        "b_score": b_score,
+        "requester_failures": a_failures,
+        "reciprocal_failures": b_failures,
+        "mutual": mutual,
+        "similarity": similarity,
+        "preference": preference,
+        "score": 0.40 * similarity + 0.60 * preference,
+    }
+
+
+def priority_order(scored: dict[str, np.ndarray], user_ids: np.ndarray) -> np.ndarray:
+    """Positions of ``scored`` sorted exactly like ``_priority_key``."""
+    _, tie_break = np.unique(np.asarray(user_ids, dtype=str), return_inverse=True)
+    return np.lexsort((
+        tie_break,
+        -scored["similarity"],
+        -scored["score"],
+        -scored["mutual"],
+        scored["reciprocal_failures"],
+        scored["requester_failures"],
+    ))
+
+
+_ORDER_KEYS = ("requester_failures", "reciprocal_failures", "mutual", "score", "similarity")
+
+
+def top_k_order(scored: dict[str, np.ndarray], user_ids: np.ndarray, top_k: int) -> np.ndarray:
+    """Return ``priority_order(scored, user_ids)[:top_k]`` without sorting the whole pool.
+
+    The integer part of the priority key (failures and mutual matches) is
+    packed into one value and the k-th best is found with ``np.partition``.
+    Everything strictly better is selected outright; among the boundary ties
+    only the best scores survive, always keeping every candidate that ties the
+    cut-off so that the final exact lexsort runs on roughly ``top_k`` rows.
+    When the boundary group is large (for example identical scores), that
+    group is simply sorted in full, so the result is always exact.
+    """
+    user_ids = np.asarray(user_ids)
+    size = len(scored["score"])
+    if top_k <= 0 or size == 0:
+        return np.empty(0, dtype=np.intp)
+    if size <= top_k:
+        return priority_order(scored, user_ids)
+
+    base = len(DIMENSIONS) + 1
+    prefix = (
+        (scored["requester_failures"] * base + scored["reciprocal_failures"]) * base
+        + (len(DIMENSIONS) - scored["mutual"])
+    )
+    boundary = np.partition(prefix, top_k - 1)[top_k - 1]
+    better = np.flatnonzero(prefix < boundary)
+    tied = np.flatnonzero(prefix == boundary)
+    needed = top_k - len(better)
+    if len(tied) > needed:
+        negative_score = -scored["score"][tied]
+        cutoff = np.partition(negative_score, needed - 1)[needed - 1]
+        tied = tied[negative_score <= cutoff]
+    shortlist = np.concatenate([better, tied])
+    order = priority_order({key: scored[key][shortlist] for key in _ORDER_KEYS}, user_ids[shortlist])
+    return shortlist[order[:top_k]]
+
+
+def rank_candidates(
+    query: pd.Series,
+    query_vector: np.ndarray,
+    table: dict[str, Any],
+    features: np.ndarray,
+    index=None,
+    candidates: int = ANN_CANDIDATES,
+    similarity: np.ndarray | None = None,
+    query_columns: dict[str, np.ndarray] | None = None,
+) -> dict[str, np.ndarray]:
+    """Score the eligible candidates for one query.
+
+    Only the query's eligible (gender, religion) partitions are visited, and
+    cosine similarity is one product per partition against the L2-normalized
+    feature rows. With an approximate ``index`` only its ``candidates`` most
+    similar rows are scored. Batched callers can pass ``similarity`` against
+    every row (one column of a block product, used by exact rankings) and
+    the query's encoded ``query_columns``. Pass the result to
+    :func:`top_k_order` to pick matches.
+    """
+    query_vector = dense_rows(query_vector).ravel()
+    spans = eligible_spans(query, table)
+    approximate = index is not None and not index.exact
+    if approximate:
+        rows, similarity = index.search(query_vector, candidates, spans)
+        keep = eligible_candidates(query, table)[rows]
+    elif spans is None:
+        rows = np.flatnonzero(eligible_candidates(query, table))
+        similarity = features[rows] @ query_vector if similarity is None else similarity[rows]
+        keep = slice(None)
+    else:
+        rows = np.concatenate([np.arange(start, stop) for start, stop in spans] + [np.empty(0, dtype=np.intp)])
+        if similarity is None:
+            # Each partition is a contiguous slice, so no rows are gathered.
+            similarity = np.concatenate(
+                [features[start:stop] @ query_vector for start, stop in spans] + [np.empty(0)]
+            )
+        else:
+            similarity = similarity[rows]
+        keep = table["columns"]["user_id"][rows] != str(query.get("user_id"))
+    return score_candidates(query, table, rows[keep], np.clip(similarity[keep], 0.0, 1.0), query_columns)
+
+
+OVERLAY_FILE = "overlay.json"
+REMOVED_FILE = "removed.npy"
+
+
+@dataclass(frozen=True)
+class PoolSegment:
+    """One block of candidate rows and the arrays needed to rank them."""
+
+    profiles: ProfileStore
+    features: np.ndarray
+    index: PartitionedIndex
+    offset: int
+    removed: np.ndarray | None = None
+
+
+def _concat_scored(parts: list[dict[str, np.ndarray]]) -> dict[str, np.ndarray]:
+    return {
+        key: parts[0][key] if key == "query_required" else np.concatenate([part[key] for part in parts])
+        for key in parts[0]
+    }
+
+
+class CandidatePool:
+    """Every candidate row of one model version.
+
+    A full training run yields a single segment. Incremental publishes add an
+    overlay segment holding re-encoded copies of changed profiles; the base
+    rows they replace (or that were removed) are masked and never ranked.
+    Row numbers are global across segments, in segment order.
+    """
+
+    def __init__(self, segments: list[PoolSegment], base_version: str | None = None) -> None:
+        self.segments = segments
+        self.base_version = base_version
+        if len(segments) == 1:
+            self.user_ids = segments[0].profiles.user_ids
+        else:
+            self.user_ids = np.concatenate([np.asarray(segment.profiles.user_ids) for segment in segments])
+        self._changed_ids: frozenset[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def live_count(self) -> int:
+        return len(self) - sum(int(segment.removed.sum()) for segment in self.segments if segment.removed is not None)
+
+    @property
+    def overlay_count(self) -> int:
+        return sum(len(segment.profiles) for segment in self.segments[1:])
+
+    @property
+    def changed_ids(self) -> frozenset[str]:
+        """User IDs whose base rows were replaced or removed by the overlay."""
+        if self._changed_ids is None:
+            base = self.segments[0]
+            changed = set() if base.removed is None else set(np.asarray(base.profiles.user_ids)[base.removed].tolist())
+            for segment in self.segments[1:]:
+                changed.update(np.asarray(segment.profiles.user_ids).tolist())
+            self._changed_ids = frozenset(changed)
+        return self._changed_ids
+
+    def _locate(self, row: int) -> tuple[PoolSegment, int]:
+        for segment in reversed(self.segments):
+            if row >= segment.offset:
+                return segment, int(row) - segment.offset
+        raise IndexError(row)
+
+    def row(self, row: int) -> pd.Series:
+        segment, local = self._locate(row)
+        return segment.profiles.row(local)
+
+    def vector(self, row: int) -> np.ndarray:
+        segment, local = self._locate(row)
+        return dense_rows(segment.features[local:local + 1])[0]
+
+    def find(self, user_id: Any) -> int | None:
+        # Later segments hold the newest copy of a profile.
+        for segment in reversed(self.segments):
+            local = segment.profiles.find(user_id)
+            if local is not None and (segment.removed is None or not segment.removed[local]):
+                return segment.offset + local
+        return None
+
+    def score_row(self, query: pd.Series, query_vector: np.ndarray, row: int) -> dict[str, np.ndarray] | None:
+        """Score a single candidate row, or ``None`` when the query cannot be matched with it."""
+        segment, local = self._locate(row)
+        table = segment.profiles.table
+        if (segment.removed is not None and segment.removed[local]) or not eligible_candidates(query, table)[local]:
+            return None
+        similarity = segment.features[local:local + 1] @ dense_rows(query_vector).ravel()
+        scored = score_candidates(query, table, np.array([local]), np.clip(similarity, 0.0, 1.0))
+        scored["rows"] = scored["rows"] + segment.offset
+        return scored
+
+    def live_rows(self) -> np.ndarray:
+        """Global row numbers of every rankable profile, in row order."""
+        return np.concatenate([
+            segment.offset + (
+                np.arange(len(segment.profiles)) if segment.removed is None else np.flatnonzero(~segment.removed)
+            )
+            for segment in self.segments
+        ])
+
+    def similarity(self, query_vectors: np.ndarray) -> list[np.ndarray | None]:
+        """Cosine of every row against a block of queries, one ``rows x queries`` array per segment.
+
+        Segments with an approximate index get ``None``; they are searched
+        per query instead.
+        """
+        block = np.ascontiguousarray(np.asarray(query_vectors, dtype=np.float32).T)
+        return [
+            None if not segment.index.exact else np.asarray(segment.features @ block)
+            for segment in self.segments
+        ]
+
+    def query_columns(self, queries: pd.DataFrame) -> list[dict[str, np.ndarray]]:
+        """Encode a block of query rows against each segment's vocabulary at once."""
+        return [
+            _scoring_columns(queries, segment.profiles.table["vocabulary"], extend=False)
+            for segment in self.segments
+        ]
+
+    def rank(
+        self,
+        query: pd.Series,
+        query_vector: np.ndarray,
+        candidates: int = ANN_CANDIDATES,
+        segments: Iterable[int] | None = None,
+        similarity: list[np.ndarray | None] | None = None,
+        query_columns: list[dict[str, np.ndarray]] | None = None,
+    ) -> dict[str, np.ndarray]:
+        """:func:`rank_candidates` over each segment, merged with global row numbers.
+
+        ``similarity`` and ``query_columns`` optionally hold one entry per
+        segment, e.g. one query's slice of :meth:`similarity` and
+        :meth:`query_columns`.
+        """
+        parts = []
+        for number in range(len(self.segments)) if segments is None else segments:
+            segment = self.segments[number]
+            scored = rank_candidates(
+                query, query_vector, segment.profiles.table, segment.features, segment.index, candidates,
+                None if similarity is None else similarity[number],
+                None if query_columns is None else query_columns[number],
+            )
+            if segment.removed is not None:
+                keep = ~segment.removed[scored["rows"]]
+                scored = {
+                    key: values if key == "query_required" else values[keep]
+                    for key, values in scored.items()
+                }
+            scored["rows"] = scored["rows"] + segment.offset
+            parts.append(scored)
+        return _concat_scored(parts)
+
+
+def _load_segment(directory: Path, artifact: dict[str, Any], profiles: ProfileStore, offset: int, removed=None) -> PoolSegment:
+    features = load_features(directory, artifact, profiles)
+    return PoolSegment(profiles, features, load_index(directory, features), offset, removed)
+
+
+def load_candidate_pool(artifacts_dir: Path | str) -> tuple[dict[str, Any], CandidatePool]:
+    """Load a full artifact directory, or an overlay version together with its base."""
+    path = Path(artifacts_dir)
+    spec_path = path / OVERLAY_FILE
+    if not spec_path.is_file():
+        artifact, profiles = load_artifacts(path)
+        return artifact, CandidatePool([_load_segment(path, artifact, profiles, 0)], path.name)
+    try:
+        spec = json.loads(spec_path.read_text(encoding="utf-8"))
+        base_dir = path.parent / spec["base"]
+    except (KeyError, TypeError, json.JSONDecodeError) as exc:
+        raise RecommendationError(f"Overlay description in {path} is invalid") from exc
+    artifact, base = load_artifacts(base_dir)
+    removed = np.zeros(len(base), dtype=bool)
+    removed[np.load(path / REMOVED_FILE)] = True
+    segments = [_load_segment(base_dir, artifact, base, 0, removed)]
+    # An overlay made only of removals has no rows of its own.
+    if (path / PROFILE_STORE_DIR).is_dir():
+        overlay = ProfileStore.open(path / PROFILE_STORE_DIR)
+        segments.append(_load_segment(path, artifact, overlay, len(base)))
+    return artifact, CandidatePool(segments, base_dir.name)
+
+
+def _preference_result(codes: np.ndarray, required: int, score: float) -> dict[str, Any]:
+    dimensions = {
+        key: None if code == NOT_SPECIFIED else bool(code == MATCH)
+        for key, code in zip(DIMENSIONS, codes.tolist())
+    }
+    required_keys = sorted(key for index, key in enumerate(DIMENSIONS) if int(required) >> index & 1)
+    return {
+        "score": float(score),
+        "dimensions": dimensions,
+        "required": required_keys,
+        "required_failures": sorted(key for key in required_keys if dimensions[key] is False),
+    }
+
+
+def pair_preferences(scored: dict[str, np.ndarray], position: int) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Rebuild the row-wise preference dicts for one scored candidate."""
+    return (
+        _preference_result(scored["a_to_b"][position], scored["query_required"], scored["a_score"][position]),
+        _preference_result(
+            scored["b_to_a"][position], scored["candidate_required"][position], scored["b_score"][position]
+        ),
+    )
+
+
+def pair_codes(scored: dict[str, np.ndarray], position: int) -> dict[str, Any]:
+    """The scoring vectors of one candidate as plain JSON values, small enough to cache."""
+    return {
+        "a_to_b": scored["a_to_b"][position].tolist(),
+        "b_to_a": scored["b_to_a"][position].tolist(),
+        "query_required": int(scored["query_required"]),
+        "candidate_required": int(scored["candidate_required"][position]),
+        "a_score": float(scored["a_score"][position]),
+        "b_score": float(scored["b_score"][position]),
+    }
+
+
+def pair_preferences_from_codes(codes: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
+    """:func:`pair_preferences` for a candidate stored with :func:`pair_codes`."""
+    return (
+        _preference_result(np.asarray(codes["a_to_b"]), codes["query_required"], codes["a_score"]),
+        _preference_result(np.asarray(codes["b_to_a"]), codes["candidate_required"], codes["b_score"]),
+    )
+
+
 def _reasons(a_to_b: dict[str, Any], b_to_a: dict[str, Any], similarity: float) -> list[str]:
     labels = {
         "age": "mutual age preference", "height": "mutual height preference",
@@ -565,6 +1923,47 @@ def _build_match_explanation(
     }
 
 
+def _match_item(
+    query: pd.Series,
+    candidate: pd.Series,
+    scored: dict[str, np.ndarray],
+    position: int,
+) -> dict[str, Any]:
+    a_to_b, b_to_a = pair_preferences(scored, position)
+    similarity = float(scored["similarity"][position])
+    preference = float(scored["preference"][position])
+    relaxed = sorted(set(a_to_b["required_failures"] + b_to_a["required_failures"]))
+    return {
+        "user_id": candidate["user_id"],
+        "name": candidate["name"],
+        "age": int(candidate["age"]) if float(candidate["age"]).is_integer() else float(candidate["age"]),
+        "gender": candidate["gender"],
+        "religion": candidate["religion"],
+        "location": candidate["location"],
+        "profession": candidate["profession"],
+        "score": round(0.40 * similarity + 0.60 * preference, 4),
+        "similarity": round(similarity, 4),
+        "preference_score": round(preference, 4),
+        "strict_compatible": not relaxed,
+        "reason_tags": _reasons(a_to_b, b_to_a, similarity),
+        "relaxed_preferences": relaxed,
+        "match_explanation": _build_match_explanation(query, candidate, a_to_b, b_to_a, similarity, preference),
+    }
+
+
+def _recommendation(pool: CandidatePool, query: pd.Series, scored: dict[str, np.ndarray], top_k: int) -> dict[str, Any]:
+    order = top_k_order(scored, pool.user_ids[scored["rows"]], top_k)
+    selected = []
+    for rank, position in enumerate(order, start=1):
+        candidate = pool.row(scored["rows"][position])
+        selected.append({**_match_item(query, candidate, scored, position), "rank": rank})
+    return {
+        "query_user": {"user_id": query["user_id"], "name": query["name"]},
+        "match_count": len(selected),
+        "matches": selected,
+    }
+
+
 def recommend(
     user_id: str,
     top_k: int = 5,
@@ -573,57 +1972,63 @@ def recommend(
     if top_k < 1:
         raise RecommendationError("top-k must be at least 1")
     top_k = min(top_k, 100)
-    artifact, profiles = load_artifacts(artifacts_dir)
-    matches = profiles.index[profiles["user_id"] == str(user_id)].tolist()
-    if not matches:
+    _, profiles = load_candidate_pool(artifacts_dir)
+    query_index = profiles.find(user_id)
+    if query_index is None:
         raise RecommendationError(f"User not found: {user_id}")
-    query_index = matches[0]
-    query = profiles.loc[query_index]
-    matrix = transform_profiles(profiles, artifact)
-    distances, indices = artifact["knn"].kneighbors(
-        matrix[[query_index]], n_neighbors=len(profiles)
-    )
+    query = profiles.row(query_index)
+    return _recommendation(profiles, query, profiles.rank(query, profiles.vector(query_index)), top_k)
 
-    scored: list[dict[str, Any]] = []
-    for distance, index in zip(distances[0], indices[0]):
-        candidate = profiles.iloc[index]
-        if not _candidate_is_eligible(query, candidate):
-            continue
-        similarity = max(0.0, min(1.0, 1.0 - float(distance)))
-        a_to_b = _directional_preferences(query, candidate)
-        b_to_a = _directional_preferences(candidate, query)
-        preference = (a_to_b["score"] + b_to_a["score"]) / 2.0
-        relaxed = sorted(set(a_to_b["required_failures"] + b_to_a["required_failures"]))
-        explanation = _build_match_explanation(query, candidate, a_to_b, b_to_a, similarity, preference)
-        scored.append({
-            "user_id": candidate["user_id"],
-            "name": candidate["name"],
-            "age": int(candidate["age"]) if float(candidate["age"]).is_integer() else float(candidate["age"]),
-            "gender": candidate["gender"],
-            "religion": candidate["religion"],
-            "location": candidate["location"],
-            "profession": candidate["profession"],
-            "score": round(0.40 * similarity + 0.60 * preference, 4),
-            "similarity": round(similarity, 4),
-            "preference_score": round(preference, 4),
-            "strict_compatible": not relaxed,
-            "reason_tags": _reasons(a_to_b, b_to_a, similarity),
-            "relaxed_preferences": relaxed,
-            "match_explanation": explanation,
-            "priority_key": _priority_key(
-                a_to_b, b_to_a,
-                0.40 * similarity + 0.60 * preference,
-                similarity, str(candidate["user_id"]),
-            ),
-        })
 
-    ordered = sorted(scored, key=lambda item: item["priority_key"])
-    selected = ordered[:top_k]
-    for rank, item in enumerate(selected, start=1):
-        item.pop("priority_key", None)
-        item["rank"] = rank
-    return {
-        "query_user": {"user_id": query["user_id"], "name": query["name"]},
-        "match_count": len(selected),
-        "matches": selected,
-    }
+# Cap on the similarity cells (rows x queries) computed by one block product.
+RECOMMEND_BLOCK_CELLS = 1 << 24
+
+
+def recommend_many(
+    user_ids: Iterable[str] | None = None,
+    top_k: int = 5,
+    artifacts_dir: Path | str = DEFAULT_ARTIFACTS,
+    block_size: int = 256,
+) -> Iterator[dict[str, Any]]:
+    """Yield :func:`recommend` results for many users from one artifact load.
+
+    ``user_ids`` may be any iterable, e.g. the lines of a file; ``None``
+    means every profile in the model. Queries are taken ``block_size`` at a
+    time (fewer on large models, to bound memory) and their similarities to
+    every row come from one sparse-by-dense product per block. Unknown IDs
+    yield ``{"query_user": {"user_id": ...}, "error": ...}`` instead of
+    stopping the run.
+    """
+    if top_k < 1:
+        raise RecommendationError("top-k must be at least 1")
+    top_k = min(top_k, 100)
+    _, pool = load_candidate_pool(artifacts_dir)
+    live = pool.live_rows()
+    if user_ids is None:
+        user_ids = pool.user_ids[live]
+    rows_by_id = dict(zip(np.asarray(pool.user_ids[live], dtype=str).tolist(), live.tolist()))
+    block_size = max(1, min(block_size, RECOMMEND_BLOCK_CELLS // max(len(pool), 1)))
+
+    user_ids = iter(user_ids)
+    while True:
+        block = [str(user_id).strip() for user_id in itertools.islice(user_ids, block_size)]
+        if not block:
+            return
+        found = [rows_by_id[user_id] for user_id in block if user_id in rows_by_id]
+        if found:
+            queries = [pool.row(row) for row in found]
+            vectors = np.vstack([pool.vector(row) for row in found])
+            similarity = pool.similarity(vectors)
+            encoded = pool.query_columns(pd.DataFrame(queries))
+        column = 0
+        for user_id in block:
+            if user_id not in rows_by_id:
+                yield {"query_user": {"user_id": user_id}, "error": f"User not found: {user_id}"}
+                continue
+            scored = pool.rank(
+                queries[column], vectors[column],
+                similarity=[None if values is None else values[:, column] for values in similarity],
+                query_columns=[_take(columns, [column]) for columns in encoded],
+            )
+            yield _recommendation(pool, queries[column], scored, top_k)
+            column += 1
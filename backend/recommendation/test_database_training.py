@@ -1,10 +1,14 @@
 import json
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
 from recommendation import database_training
-from recommender import DEFAULT_CSV, load_profiles, load_runtime_artifacts
+from recommender import (
+    DEFAULT_CSV, ProfileStore, load_profiles, load_runtime_artifacts, normalize_profiles,
+    rank_candidates, sort_by_partition, transform_profiles, transform_query,
+)
 
 
 def test_database_publish_uses_real_ids_and_atomic_pointer(tmp_path: Path, monkeypatch):
@@ -15,14 +19,63 @@ def test_database_publish_uses_real_ids_and_atomic_pointer(tmp_path: Path, monke
 
     profiles = load_profiles(DEFAULT_CSV).head(4).copy()
     profiles["user_id"] = [f"database-uuid-{index}" for index in range(4)]
-    published = database_training._publish(pd.DataFrame(profiles), generation=7)
+    progress = database_training.TrainingProgress()
+    published = database_training._publish(pd.DataFrame(profiles), generation=7, progress=progress)
+    assert list(progress.timings) == ["fetch", "normalize", "fit", "dump", "validate"]
 
     pointer = json.loads((artifacts / "active.json").read_text())
     assert pointer["generation"] == 7
     assert published.name == pointer["version"]
     artifact, loaded_profiles = load_runtime_artifacts(artifacts)
     assert artifact["id_source"] == "database"
-    assert loaded_profiles["user_id"].tolist() == profiles["user_id"].tolist()
+    # Rows are grouped into contiguous (gender, religion) partitions.
+    assert sorted(loaded_profiles.user_ids.tolist()) == profiles["user_id"].tolist()
+    partitions = loaded_profiles.segments[0].profiles.table["partitions"]
+    assert partitions is not None
+    assert partitions[0, 2] == 0 and partitions[-1, 3] == len(profiles)
+    metadata = json.loads((published / "metadata.json").read_text())
+    assert metadata["features"]["shape"] == [4, metadata["feature_count"]]
+    assert metadata["features"]["format"] == "csr" and 0 < metadata["features"]["nnz"]
+    assert (published / "features.data.npy").is_file()
+
+
+def test_overlay_publish_ranks_like_the_base_encoders_on_current_rows(tmp_path: Path, monkeypatch):
+    artifacts = tmp_path / "artifacts"
+    monkeypatch.setattr(database_training, "DEFAULT_ARTIFACTS", artifacts)
+    monkeypatch.setattr(database_training, "VERSIONS_DIR", artifacts / "versions")
+    monkeypatch.setattr(database_training, "ACTIVE_POINTER", artifacts / "active.json")
+    monkeypatch.setattr(database_training, "OVERLAY_MAX_FRACTION", 1.0)
+
+    profiles = load_profiles(DEFAULT_CSV).head(60).copy()
+    profiles["user_id"] = [f"database-uuid-{index}" for index in range(60)]
+    base = database_training._publish(profiles.iloc[:50], generation=1)
+
+    # One edit, one removal and one new user.
+    changes = profiles.iloc[[3, 55]].copy()
+    changes["age"] = changes["age"] + 4
+    changed_ids = {"database-uuid-3", "database-uuid-7", "database-uuid-55"}
+    published = database_training._publish_overlay(changes, changed_ids, 2, base)
+    assert json.loads((published / "overlay.json").read_text()) == {"base": base.name}
+
+    artifact, pool = load_runtime_artifacts(artifacts)
+    assert pool.base_version == base.name and pool.changed_ids == changed_ids
+    assert pool.live_count == 50 and pool.find("database-uuid-7") is None
+    assert pool.find("database-uuid-55") >= 50
+
+    current = pd.concat([profiles.iloc[:50].drop(index=[3, 7]), changes])
+    expected_profiles = sort_by_partition(normalize_profiles(current))
+    expected_table = ProfileStore.from_frame(expected_profiles).table
+    expected_features = transform_profiles(expected_profiles, artifact)
+    for user_id in ("database-uuid-0", "database-uuid-3", "database-uuid-55"):
+        query = pool.row(pool.find(user_id))
+        scored = pool.rank(query, pool.vector(pool.find(user_id)))
+        expected = rank_candidates(
+            query, transform_query(query, artifact), expected_table, expected_features
+        )
+        actual = dict(zip(pool.user_ids[scored["rows"]], scored["score"]))
+        wanted = dict(zip(expected_table["columns"]["user_id"][expected["rows"]], expected["score"]))
+        assert actual.keys() == wanted.keys()
+        assert np.allclose([actual[key] for key in wanted], list(wanted.values()), atol=1e-5)
 
 
 def test_runtime_loader_falls_back_to_bootstrap_artifacts(tmp_path: Path):
@@ -36,4 +89,54 @@ def test_runtime_loader_falls_back_to_bootstrap_artifacts(tmp_path: Path):
 
     artifact, profiles = load_runtime_artifacts(artifacts)
     assert artifact["model_version"] == 1
-    assert not profiles.empty
+    assert len(profiles) > 0
+
+
+def test_streamed_chunks_train_like_a_single_frame():
+    # The module the trainer uses; ``recommender`` above is a second import of the same file.
+    from recommendation import recommender
+
+    raw = pd.read_csv(DEFAULT_CSV)
+    # Gaps in different chunks must be filled with medians of the whole table.
+    raw.loc[[5, 80, 301], "height"] = np.nan
+    raw.loc[[40, 433], "weight"] = np.nan
+
+    class Result:
+        def keys(self):
+            return list(raw.columns)
+
+        def partitions(self, size):
+            records = list(raw.itertuples(index=False, name=None))
+            for start in range(0, len(records), size):
+                yield records[start:start + size]
+
+    class Connection:
+        def execution_options(self, **options):
+            assert options["max_row_buffer"] == 37
+            return self
+
+        def execute(self, _query, _params):
+            return Result()
+
+    chunks = list(database_training.iter_database_profiles(Connection(), chunk_size=37))
+    assert len(chunks) == -(-len(raw) // 37)
+
+    accumulator = recommender.ProfileAccumulator()
+    for chunk in chunks:
+        accumulator.add(chunk)
+    streamed = accumulator.profiles()
+    expected = recommender.normalize_profiles(raw)
+    pd.testing.assert_frame_equal(streamed, expected)
+
+    vocabulary = accumulator.vocabulary()
+    for columns in recommender.ENCODED_COLS.values():
+        for column in columns:
+            assert vocabulary[column] == sorted(expected[column].unique())
+    tokens = {token for row in expected["interest_tokens"] for token in row}
+    assert vocabulary["interest_tokens"] == sorted(tokens)
+
+    streamed_artifact, streamed_matrix = recommender.fit_model(streamed, vocabulary)
+    expected_artifact, expected_matrix = recommender.fit_model(expected)
+    assert streamed_artifact["numeric_medians"] == expected_artifact["numeric_medians"]
+    assert streamed_matrix.shape == expected_matrix.shape
+    assert (streamed_matrix != expected_matrix).nnz == 0
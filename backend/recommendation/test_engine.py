@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from recommendation import database_training
+from recommendation.engine import RecommendationEngine
+from recommendation.recommender import DEFAULT_CSV, load_profiles, train
+
+
+def _use_artifacts(monkeypatch, artifacts: Path) -> None:
+    monkeypatch.setattr(database_training, "DEFAULT_ARTIFACTS", artifacts)
+    monkeypatch.setattr(database_training, "VERSIONS_DIR", artifacts / "versions")
+    monkeypatch.setattr(database_training, "ACTIVE_POINTER", artifacts / "active.json")
+
+
+def test_engine_keeps_model_resident_and_swaps_on_pointer_change(tmp_path: Path, monkeypatch):
+    artifacts = tmp_path / "artifacts"
+    _use_artifacts(monkeypatch, artifacts)
+    train(DEFAULT_CSV, artifacts)
+    engine = RecommendationEngine(artifacts)
+
+    bootstrap = engine.current()
+    assert bootstrap.version == "bootstrap"
+    assert engine.current() is bootstrap
+
+    profiles = load_profiles(DEFAULT_CSV).head(6).copy()
+    profiles["user_id"] = [f"database-uuid-{index}" for index in range(6)]
+    published = database_training._publish(profiles, generation=3)
+
+    swapped = engine.current()
+    assert swapped is not bootstrap
+    assert swapped.version == published.name
+    assert swapped.generation == 3
+    assert sorted(swapped.profiles.user_ids.tolist()) == profiles["user_id"].tolist()
+    assert engine.current() is swapped
+
+    stats = engine.stats()
+    assert stats["version"] == published.name
+    assert stats["swap_count"] == 2
+    assert stats["load_seconds"] >= 0
+    assert stats["last_swap_seconds"] >= stats["load_seconds"]
+
+
+def test_engine_keeps_serving_when_a_reload_fails(tmp_path: Path, monkeypatch):
+    artifacts = tmp_path / "artifacts"
+    train(DEFAULT_CSV, artifacts)
+    engine = RecommendationEngine(artifacts)
+    loaded = engine.current()
+
+    # Without bootstrap files the broken pointer cannot fall back anywhere.
+    (artifacts / "knn_model.joblib").unlink()
+    (artifacts / "active.json").write_text('{"version": "missing"}')
+
+    assert engine.current() is loaded
+    assert engine.stats()["last_error"]
+    assert engine.is_ready()
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models.recommendation_result import RecommendationResult
+from recommendation import precompute
+
+
+class _EligibleQuery:
+    def __init__(self, ids):
+        self.ids = ids
+
+    def all(self):
+        return [type("Row", (), {"id": user_id})() for user_id in self.ids]
+
+
+def test_precompute_streams_batches_and_stamps_the_generation(tmp_path, monkeypatch):
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'results.db'}")
+    Base.metadata.create_all(test_engine, tables=[RecommendationResult.__table__])
+    sessions = sessionmaker(bind=test_engine)
+    with sessions() as db:
+        db.add_all([
+            RecommendationResult(user_id="u-0", generation=3, model_version="old",
+                                 query_fingerprint="x", results=[]),
+            RecommendationResult(user_id="stale", generation=3, model_version="old",
+                                 query_fingerprint="x", results=[]),
+            # A newer generation's job finished first and must be kept.
+            RecommendationResult(user_id="u-1", generation=9, model_version="newer",
+                                 query_fingerprint="x", results=[]),
+        ])
+        db.commit()
+
+    user_ids = [f"u-{index}" for index in range(10)]
+    pulled = []
+
+    def query_batches(_reader):
+        for user_id in user_ids:
+            pulled.append(user_id)
+            yield [(user_id, pd.Series({"user_id": user_id, "age": 30}))]
+
+    writes = []
+    real_write = precompute._write
+
+    def write(db, rows, generation, version):
+        writes.append(len(pulled))
+        real_write(db, rows, generation, version)
+
+    monkeypatch.setattr(precompute, "SessionLocal", sessions)
+    monkeypatch.setattr(precompute, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(precompute, "insert", sqlite_insert)
+    monkeypatch.setattr(precompute, "load_model_version", lambda version_dir, generation: "model")
+    monkeypatch.setattr(precompute, "_eligible_candidate_query", lambda db: _EligibleQuery(user_ids))
+    monkeypatch.setattr(precompute, "_query_batches", query_batches)
+    monkeypatch.setattr(precompute, "_write", write)
+    monkeypatch.setattr(precompute, "WRITE_BATCH_SIZE", 2)
+    monkeypatch.setattr(
+        precompute, "rank_query",
+        lambda model, query, top_n, eligible_among: [
+            {"user_id": other, "score": 1.0} for other in sorted(eligible_among(user_ids))[:2]
+        ],
+    )
+
+    written = precompute.precompute_recommendations(tmp_path / "v-20240101", generation=5, workers=1)
+
+    assert written == 10
+    # Query rows are pulled a bounded window ahead of the writes, not all at once.
+    assert writes[0] <= 5
+    with sessions() as db:
+        rows = {row.user_id: row for row in db.query(RecommendationResult).all()}
+    assert set(rows) == set(user_ids)
+    assert rows["u-1"].generation == 9 and rows["u-1"].model_version == "newer"
+    for user_id in set(user_ids) - {"u-1"}:
+        assert rows[user_id].generation == 5
+        assert rows[user_id].model_version == "v-20240101"
+        assert rows[user_id].results == [{"user_id": "u-0", "score": 1.0}, {"user_id": "u-1", "score": 1.0}]
+        assert rows[user_id].query_fingerprint == precompute.query_fingerprint(
+            pd.Series({"user_id": user_id, "age": 30})
+        )
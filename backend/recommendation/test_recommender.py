@@ -1,20 +1,48 @@
+import json
 from pathlib import Path
 
 import numpy as np
+import pandas as pd
 import pytest
+from scipy import sparse
 
+from benchmark import (
+    _benchmark_size, _regressions, frames_identical, reference_normalize_profiles, synthetic_profiles,
+)
 from fix_gender_names import INVALID_LAST_NAMES, NAME_POOLS, correct_rows
 from recommender import (
     DEFAULT_CSV,
+    SENSITIVE_TEXT_COLS,
+    ProfileStore,
     RecommendationError,
     _candidate_is_eligible,
     _directional_preferences,
+    _file_sha256,
     _education_group,
     _priority_key,
     _religion_value,
+    build_index,
+    build_scoring_table,
+    eligible_candidates,
+    eligible_spans,
     fit_model,
+    load_artifacts,
+    load_candidate_pool,
+    load_features,
+    load_index,
     load_profiles,
+    normalize_profiles,
+    pair_codes,
+    pair_preferences,
+    pair_preferences_from_codes,
+    priority_order,
+    rank_candidates,
     recommend,
+    recommend_many,
+    save_index,
+    score_candidates,
+    sort_by_partition,
+    top_k_order,
     train,
     transform_profiles,
 )
@@ -28,8 +56,146 @@ def test_feature_matrix_is_finite_and_stable():
     assert len(profiles) == 500
     assert matrix.shape == transformed.shape
     assert matrix.shape[1] == artifact["feature_count"]
-    assert np.isfinite(matrix).all()
-    assert np.allclose(matrix, transformed)
+    assert sparse.isspmatrix_csr(matrix) and matrix.dtype == np.float32
+    # Each row holds one value per numeric and encoded column plus its interests.
+    assert matrix.nnz < matrix.shape[0] * 40 < matrix.shape[0] * matrix.shape[1]
+    assert np.isfinite(matrix.data).all()
+    assert np.allclose(matrix.multiply(matrix).sum(axis=1), 1.0, atol=1e-5)
+    assert np.allclose(matrix.toarray(), transformed.toarray())
+
+
+@pytest.mark.parametrize("source", ["csv", "synthetic"])
+def test_normalize_profiles_matches_the_per_cell_reference(source: str):
+    profiles = pd.read_csv(DEFAULT_CSV) if source == "csv" else synthetic_profiles(2000, seed=3)
+    assert frames_identical(normalize_profiles(profiles), reference_normalize_profiles(profiles))
+
+
+def test_benchmark_suite_reports_latency_quality_and_regressions():
+    entry = _benchmark_size(400, ["brute", "ivfpq"], queries=20, top_k=5, repeat=1, seed=1)
+
+    assert entry["profiles"] == 400 and entry["fit"]["count"] == 1
+    assert set(entry["transform"]) >= {"p50_ms", "p95_ms", "p99_ms"}
+    assert entry["variants"]["brute"]["overlap_at_k_vs_brute"] == {"10": 1.0, "100": 1.0}
+    assert 0.0 < entry["variants"]["ivfpq"]["overlap_at_k_vs_brute"]["10"] <= 1.0
+    assert 0.0 <= entry["variants"]["brute"]["strict_rate"] <= 1.0
+
+    slower = json.loads(json.dumps(entry))
+    slower["variants"]["brute"]["recommend"]["p95_ms"] *= 2
+    assert _regressions({"sizes": [entry]}, {"sizes": [entry]}, 0.25) == []
+    assert len(_regressions({"sizes": [slower]}, {"sizes": [entry]}, 0.25)) == 1
+
+
+def test_persisted_features_are_mapped_and_checksummed(tmp_path: Path):
+    metadata = train(DEFAULT_CSV, tmp_path)
+    artifact, profiles = load_artifacts(tmp_path)
+
+    features = load_features(tmp_path, artifact, profiles)
+    assert sparse.isspmatrix_csr(features)
+    assert features.dtype == np.float32
+    assert not features.data.flags.writeable
+    assert list(features.shape) == metadata["features"]["shape"]
+    assert features.nnz == metadata["features"]["nnz"]
+    expected = transform_profiles(profiles.frame(), artifact).toarray()
+    assert np.allclose(features.toarray(), expected, atol=1e-6)
+
+    # Older artifacts without the matrix are rebuilt from the encoders.
+    (tmp_path / "features.data.npy").rename(tmp_path / "features.bak")
+    assert np.allclose(load_features(tmp_path, artifact, profiles).toarray(), expected, atol=1e-6)
+
+    corrupted = np.load(tmp_path / "features.bak")
+    corrupted[0] += 1.0
+    np.save(tmp_path / "features.data.npy", corrupted)
+    with pytest.raises(RecommendationError, match="checksum"):
+        load_features(tmp_path, artifact, profiles)
+
+    # Versions published before the sparse layout stored a dense matrix.
+    np.save(tmp_path / "features.npy", expected.astype(np.float32))
+    for name in ("data", "indices", "indptr"):
+        (tmp_path / f"features.{name}.npy").unlink()
+    metadata["features"] = {
+        "file": "features.npy", "dtype": "float32", "shape": list(expected.shape),
+        "sha256": _file_sha256(tmp_path / "features.npy"),
+    }
+    (tmp_path / "metadata.json").write_text(json.dumps(metadata))
+    dense = load_features(tmp_path, artifact, profiles)
+    assert isinstance(dense, np.memmap) and np.allclose(dense, expected, atol=1e-6)
+
+
+def test_profile_store_round_trips_without_sensitive_columns(tmp_path: Path):
+    profiles = load_profiles(DEFAULT_CSV)
+    ProfileStore.from_frame(profiles).save(tmp_path / "store")
+    store = ProfileStore.open(tmp_path / "store")
+
+    assert len(store) == len(profiles)
+    assert isinstance(store.user_ids, np.memmap)
+    decoded = store.frame()
+    assert not set(SENSITIVE_TEXT_COLS) & set(decoded.columns)
+    expected = profiles[decoded.columns].copy()
+    expected["age"] = expected["age"].astype(float)
+    pd.testing.assert_frame_equal(decoded, expected, check_dtype=False)
+
+    row = store.row(123)
+    assert row["necessary_preferences"] == profiles.iloc[123]["necessary_preferences"]
+    assert row["interest_tokens"] == profiles.iloc[123]["interest_tokens"]
+    assert store.find(profiles.iloc[123]["user_id"]) == 123
+    assert store.find("missing") is None
+
+    table = build_scoring_table(profiles)
+    assert store.table["vocabulary"] == table["vocabulary"]
+    for name, values in table["columns"].items():
+        assert np.array_equal(store.table["columns"][name], values)
+
+
+@pytest.mark.parametrize("kind", ["brute", "balltree", "ivfpq"])
+def test_index_backends_round_trip_and_find_close_neighbours(tmp_path: Path, kind: str):
+    metadata = train(DEFAULT_CSV, tmp_path, index=kind)
+    artifact, profiles = load_artifacts(tmp_path)
+    features = load_features(tmp_path, artifact, profiles)
+    index = load_index(tmp_path, features)
+
+    assert index.kind == metadata["index"]["kind"] == kind
+    assert metadata["index"]["recall_at_k"]["10"] >= 0.9
+    query = features[0].toarray().ravel()
+    rows, similarity = index.search(query, 10)
+    assert rows[0] == 0
+    assert np.allclose(similarity, features[rows] @ query, atol=1e-5)
+    assert np.all(np.diff(similarity) <= 1e-6)
+
+    result = recommend(profiles.user_ids[0], 20, tmp_path)
+    assert 0 < result["match_count"] <= 20
+    assert all(item["gender"] != profiles.row(0)["gender"] for item in result["matches"])
+
+
+def test_unknown_index_backend_is_rejected():
+    with pytest.raises(RecommendationError, match="Unknown index"):
+        build_index(np.eye(3, dtype=np.float32), "hnsw")
+
+
+def test_low_recall_index_is_published_as_brute_force(tmp_path: Path):
+    profiles = sort_by_partition(load_profiles(DEFAULT_CSV))
+    _, features = fit_model(profiles)
+    # Probing one of many lists misses most true neighbours.
+    retrieval = build_index(features, "ivfpq", n_lists=40, n_probe=1, rerank=1)
+
+    metadata = save_index(retrieval, features, tmp_path, min_recall=0.9)
+
+    assert metadata["rejected"]["kind"] == "ivfpq"
+    assert metadata["rejected"]["recall_at_k"]["10"] < 0.9
+    assert metadata["kind"] == "brute" and metadata["recall_at_k"]["10"] == 1.0
+    assert load_index(tmp_path, features).kind == "brute"
+
+
+def test_recommend_many_matches_single_user_results(tmp_path: Path):
+    train(DEFAULT_CSV, tmp_path)
+    user_ids = ["1", "42", "missing", "311", "499"]
+
+    results = list(recommend_many(user_ids, 10, tmp_path, block_size=2))
+
+    assert results[2] == {"query_user": {"user_id": "missing"}, "error": "User not found: missing"}
+    for user_id, result in zip(user_ids, results):
+        if user_id != "missing":
+            assert result == recommend(user_id, 10, tmp_path)
+    assert len(list(recommend_many(None, 1, tmp_path))) == 500
 
 
 def test_recommendations_exclude_self_and_same_gender(tmp_path: Path):
@@ -96,6 +262,94 @@ def test_recommendations_include_match_explanation(tmp_path: Path):
     )
 
 
+def test_cached_pair_codes_rebuild_preferences_and_single_rows_score_alike(tmp_path: Path):
+    train(DEFAULT_CSV, tmp_path)
+    _, pool = load_candidate_pool(tmp_path)
+    query_row = pool.find("1")
+    query, vector = pool.row(query_row), pool.vector(query_row)
+    scored = pool.rank(query, vector)
+
+    for position in (0, len(scored["rows"]) // 2, len(scored["rows"]) - 1):
+        codes = json.loads(json.dumps(pair_codes(scored, position)))
+        assert pair_preferences_from_codes(codes) == pair_preferences(scored, position)
+
+        single = pool.score_row(query, vector, scored["rows"][position])
+        assert pair_codes(single, 0) == pair_codes(scored, position)
+        assert np.isclose(single["score"][0], scored["score"][position])
+    assert pool.score_row(query, vector, query_row) is None
+
+
+def test_columnar_scoring_matches_row_wise_rules():
+    profiles = load_profiles(DEFAULT_CSV)
+    table = build_scoring_table(profiles)
+    similarity = np.linspace(0.0, 1.0, len(profiles))
+    for query_index in (0, 7, 123, 250, 499):
+        query = profiles.iloc[query_index]
+        expected = []
+        for index in range(len(profiles)):
+            candidate = profiles.iloc[index]
+            if not _candidate_is_eligible(query, candidate):
+                continue
+            a_to_b = _directional_preferences(query, candidate)
+            b_to_a = _directional_preferences(candidate, query)
+            preference = (a_to_b["score"] + b_to_a["score"]) / 2.0
+            score = 0.40 * similarity[index] + 0.60 * preference
+            key = _priority_key(a_to_b, b_to_a, score, similarity[index], candidate["user_id"])
+            expected.append((key, index, a_to_b, b_to_a))
+        expected.sort(key=lambda item: item[0])
+
+        rows = np.flatnonzero(eligible_candidates(query, table))
+        scored = score_candidates(query, table, rows, similarity[rows])
+        order = priority_order(scored, table["columns"]["user_id"][rows])
+
+        assert [rows[position] for position in order] == [item[1] for item in expected]
+        for position, (_, _, a_to_b, b_to_a) in zip(order, expected):
+            assert pair_preferences(scored, position) == (a_to_b, b_to_a)
+
+
+def test_partitioned_ranking_matches_full_table_mask():
+    unsorted = load_profiles(DEFAULT_CSV)
+    assert build_scoring_table(unsorted)["partitions"] is None
+    profiles = sort_by_partition(unsorted)
+    artifact, matrix = fit_model(profiles)
+    table = build_scoring_table(profiles)
+    assert table["partitions"] is not None
+    user_ids = table["columns"]["user_id"]
+    for query_index in (0, 42, 311, 499):
+        query = profiles.iloc[query_index]
+        spans = eligible_spans(query, table)
+        covered = np.zeros(len(profiles), dtype=bool)
+        for start, stop in spans:
+            covered[start:stop] = True
+        covered &= user_ids != query["user_id"]
+        assert np.array_equal(covered, eligible_candidates(query, table))
+
+        scored = rank_candidates(query, matrix[query_index], table, matrix)
+        unsorted_table = dict(table, partitions=None)
+        expected = rank_candidates(query, matrix[query_index], unsorted_table, matrix)
+        assert scored["rows"].tolist() == expected["rows"].tolist()
+        assert np.allclose(scored["score"], expected["score"])
+
+
+def test_top_k_order_matches_full_priority_order():
+    profiles = load_profiles(DEFAULT_CSV)
+    artifact, matrix = fit_model(profiles)
+    table = build_scoring_table(profiles)
+    user_ids = table["columns"]["user_id"]
+    for query_index in (0, 42, 311):
+        scored = rank_candidates(profiles.iloc[query_index], matrix[query_index], table, matrix)
+        expected = priority_order(scored, user_ids[scored["rows"]])
+        for top_k in (1, 5, 37, 100, len(expected) + 10):
+            order = top_k_order(scored, user_ids[scored["rows"]], top_k)
+            assert order.tolist() == expected[:top_k].tolist()
+
+    # Identical scores force the boundary tie group to be sorted in full.
+    scored["score"] = np.zeros_like(scored["score"])
+    scored["similarity"] = np.zeros_like(scored["similarity"])
+    expected = priority_order(scored, user_ids[scored["rows"]])
+    assert top_k_order(scored, user_ids[scored["rows"]], 10).tolist() == expected[:10].tolist()
+
+
 def test_religion_filter_preference_fallback_and_no_preference():
     profiles = load_profiles(DEFAULT_CSV)
     query = profiles.iloc[0].copy()
@@ -12,13 +12,14 @@ def test_only_committed_user_or_profile_changes_request_training(monkeypatch):
     Base.metadata.create_all(test_engine)
     sessions = sessionmaker(bind=test_engine)
     requests = []
-    monkeypatch.setattr(retraining_coordinator, "request_retraining", lambda: requests.append(True))
+    monkeypatch.setattr(retraining_coordinator, "request_retraining", requests.append)
     retraining_coordinator.install_session_hooks()
 
     session = sessions()
-    session.add(User("Test", "test@example.com", "password", "Male", "NID-1", 25))
+    user = User("Test", "test@example.com", "password", "Male", "NID-1", 25)
+    session.add(user)
     session.commit()
-    assert len(requests) == 1
+    assert requests == [{user.id}]
 
     session.add(User("Rolled Back", "rollback@example.com", "password", "Male", "NID-2", 26))
     session.flush()
@@ -28,4 +29,72 @@ def test_only_committed_user_or_profile_changes_request_training(monkeypatch):
     session.add(RecommendationTrainingState(id=1))
     session.commit()
     assert len(requests) == 1
+
+    # Verification and login fields are not model inputs; age is.
+    user.email_verified = True
+    user.verification_status = "verified"
+    session.commit()
+    assert len(requests) == 1
+    user.age = 26
+    session.commit()
+    assert requests[-1] == {user.id}
+
+    # Re-assigning an unchanged value leaves no history.
+    user.age = 26
+    session.commit()
+    assert len(requests) == 2
     session.close()
+
+
+def test_watcher_retries_a_generation_the_trainer_lock_turned_away(monkeypatch):
+    from concurrent.futures import Future
+
+    watcher = retraining_coordinator.RetrainingWatcher()
+    pending_checks = []
+    launches = []
+
+    def is_pending(include_running=False):
+        pending_checks.append(include_running)
+        return True
+
+    monkeypatch.setattr(watcher, "_is_pending", is_pending)
+    monkeypatch.setattr(watcher, "_launch", lambda: launches.append(True))
+    precomputes = []
+    monkeypatch.setattr(watcher, "_precompute", lambda: precomputes.append(True))
+    clock = [1000.0]
+    monkeypatch.setattr(retraining_coordinator.time, "monotonic", lambda: clock[0])
+
+    def finish(result):
+        future = Future()
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+        watcher._training = future
+        assert watcher._is_training() is False
+
+    # run_database_training returns False while a manual retrain holds the lock.
+    finish(False)
+    assert watcher._deadline == 1000.0 + retraining_coordinator.DEBOUNCE_SECONDS
+    watcher._launch_if_due()
+    assert launches == []
+    clock[0] = watcher._deadline
+    watcher._launch_if_due()
+    assert launches == [True]
+    assert pending_checks[-1] is True
+
+    # Each further refusal or failure backs off, up to the cap.
+    finish(RuntimeError("boom"))
+    assert watcher._deadline == clock[0] + 2 * retraining_coordinator.DEBOUNCE_SECONDS
+    for _ in range(10):
+        finish(False)
+    assert watcher._retry_seconds == retraining_coordinator.TRAINER_RETRY_MAX_SECONDS
+
+    assert precomputes == []
+
+    # A published generation resets the backoff, arms nothing and queues its lists.
+    watcher._deadline = None
+    finish(True)
+    assert watcher._deadline is None
+    assert precomputes == [True]
+    assert watcher._retry_seconds == retraining_coordinator.DEBOUNCE_SECONDS
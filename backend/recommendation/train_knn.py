@@ -6,16 +6,17 @@ import json
 import sys
 from pathlib import Path
 
-from recommender import DEFAULT_ARTIFACTS, DEFAULT_CSV, RecommendationError, train
+from recommender import DEFAULT_ARTIFACTS, DEFAULT_CSV, INDEX_BACKENDS, RecommendationError, train
 
 
 def main() -> int:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--csv", type=Path, default=DEFAULT_CSV)
     parser.add_argument("--artifacts-dir", type=Path, default=DEFAULT_ARTIFACTS)
+    parser.add_argument("--index", choices=sorted(INDEX_BACKENDS), default="brute")
     args = parser.parse_args()
     try:
-        metadata = train(args.csv, args.artifacts_dir)
+        metadata = train(args.csv, args.artifacts_dir, args.index)
     except (RecommendationError, OSError) as exc:
         print(f"Training failed: {exc}", file=sys.stderr)
         return 1
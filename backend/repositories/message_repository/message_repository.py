@@ -1,4 +1,3 @@
-import base64
 from typing import Dict, List
 from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
@@ -82,14 +81,6 @@ class MessageRepository:
                 continue
 
             other_profile = ProfileRepository.get_by_user_id(db, other_user_id)
-            profile_picture_base64 = None
-            if other_profile and other_profile.profile_picture_data:
-                try:
-                    encoded = base64.b64encode(other_profile.profile_picture_data).decode("utf-8")
-                    content_type = other_profile.profile_picture_content_type or "image/jpeg"
-                    profile_picture_base64 = f"data:{content_type};base64,{encoded}"
-                except Exception as e:
-                    print(f"Error encoding profile picture: {e}")
 
             unread_count = (
                 db.query(Message)
@@ -110,7 +101,7 @@ class MessageRepository:
                         "name": other_user.name,
                         "age": other_user.age,
                         "religion": other_user.religion,
-                        "profile_picture": profile_picture_base64,
+                        "profile_picture": other_profile.profile_picture_url("avatar") if other_profile else None,
                         "verification_status": other_user.verification_status,
                         "matching_percentage": other_user.matching_percentage,
                         "nid_verified": other_user.verification_status == "verified",
@@ -8,11 +8,18 @@ from services.retraining_coordinator import request_retraining
 def main() -> int:
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument("--background", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument(
+        "--skip-precompute", action="store_true",
+        help="publish the model without storing per-user recommendation lists",
+    )
     args = parser.parse_args()
     if not args.background:
         request_retraining()
         print("[TRAIN] Manual retraining requested")
-    return 0 if run_database_training() else 2
+    # Manual runs refit from scratch; the background watcher publishes deltas.
+    return 0 if run_database_training(
+        precompute=not args.skip_precompute, full_refit=not args.background
+    ) else 2
 
 
 if __name__ == "__main__":
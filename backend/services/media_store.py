@@ -0,0 +1,119 @@
+"""Content-addressed storage for uploaded media outside the database."""
+from __future__ import annotations
+
+import hashlib
+import os
+import string
+import tempfile
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
+
+from config import get_settings
+
+
+class MediaStore(ABC):
+    """A backend holding immutable media files named by the SHA-256 of their content."""
+
+    @abstractmethod
+    def put_chunks(self, chunks: Iterable[bytes]) -> str:
+        """Store the concatenated chunks and return their digest; existing content is not written again."""
+
+    @abstractmethod
+    def path(self, digest: str) -> Optional[Path]:
+        """A local file with the content, for zero-copy serving, or None when it is missing."""
+
+    def put(self, data: bytes) -> str:
+        return self.put_chunks([data])
+
+    def read(self, digest: str) -> Optional[bytes]:
+        path = self.path(digest)
+        return path.read_bytes() if path else None
+
+
+class LocalMediaStore(MediaStore):
+    """Files under ``root/ab/cd/abcd…``, sharded by the leading hex digits of the digest."""
+
+    def __init__(self, root: Path | str) -> None:
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        if len(digest) != 64 or not set(digest) <= set(string.hexdigits.lower()):
+            raise ValueError(f"Not a SHA-256 digest: {digest!r}")
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def put_chunks(self, chunks: Iterable[bytes]) -> str:
+        self.root.mkdir(parents=True, exist_ok=True)
+        hasher = hashlib.sha256()
+        handle, temporary = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                for chunk in chunks:
+                    hasher.update(chunk)
+                    file.write(chunk)
+                file.flush()
+                os.fsync(file.fileno())
+            digest = hasher.hexdigest()
+            target = self._path(digest)
+            if not target.is_file():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.chmod(temporary, 0o644)
+                # Atomic within one filesystem, so readers never see a partial file.
+                os.replace(temporary, target)
+            return digest
+        finally:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+
+    def path(self, digest: str) -> Optional[Path]:
+        path = self._path(digest)
+        return path if path.is_file() else None
+
+
+@lru_cache
+def get_media_store() -> Optional[MediaStore]:
+    """The configured store, or None while uploads are kept in the database."""
+    backend = get_settings().MEDIA_STORE
+    if backend == "database":
+        return None
+    if backend == "local":
+        return LocalMediaStore(get_settings().MEDIA_ROOT)
+    raise ValueError(f"Unknown MEDIA_STORE: {backend}")
+
+
+def store_media(item, key: str, value: Optional[bytes]) -> Optional[bytes]:
+    """Validator body for a ``<media>_data`` column with a ``<media>_hash`` sibling.
+
+    Records the content hash and, when a store is configured, moves the bytes
+    into it and returns None so the row keeps only the reference. Clearing
+    the column clears the hash, so the media is no longer advertised or served.
+    """
+    hash_key = key[: -len("_data")] + "_hash"
+    if not value:
+        setattr(item, hash_key, None)
+        return value
+    store = get_media_store()
+    if store is None:
+        setattr(item, hash_key, hashlib.sha256(value).hexdigest())
+        return value
+    setattr(item, hash_key, store.put(value))
+    return None
+
+
+def stored_path(digest: Optional[str]) -> Optional[Path]:
+    """The store file of media whose row no longer holds the bytes."""
+    store = get_media_store()
+    if not digest or store is None:
+        return None
+    return store.path(digest)
+
+
+def read_media(data: Optional[bytes], digest: Optional[str]) -> Optional[bytes]:
+    """The media bytes, from the row when it still holds them, otherwise from the store."""
+    if data:
+        return bytes(data)
+    store = get_media_store()
+    if not digest or store is None:
+        return None
+    return store.read(digest)
@@ -0,0 +1,175 @@
+"""Background rendering of avatar, card and full-size profile picture variants."""
+from __future__ import annotations
+
+import importlib.util
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+
+# Longest edge in pixels of each variant; "full" only caps camera originals.
+PICTURE_VARIANTS = {"avatar": 64, "card": 320, "full": 1600}
+VARIANT_FORMAT = "WEBP"
+VARIANT_CONTENT_TYPE = "image/webp"
+VARIANT_QUALITY = 80
+WORKERS = max(1, min(2, (os.cpu_count() or 2) // 2))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def pillow_available() -> bool:
+    return importlib.util.find_spec("PIL") is not None
+
+
+def render_variants(data: bytes) -> dict[str, tuple[bytes, int, int]]:
+    """Encode every variant of one original as ``{size: (data, width, height)}``.
+
+    Avatars are centre-cropped squares, the other variants keep the aspect
+    ratio. Nothing is upscaled, and no EXIF, ICC or other metadata is kept;
+    orientation is applied to the pixels first.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {}
+    for size, edge in PICTURE_VARIANTS.items():
+        if size == "avatar":
+            side = min(edge, *image.size)
+            variant = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+        else:
+            variant = image.copy()
+            variant.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        variant.info = {}
+        buffer = io.BytesIO()
+        variant.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY, method=4)
+        variants[size] = (buffer.getvalue(), variant.width, variant.height)
+    return variants
+
+
+def generate_variants(user_id: str, source_hash: str) -> int:
+    """Render and store the variants of a user's current picture.
+
+    Returns the number of variants written; 0 when the picture was replaced
+    or removed after the job was scheduled.
+    """
+    from database import SessionLocal
+    from models.profile.profile import Profile
+    from models.profile_picture_variant import ProfilePictureVariant
+    from services.media_store import read_media
+
+    db = SessionLocal()
+    try:
+        picture = db.query(Profile.profile_picture_data).filter(
+            Profile.user_id == user_id, Profile.profile_picture_hash == source_hash
+        ).first()
+        data = read_media(picture.profile_picture_data, source_hash) if picture else None
+        db.rollback()
+        if not data:
+            return 0
+        variants = render_variants(data)
+
+        # Jobs for two quick uploads can overlap; the profile row lock orders
+        # them, and only the job for the picture still current writes.
+        current = db.query(Profile.user_id).filter(
+            Profile.user_id == user_id, Profile.profile_picture_hash == source_hash
+        ).with_for_update().first()
+        if current is None:
+            db.rollback()
+            return 0
+        statement = insert(ProfilePictureVariant).values([
+            {
+                "user_id": user_id, "size": size, "source_hash": source_hash,
+                "content_type": VARIANT_CONTENT_TYPE, "width": width, "height": height,
+                "data": encoded, "created_at": datetime.now(timezone.utc),
+            }
+            for size, (encoded, width, height) in variants.items()
+        ])
+        excluded = statement.excluded
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[ProfilePictureVariant.user_id, ProfilePictureVariant.size],
+            set_={
+                column: excluded[column]
+                for column in ("source_hash", "content_type", "width", "height", "data", "created_at")
+            },
+        ))
+        db.query(ProfilePictureVariant).filter(
+            ProfilePictureVariant.user_id == user_id, ProfilePictureVariant.size.notin_(list(variants))
+        ).delete(synchronize_session=False)
+        db.commit()
+        return len(variants)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _report(user_id: str, future: Future) -> None:
+    try:
+        written = future.result()
+        print(f"[PICTURE] Stored {written} variants for user {user_id}")
+    except Exception as exc:
+        # The original keeps being served; the next upload retries.
+        print(f"[PICTURE] Could not render variants for user {user_id}: {exc}")
+
+
+def schedule_variants(user_id: str, source_hash: Optional[str]) -> None:
+    """Queue variant rendering for a freshly committed picture without blocking the request."""
+    global _pool
+    if not source_hash:
+        return
+    if not pillow_available():
+        print("[PICTURE] Pillow is not installed; serving original pictures only")
+        return
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked, because the API process holds threads and connections.
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        future = _pool.submit(generate_variants, user_id, source_hash)
+    future.add_done_callback(lambda done: _report(user_id, done))
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def backfill() -> int:
+    """Render variants for every picture that has none for its current hash."""
+    from database import SessionLocal
+    from models.profile.profile import Profile
+    from models.profile_picture_variant import ProfilePictureVariant
+
+    db = SessionLocal()
+    try:
+        current = db.query(ProfilePictureVariant.user_id).filter(
+            ProfilePictureVariant.source_hash == Profile.profile_picture_hash,
+            ProfilePictureVariant.user_id == Profile.user_id,
+        ).exists()
+        pending = db.query(Profile.user_id, Profile.profile_picture_hash).filter(
+            Profile.profile_picture_hash.isnot(None), ~current
+        ).all()
+    finally:
+        db.close()
+    print(f"[PICTURE] Rendering variants for {len(pending)} pictures with {WORKERS} workers")
+    with ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn")) as pool:
+        written = sum(pool.map(generate_variants, *zip(*pending))) if pending else 0
+    print(f"[PICTURE] Stored {written} variants")
+    return written
+
+
+if __name__ == "__main__":
+    backfill()
@@ -1,28 +1,49 @@
 """Database adapter for the weighted KNN recommendation model."""
 from __future__ import annotations
 
-from typing import Any, Optional
+import hashlib
+import json
+from functools import partial
+from typing import Any, Callable, Collection, Optional
 
+import numpy as np
 import pandas as pd
 from sqlalchemy.orm import Session
 
 from models.profile.profile import Profile
+from models.recommendation_result import RecommendationResult
 from models.user.user import User
+from recommendation.engine import LoadedModel, recommendation_engine
 from recommendation.recommender import (
-    DEFAULT_ARTIFACTS, INTEREST_COLS, NUMERIC_COLS, REQUIRED_COLUMNS,
-    _build_match_explanation, _candidate_is_eligible, _directional_preferences, _interest_tokens,
-    _parse_list, _priority_key, _reasons, _text,
-    load_runtime_artifacts, transform_profiles,
+    INTEREST_COLS, NUMERIC_COLS, REQUIRED_COLUMNS,
+    _build_match_explanation, _interest_tokens, _parse_list, _reasons, _text,
+    pair_codes, pair_preferences_from_codes, top_k_order, transform_query,
 )
 from seed_recommendation_data import demo_user_id
 
 
 def is_ready() -> bool:
-    try:
-        load_runtime_artifacts(DEFAULT_ARTIFACTS)
-        return True
-    except Exception:
-        return False
+    return recommendation_engine.is_ready()
+
+
+def engine_status() -> dict[str, Any]:
+    return recommendation_engine.stats()
+
+
+_database_ids_cache: dict[str, np.ndarray] = {}
+
+
+def _database_ids(model) -> np.ndarray:
+    """Map artifact user IDs to application user IDs once per model version."""
+    source_ids = model.profiles.user_ids
+    if model.artifact.get("id_source") == "database":
+        return source_ids
+    cached = _database_ids_cache.get(model.version)
+    if cached is None or len(cached) != len(source_ids):
+        cached = np.array([demo_user_id(value) for value in source_ids], dtype=str)
+        _database_ids_cache.clear()
+        _database_ids_cache[model.version] = cached
+    return cached
 
 
 def _is_public_matchable_user(user: Optional[User]) -> bool:
@@ -62,49 +83,224 @@ def _query_row(user: User, profile: Profile) -> pd.Series:
     return row
 
 
-def get_recommendations(current_user_id: str, db: Session, top_n: int = 100) -> Optional[list[dict]]:
-    top_n = max(1, min(top_n, 100))
+RESULT_LIMIT = 100
+
+
+def query_fingerprint(query: pd.Series) -> str:
+    """Hash the ranking inputs of a query so cached results can be revalidated."""
+    values = {
+        key: None if not isinstance(value, list) and pd.isna(value) else value
+        for key, value in query.items()
+    }
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _priority(scored: dict[str, np.ndarray], position: int) -> list:
+    """The sort key of one ranked candidate, kept so cached lists can be merged."""
+    return [
+        int(scored["requester_failures"][position]), int(scored["reciprocal_failures"][position]),
+        -int(scored["mutual"][position]), -float(scored["score"][position]),
+        -float(scored["similarity"][position]),
+    ]
+
+
+def _result_item(scored: dict[str, np.ndarray], position: int, db_id: str) -> dict:
+    """One ranked candidate without its explanation.
+
+    ``scoring`` keeps the pair's preference vectors so the explanation can be
+    built later for the few results a page actually shows.
+    """
+    scoring = pair_codes(scored, position)
+    a_to_b, b_to_a = pair_preferences_from_codes(scoring)
+    similarity_value = float(scored["similarity"][position])
+    relaxed = set(a_to_b["required_failures"] + b_to_a["required_failures"])
+    return {"user_id": db_id, "score": float(scored["score"][position]),
+            "similarity": similarity_value, "strict": not relaxed,
+            "reason_tags": _reasons(a_to_b, b_to_a, similarity_value),
+            "scoring": scoring,
+            "priority": _priority(scored, position)}
+
+
+def rank_query(
+    model: LoadedModel,
+    query: pd.Series,
+    top_n: int,
+    eligible_among: Callable[[list[str]], Collection[str]],
+    segments: Optional[list[int]] = None,
+) -> list[dict]:
+    """Rank the model's candidates for one query row.
+
+    ``eligible_among`` receives a batch of application user IDs and returns
+    those that may be shown, so eligibility costs one lookup per batch
+    rather than one per candidate. Results carry no ``match_explanation``;
+    see :func:`add_match_explanations`.
+    """
+    query_vector = transform_query(query, model.artifact)
+    database_ids = _database_ids(model)
+    scored = model.profiles.rank(query, query_vector, segments=segments)
+    user_ids = database_ids[scored["rows"]]
+
+    results = []
+    checked = 0
+    budget = top_n
+    while len(results) < top_n and checked < len(scored["rows"]):
+        # Candidates removed since the last training run are skipped below;
+        # widen the shortlist only when that leaves the page short.
+        batch = top_k_order(scored, user_ids, budget)[checked:]
+        eligible = eligible_among([str(value) for value in user_ids[batch]])
+        for position in batch:
+            checked += 1
+            db_id = str(user_ids[position])
+            if db_id not in eligible:
+                continue
+            results.append(_result_item(scored, position, db_id))
+            if len(results) == top_n:
+                break
+        budget *= 2
+    return results
+
+
+def _eligible_candidate_query(db: Session):
+    return db.query(User.id).join(Profile, Profile.user_id == User.id).filter(
+        User.is_deleted == False, User.is_archived == False,
+        User.is_admin == False,
+        Profile.is_completed == True,
+    )
+
+
+def _eligible_ids(db: Session, user_ids) -> set[str]:
+    """The subset of ``user_ids`` that may be recommended, in one set-based query."""
+    if not user_ids:
+        return set()
+    return {row.id for row in _eligible_candidate_query(db).filter(User.id.in_(list(user_ids))).all()}
+
+
+def _cached_result(db: Session, user_id: str, model: LoadedModel, query: pd.Series) -> Optional[RecommendationResult]:
+    """The user's precomputed list, if it was ranked by this model's base for this query."""
+    if model.generation is None:
+        return None
+    cached = db.query(RecommendationResult).filter(RecommendationResult.user_id == user_id).first()
+    if (
+        not cached
+        or cached.generation > model.generation
+        or cached.model_version != model.profiles.base_version
+        or cached.query_fingerprint != query_fingerprint(query)
+    ):
+        return None
+    return cached
+
+
+def _cached_recommendations(
+    db: Session, user_id: str, model: LoadedModel, query: pd.Series, top_n: int
+) -> Optional[list[dict]]:
+    """Serve the precomputed list when it matches the model and the user's current profile.
+
+    Lists are computed against full training runs. After an incremental
+    publish the list stays valid for the unchanged base rows: changed users
+    are dropped from it and the overlay rows are ranked live and merged in.
+    """
+    cached = _cached_result(db, user_id, model, query)
+    if cached is None:
+        return None
+    changed = model.profiles.changed_ids
+    results = [item for item in cached.results if item["user_id"] not in changed]
+    eligible = _eligible_ids(db, [item["user_id"] for item in results])
+    results = [item for item in results if item["user_id"] in eligible]
+    if len(model.profiles.segments) == 1:
+        return results[:top_n]
+    if len(results) < top_n and len(cached.results) == RESULT_LIMIT:
+        # Base candidates past the stored cut-off are unknown; rank everything live.
+        return None
+    if any("priority" not in item for item in results):
+        # Lists stored before overlays carry no sort keys to merge on.
+        return None
+
+    overlay = rank_query(
+        model, query, top_n, _eligible_ids(db, changed).intersection,
+        segments=list(range(1, len(model.profiles.segments))),
+    )
+    return sorted(results + overlay, key=lambda item: (*item["priority"], item["user_id"]))[:top_n]
+
+
+def _current_query(current_user_id: str, db: Session) -> Optional[tuple[LoadedModel, pd.Series]]:
     try:
-        artifact, candidates = load_runtime_artifacts(DEFAULT_ARTIFACTS)
+        model = recommendation_engine.current()
     except Exception:
         return None
     user = db.query(User).filter(User.id == current_user_id).first()
     profile = db.query(Profile).filter(Profile.user_id == current_user_id).first()
     if not _is_public_matchable_user(user) or not profile or not profile.is_completed:
         return None
-    query = _query_row(user, profile)
-    query_frame = pd.DataFrame([query])
-    matrix = transform_profiles(query_frame, artifact)
-    distances, indices = artifact["knn"].kneighbors(matrix, n_neighbors=len(candidates))
-    scored = []
-    for distance, index in zip(distances[0], indices[0]):
-        candidate = candidates.iloc[index]
-        if not _candidate_is_eligible(query, candidate):
-            continue
-        candidate_id = str(candidate["user_id"])
-        db_id = candidate_id if artifact.get("id_source") == "database" else demo_user_id(candidate_id)
-        eligible = db.query(User.id).join(Profile, Profile.user_id == User.id).filter(
-            User.id == db_id, User.is_deleted == False, User.is_archived == False,
-            User.is_admin == False,
-            Profile.is_completed == True,
-        ).first()
-        if not eligible:
-            continue
-        similarity = max(0.0, min(1.0, 1.0 - float(distance)))
-        a_to_b = _directional_preferences(query, candidate)
-        b_to_a = _directional_preferences(candidate, query)
-        preference = (a_to_b["score"] + b_to_a["score"]) / 2
-        relaxed = set(a_to_b["required_failures"] + b_to_a["required_failures"])
-        explanation = _build_match_explanation(query, candidate, a_to_b, b_to_a, similarity, preference)
-        scored.append({"user_id": db_id, "score": .4 * similarity + .6 * preference,
-                       "similarity": similarity, "strict": not relaxed,
-                       "reason_tags": _reasons(a_to_b, b_to_a, similarity),
-                       "match_explanation": explanation,
-                       "priority_key": _priority_key(
-                           a_to_b, b_to_a, .4 * similarity + .6 * preference,
-                           similarity, db_id,
-                       )})
-    scored.sort(key=lambda item: item["priority_key"])
-    for item in scored:
-        item.pop("priority_key", None)
-    return scored[:top_n]
+    return model, _query_row(user, profile)
+
+
+def _model_row(model: LoadedModel, db_id: str) -> Optional[int]:
+    """The live model row of an application user ID."""
+    if model.artifact.get("id_source") == "database":
+        return model.profiles.find(db_id)
+    matches = np.flatnonzero(_database_ids(model) == db_id)
+    return model.profiles.find(model.profiles.user_ids[matches[0]]) if len(matches) else None
+
+
+def _explanation(model: LoadedModel, query: pd.Series, item: dict) -> Optional[dict]:
+    if "scoring" not in item:
+        # Lists stored before explanations became lazy carry them inline.
+        return item.get("match_explanation")
+    row = _model_row(model, item["user_id"])
+    if row is None:
+        return None
+    scoring = item["scoring"]
+    a_to_b, b_to_a = pair_preferences_from_codes(scoring)
+    preference = (scoring["a_score"] + scoring["b_score"]) / 2.0
+    return _build_match_explanation(query, model.profiles.row(row), a_to_b, b_to_a, item["similarity"], preference)
+
+
+def add_match_explanations(current_user_id: str, db: Session, items: list[dict]) -> None:
+    """Fill ``match_explanation`` on the given results, typically one page of them."""
+    if not items:
+        return
+    current = _current_query(current_user_id, db)
+    for item in items:
+        item["match_explanation"] = None if current is None else _explanation(*current, item)
+
+
+def get_match_explanation(current_user_id: str, candidate_id: str, db: Session) -> Optional[dict]:
+    """Explain one candidate for the current user.
+
+    Served from the user's precomputed list when it holds the candidate,
+    otherwise the single pair is scored live. ``None`` when the candidate
+    is not a match the user could be shown.
+    """
+    current = _current_query(current_user_id, db)
+    if current is None or candidate_id not in _eligible_ids(db, [candidate_id]):
+        return None
+    model, query = current
+    cached = _cached_result(db, current_user_id, model, query)
+    if cached is not None and candidate_id not in model.profiles.changed_ids:
+        for item in cached.results:
+            if item["user_id"] == candidate_id:
+                return _explanation(model, query, item)
+    row = _model_row(model, candidate_id)
+    if row is None:
+        return None
+    scored = model.profiles.score_row(query, transform_query(query, model.artifact), row)
+    if scored is None:
+        return None
+    return _explanation(model, query, _result_item(scored, 0, candidate_id))
+
+
+def get_recommendations(current_user_id: str, db: Session, top_n: int = 100) -> Optional[list[dict]]:
+    """Ranked matches for the current user, without explanations.
+
+    Call :func:`add_match_explanations` for the results actually displayed.
+    """
+    top_n = max(1, min(top_n, RESULT_LIMIT))
+    current = _current_query(current_user_id, db)
+    if current is None:
+        return None
+    model, query = current
+    cached = _cached_recommendations(db, current_user_id, model, query, top_n)
+    if cached is not None:
+        return cached
+    return rank_query(model, query, top_n, partial(_eligible_ids, db))
@@ -1,26 +1,45 @@
 """Commit-triggered, debounced background recommendation retraining."""
 from __future__ import annotations
 
-import subprocess
-import sys
+import multiprocessing
+import select
 import threading
-from pathlib import Path
-from typing import Optional
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterable, Optional
 
-from sqlalchemy import event, text
+from sqlalchemy import String, bindparam, event, inspect, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import Session
 
 from database import engine
 
 DEBOUNCE_SECONDS = 10
+# Wake-up interval of the leader loop; waiting costs no database queries.
 POLL_SECONDS = 2
-_BACKEND_DIR = Path(__file__).resolve().parent.parent
+NOTIFY_CHANNEL = "recommendation_retrain"
+LEADER_LOCK_ID = 714_202_607
+LEADER_RETRY_SECONDS = 30
+# Backoff before re-checking a generation the trainer could not run.
+TRAINER_RETRY_MAX_SECONDS = 300
 _hooks_installed = False
 
 
-def request_retraining() -> None:
-    """Record a new desired model generation without blocking the caller."""
+def request_retraining(user_ids: Optional[Iterable[str]] = None) -> None:
+    """Record a new desired model generation without blocking the caller.
+
+    ``user_ids`` are queued for an incremental publish; a request without
+    them asks for a full refit.
+    """
+    user_ids = sorted(set(user_ids or ()))
     with engine.begin() as connection:
+        if user_ids:
+            connection.execute(text("""
+                INSERT INTO recommendation_changes (user_id, changed_at)
+                SELECT user_id, NOW() FROM UNNEST(:user_ids) AS changed(user_id)
+                ON CONFLICT (user_id) DO UPDATE SET changed_at = NOW()
+            """).bindparams(bindparam("user_ids", type_=ARRAY(String))), {"user_ids": user_ids})
         connection.execute(text("""
             INSERT INTO recommendation_training_state
                 (id, requested_generation, completed_generation, status,
@@ -35,29 +54,51 @@ def request_retraining() -> None:
                     ELSE 'pending'
                 END
         """))
+        # Delivered to the watcher leader when this transaction commits.
+        connection.execute(text("SELECT pg_notify(:channel, '')"), {"channel": NOTIFY_CHANNEL})
+
+
+def _changed_columns(item, columns: frozenset[str]) -> bool:
+    attrs = inspect(item).attrs
+    return any(attrs[column].history.has_changes() for column in columns)
 
 
 def install_session_hooks() -> None:
-    """Queue one retrain after commits that mutate User or Profile objects."""
+    """Queue the users whose recommendation inputs a commit actually changed.
+
+    Inserts and deletes of User or Profile rows always count; updates only
+    when a column the trainer reads (including the eligibility flags) has a
+    new value, so verification, OCR, media and login writes do not retrain.
+    """
     global _hooks_installed
     if _hooks_installed:
         return
 
     from models.profile.profile import Profile
     from models.user.user import User
+    from recommendation.database_training import TRACKED_PROFILE_COLUMNS, TRACKED_USER_COLUMNS
 
-    @event.listens_for(Session, "before_flush")
-    def _detect_recommendation_changes(session, _flush_context, _instances):
-        changed = session.new.union(session.dirty).union(session.deleted)
-        if any(isinstance(item, (User, Profile)) for item in changed):
-            session.info["recommendation_retrain_needed"] = True
+    tracked = ((User, "id", TRACKED_USER_COLUMNS), (Profile, "user_id", TRACKED_PROFILE_COLUMNS))
+
+    @event.listens_for(Session, "after_flush")
+    def _detect_recommendation_changes(session, _flush_context):
+        # Primary keys are assigned and attribute history is still intact here.
+        user_ids = session.info.setdefault("recommendation_changed_users", set())
+        for model, key, columns in tracked:
+            for item in session.new.union(session.deleted):
+                if isinstance(item, model):
+                    user_ids.add(getattr(item, key))
+            for item in session.dirty:
+                if isinstance(item, model) and _changed_columns(item, columns):
+                    user_ids.add(getattr(item, key))
 
     @event.listens_for(Session, "after_commit")
     def _queue_after_commit(session):
-        if not session.info.pop("recommendation_retrain_needed", False):
+        user_ids = session.info.pop("recommendation_changed_users", None)
+        if not user_ids:
             return
         try:
-            request_retraining()
+            request_retraining(user_ids)
             print("[RECOMMENDATION] Database change queued a background retrain")
         except Exception as exc:
             # The application transaction is already committed. Scheduling must
@@ -66,16 +107,52 @@ def install_session_hooks() -> None:
 
     @event.listens_for(Session, "after_rollback")
     def _clear_after_rollback(session):
-        session.info.pop("recommendation_retrain_needed", None)
+        session.info.pop("recommendation_changed_users", None)
 
     _hooks_installed = True
 
 
+def _train_in_worker() -> bool:
+    """Run one generation inside the long-lived trainer process."""
+    from recommendation.database_training import run_database_training
+
+    # Per-user lists are stored by a separate job so they never delay the next generation.
+    return run_database_training(precompute=False)
+
+
+def _precompute_in_worker() -> int:
+    from recommendation.precompute import precompute_active_version
+
+    return precompute_active_version()
+
+
+def _report_precompute(future: Future) -> None:
+    try:
+        future.result()
+    except Exception as exc:
+        # The model stays active and the API keeps ranking live.
+        print(f"[PRECOMPUTE] Failed: {exc}")
+
+
 class RetrainingWatcher:
+    """Launch the trainer from a single elected process per database.
+
+    Every API worker starts a watcher, but only the one holding the
+    ``LEADER_LOCK_ID`` advisory lock acts; the others retry the lock every
+    ``LEADER_RETRY_SECONDS``. The leader ``LISTEN``s for the notification
+    sent by :func:`request_retraining` and debounces in memory, so an idle
+    application runs no polling queries.
+    """
+
     def __init__(self) -> None:
         self._stop = threading.Event()
         self._thread: Optional[threading.Thread] = None
-        self._process: Optional[subprocess.Popen] = None
+        self._trainer: Optional[ProcessPoolExecutor] = None
+        self._precomputer: Optional[ProcessPoolExecutor] = None
+        self._training: Optional[Future] = None
+        self._deadline: Optional[float] = None
+        self._retrying = False
+        self._retry_seconds = DEBOUNCE_SECONDS
 
     def start(self) -> None:
         if self._thread and self._thread.is_alive():
@@ -91,37 +168,133 @@ class RetrainingWatcher:
         self._stop.set()
         if self._thread:
             self._thread.join(timeout=POLL_SECONDS + 2)
+        for executor in (self._trainer, self._precomputer):
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._trainer = self._precomputer = None
+
+    def _is_pending(self, include_running: bool = False) -> bool:
+        """Whether a requested generation is outstanding.
 
-    def _is_due(self) -> bool:
+        ``include_running`` also counts a generation marked running, which is
+        either in progress elsewhere or was left behind by a dead trainer; the
+        trainer lock tells the two apart when the generation is launched.
+        """
+        statuses = ["pending", "running"] if include_running else ["pending"]
         with engine.connect() as connection:
             return bool(connection.execute(text("""
                 SELECT EXISTS (
                     SELECT 1 FROM recommendation_training_state
                     WHERE id = 1
-                      AND status = 'pending'
+                      AND status IN :statuses
                       AND requested_generation > completed_generation
-                      AND requested_at <= NOW() - (:seconds * INTERVAL '1 second')
                 )
-            """), {"seconds": DEBOUNCE_SECONDS}).scalar())
+            """).bindparams(bindparam("statuses", expanding=True)), {"statuses": statuses}).scalar())
 
     def _launch(self) -> None:
-        self._process = subprocess.Popen(
-            [sys.executable, "retrain_recommendation_model.py", "--background"],
-            cwd=str(_BACKEND_DIR),
-        )
-        print(f"[RECOMMENDATION] Started trainer process {self._process.pid}")
+        if self._trainer is None:
+            # One long-lived worker keeps pandas, scikit-learn and the last
+            # published base model loaded between generations. It is spawned,
+            # not forked, because the API process holds threads and connections.
+            self._trainer = ProcessPoolExecutor(
+                max_workers=1, mp_context=multiprocessing.get_context("spawn")
+            )
+        self._training = self._trainer.submit(_train_in_worker)
+        print("[RECOMMENDATION] Submitted a generation to the trainer process")
+
+    def _precompute(self) -> None:
+        """Queue per-user lists for the active version behind any job already queued.
+
+        Each job looks up the active version when it starts and skips one whose
+        lists are stored, so overlays and repeated publishes cost one query.
+        """
+        for _attempt in range(2):
+            if self._precomputer is None:
+                self._precomputer = ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                )
+            try:
+                self._precomputer.submit(_precompute_in_worker).add_done_callback(_report_precompute)
+                return
+            except BrokenProcessPool:
+                # The previous job's worker died; start a fresh one.
+                self._precomputer.shutdown(wait=False)
+                self._precomputer = None
+
+    def _is_training(self) -> bool:
+        if self._training is None:
+            return False
+        if not self._training.done():
+            return True
+        published = False
+        try:
+            published = self._training.result()
+        except BrokenProcessPool as exc:
+            # The worker died (for example out of memory); start a fresh one next time.
+            print(f"[RECOMMENDATION] Trainer process exited: {exc}")
+            self._trainer.shutdown(wait=False)
+            self._trainer = None
+        except Exception as exc:
+            print(f"[RECOMMENDATION] Training failed: {exc}")
+        self._training = None
+        if published:
+            self._retry_seconds = DEBOUNCE_SECONDS
+            self._precompute()
+        elif self._is_pending(include_running=True):
+            # A manual run held the trainer lock, or the worker died mid-run.
+            # No notification follows either, so check back with a backoff.
+            print(f"[RECOMMENDATION] Generation still pending; retrying in {self._retry_seconds}s")
+            self._deadline = time.monotonic() + self._retry_seconds
+            self._retrying = True
+            self._retry_seconds = min(self._retry_seconds * 2, TRAINER_RETRY_MAX_SECONDS)
+        return False
+
+    def _launch_if_due(self) -> None:
+        if self._deadline is None or time.monotonic() < self._deadline:
+            return
+        include_running, self._deadline, self._retrying = self._retrying, None, False
+        if self._is_pending(include_running=include_running):
+            self._launch()
 
     def _run(self) -> None:
-        while not self._stop.wait(POLL_SECONDS):
+        while not self._stop.is_set():
+            connection = None
             try:
-                if self._process and self._process.poll() is None:
+                connection = engine.raw_connection()
+                if self._lead(connection.driver_connection):
                     continue
-                self._process = None
-                if self._is_due():
-                    self._launch()
             except Exception as exc:
                 # A missing state table before migration should not prevent app startup.
                 print(f"[RECOMMENDATION] Watcher waiting: {exc}")
+            finally:
+                if connection is not None:
+                    # The session-level lock and LISTEN must not survive in the pool.
+                    connection.invalidate()
+            self._stop.wait(LEADER_RETRY_SECONDS)
+
+    def _lead(self, listener) -> bool:
+        """Serve as leader until stopped; False when another process leads."""
+        listener.autocommit = True
+        with listener.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (LEADER_LOCK_ID,))
+            if not cursor.fetchone()[0]:
+                return False
+            cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        print("[RECOMMENDATION] Retraining watcher elected leader")
+
+        # Requests made while no process was leading were not heard.
+        self._retrying = False
+        self._deadline = time.monotonic() + DEBOUNCE_SECONDS if self._is_pending() else None
+        while not self._stop.is_set():
+            if select.select([listener], [], [], POLL_SECONDS)[0]:
+                listener.poll()
+                if listener.notifies:
+                    listener.notifies.clear()
+                    self._deadline = time.monotonic() + DEBOUNCE_SECONDS
+            if self._is_training():
+                continue
+            self._launch_if_due()
+        return True
 
 
 watcher = RetrainingWatcher()
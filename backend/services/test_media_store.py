@@ -0,0 +1,35 @@
+import hashlib
+
+from services import media_store
+from services.media_store import LocalMediaStore, store_media
+
+
+def test_local_store_shards_and_deduplicates(tmp_path):
+    store = LocalMediaStore(tmp_path)
+    digest = store.put_chunks([b"same ", b"content"])
+
+    assert digest == hashlib.sha256(b"same content").hexdigest()
+    assert store.path(digest) == tmp_path / digest[:2] / digest[2:4] / digest
+    assert store.put(b"same content") == digest
+    assert store.read(digest) == b"same content"
+    assert [path for path in tmp_path.rglob("*") if path.is_file()] == [store.path(digest)]
+
+
+def test_store_media_keeps_only_the_hash(tmp_path, monkeypatch):
+    class Item:
+        picture_hash = None
+
+    store = LocalMediaStore(tmp_path)
+    monkeypatch.setattr(media_store, "get_media_store", lambda: store)
+    item = Item()
+
+    assert store_media(item, "picture_data", b"bytes") is None
+    assert store.read(item.picture_hash) == b"bytes"
+
+    monkeypatch.setattr(media_store, "get_media_store", lambda: None)
+    assert store_media(item, "picture_data", b"other") == b"other"
+    assert item.picture_hash == hashlib.sha256(b"other").hexdigest()
+
+    # Clearing the media clears its reference too.
+    assert store_media(item, "picture_data", None) is None
+    assert item.picture_hash is None
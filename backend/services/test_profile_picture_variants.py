@@ -0,0 +1,84 @@
+import io
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker
+
+import database
+from models.profile.profile import Profile
+from models.profile_picture_variant import ProfilePictureVariant
+from services import profile_picture_variants
+from services.profile_picture_variants import generate_variants, render_variants
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _jpeg(width: int, height: int, orientation: int | None = None) -> bytes:
+    image = Image.new("RGB", (width, height), (200, 40, 40))
+    exif = Image.Exif()
+    exif[0x010F] = "Camera Maker"
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+def test_render_variants_sizes_and_strips_metadata():
+    variants = render_variants(_jpeg(2400, 1200))
+
+    assert {size: dims for size, (_, *dims) in variants.items()} == {
+        "avatar": [64, 64], "card": [320, 160], "full": [1600, 800],
+    }
+    for data, width, height in variants.values():
+        with Image.open(io.BytesIO(data)) as image:
+            assert image.format == "WEBP"
+            assert image.size == (width, height)
+            assert not image.getexif()
+            assert "exif" not in image.info
+
+
+def test_render_variants_applies_orientation_and_never_upscales():
+    # Orientation 6 means the camera was rotated; the stored pixels are landscape.
+    variants = render_variants(_jpeg(120, 40, orientation=6))
+
+    assert variants["avatar"][1:] == (40, 40)
+    assert variants["card"][1:] == (40, 120)
+    assert variants["full"][1:] == (40, 120)
+
+
+def test_generate_variants_replaces_rows_and_skips_replaced_pictures(tmp_path, monkeypatch):
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'pictures.db'}")
+    database.Base.metadata.create_all(
+        test_engine, tables=[Profile.__table__, ProfilePictureVariant.__table__]
+    )
+    sessions = sessionmaker(bind=test_engine)
+    monkeypatch.setattr(database, "SessionLocal", sessions)
+    monkeypatch.setattr(profile_picture_variants, "insert", sqlite_insert)
+
+    with sessions() as db:
+        profile = Profile("user-1", profile_picture_data=_jpeg(800, 600))
+        db.add(profile)
+        db.commit()
+        first_hash = profile.profile_picture_hash
+
+    assert generate_variants("user-1", first_hash) == 3
+    # A second job for the same picture, as two overlapping uploads would run, upserts.
+    assert generate_variants("user-1", first_hash) == 3
+
+    with sessions() as db:
+        profile = db.query(Profile).filter(Profile.user_id == "user-1").one()
+        profile.profile_picture_data = _jpeg(300, 300)
+        db.commit()
+        second_hash = profile.profile_picture_hash
+
+    # The older job finds its picture replaced and leaves the rows alone.
+    assert generate_variants("user-1", first_hash) == 0
+    assert generate_variants("user-1", second_hash) == 3
+
+    with sessions() as db:
+        rows = db.query(ProfilePictureVariant).order_by(ProfilePictureVariant.size).all()
+    assert [(row.size, row.source_hash, row.width) for row in rows] == [
+        ("avatar", second_hash, 64), ("card", second_hash, 300), ("full", second_hash, 300),
+    ]
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from services import recommendation_service
+
+
+def _notebook_preference_score(A: dict, B: dict) -> float:
+    """The per-pair rules the vectorized scores replaced."""
+    score = 0.0
+    try:
+        if abs(float(A.get("age", 0)) - float(B.get("age", 0))) <= 5:
+            score += 1.5
+    except (TypeError, ValueError):
+        pass
+    if A.get("location", "unknown") != "unknown" and A.get("location") == B.get("location"):
+        score += 1.5
+    if A.get("religion", "unknown") != "unknown" and A.get("religion") == B.get("religion"):
+        score += 1.5
+    if A.get("academic_background", "unknown") != "unknown" and A.get("academic_background") == B.get("academic_background"):
+        score += 1.0
+    if A.get("smoking_habit") == B.get("smoking_habit"):
+        score += 1.0
+    if A.get("alcohol_consumption") == B.get("alcohol_consumption"):
+        score += 1.0
+    if A.get("dietary_preference", "unknown") != "unknown" and A.get("dietary_preference") == B.get("dietary_preference"):
+        score += 1.0
+    return score
+
+
+def test_preference_scores_match_the_notebook_rules():
+    rng = np.random.default_rng(7)
+    choices = {
+        "age": [24, 27, 31, 40, None],
+        "location": ["dhaka", "sylhet", "unknown", None],
+        "religion": ["islam", "hinduism", "unknown", None],
+        "academic_background": ["bachelor's", "master's", "unknown", None],
+        "smoking_habit": ["never", "sometimes", "unknown", None],
+        "alcohol_consumption": ["never", "unknown", None],
+        "dietary_preference": ["halal", "vegetarian", "unknown", None],
+    }
+
+    def rows(count):
+        return [
+            {column: values[rng.integers(len(values))] for column, values in choices.items()}
+            for _ in range(count)
+        ]
+
+    owners, others = rows(400), rows(400)
+    # None matches None and "unknown" never counts for the owner-gated columns.
+    owners[0] = others[0] = {column: None for column in choices}
+    owners[1] = others[1] = {column: "unknown" for column in choices} | {"age": 30}
+
+    scores = recommendation_service._preference_scores(
+        pd.DataFrame(owners).astype(object), pd.DataFrame(others).astype(object)
+    )
+    expected = [_notebook_preference_score(a, b) for a, b in zip(owners, others)]
+    np.testing.assert_allclose(scores, expected)
+    assert scores[0] == 7.0 and scores[1] == 3.5
+
+
+def test_knn_path_returns_no_matches_when_no_neighbour_is_eligible(monkeypatch):
+    class Preprocess:
+        def transform(self, frame):
+            return np.zeros((len(frame), 1))
+
+    class Neighbours:
+        def kneighbors(self, _features, n_neighbors):
+            return np.array([[0.0, 0.1, 0.2]]), np.array([[0, 1, 2]])
+
+    monkeypatch.setattr(recommendation_service, "_uses_v2", lambda: False)
+    monkeypatch.setattr(recommendation_service, "_preprocess", Preprocess())
+    monkeypatch.setattr(recommendation_service, "_nn", Neighbours())
+    monkeypatch.setattr(recommendation_service, "_user_id_map", {"0": "me", "1": "a", "2": "b"})
+    monkeypatch.setattr(recommendation_service, "_user_index_map", {"me": 0, "a": 1, "b": 2})
+    monkeypatch.setattr(recommendation_service, "_index_user_ids", np.array(["me", "a", "b"], dtype=object))
+
+    current = pd.DataFrame(
+        [{"id": "me", "age": 30, "gender": "Male", "religion": "islam", "is_completed": True}],
+        columns=["id", *recommendation_service.ALL_COLS, "is_completed"],
+    ).set_index("id")
+    # The neighbours were deleted or archived since the index was built.
+    monkeypatch.setattr(
+        recommendation_service, "_fetch_user_rows",
+        lambda user_ids, db: current if user_ids == ["me"] else current.iloc[0:0],
+    )
+
+    assert recommendation_service.get_recommendations("me", db=None) == []
+
+
+def test_legacy_callers_get_the_v2_ranking_by_default(monkeypatch):
+    from services import recommendation_service_v2
+
+    monkeypatch.setattr(recommendation_service, "_uses_v2", lambda: True)
+    monkeypatch.setattr(
+        recommendation_service_v2, "get_recommendations",
+        lambda user_id, db, top_n: [{"user_id": "b", "score": 2.0}, {"user_id": "a", "score": 1.0}][:top_n],
+    )
+    assert recommendation_service.get_recommendations("me", db=None, top_n=2) == ["b", "a"]
+
+    monkeypatch.setattr(recommendation_service_v2, "get_recommendations", lambda user_id, db, top_n: None)
+    assert recommendation_service.get_recommendations("me", db=None) is None
@@ -0,0 +1,114 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from recommendation import database_training
+from recommendation.engine import load_model_version
+from recommendation.recommender import (
+    DEFAULT_CSV, _build_match_explanation, load_profiles, pair_preferences, priority_order,
+)
+from services import recommendation_service_v2
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    artifacts = tmp_path_factory.mktemp("artifacts")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(database_training, "DEFAULT_ARTIFACTS", artifacts)
+        patch.setattr(database_training, "VERSIONS_DIR", artifacts / "versions")
+        patch.setattr(database_training, "ACTIVE_POINTER", artifacts / "active.json")
+        profiles = load_profiles(DEFAULT_CSV)
+        profiles["user_id"] = [f"database-uuid-{index}" for index in range(len(profiles))]
+        published = database_training._publish(profiles, generation=1)
+    return load_model_version(published, 1)
+
+
+def _overlay_model(changed_ids=frozenset()):
+    profiles = SimpleNamespace(
+        segments=[object(), object()], changed_ids=set(changed_ids), base_version="v-base"
+    )
+    return SimpleNamespace(profiles=profiles, generation=2)
+
+
+def test_cached_lists_without_priorities_are_ranked_live_under_an_overlay(monkeypatch):
+    stored = [{"user_id": "a", "score": 3.0}, {"user_id": "b", "score": 2.0}]
+    monkeypatch.setattr(
+        recommendation_service_v2, "_cached_result",
+        lambda db, user_id, model, query: SimpleNamespace(results=stored),
+    )
+    monkeypatch.setattr(recommendation_service_v2, "_eligible_ids", lambda db, user_ids: set(user_ids))
+    overlays = []
+
+    def rank_overlay(model, query, top_n, eligible_among, segments):
+        overlays.append(segments)
+        return [{"user_id": "c", "score": 2.5, "priority": [0, 0, -1, -2.5, -0.5]}]
+
+    monkeypatch.setattr(recommendation_service_v2, "rank_query", rank_overlay)
+
+    assert recommendation_service_v2._cached_recommendations(None, "me", _overlay_model(), None, 10) is None
+    assert overlays == []
+
+    for item in stored:
+        item["priority"] = [0, 0, -1, -item["score"], -0.5]
+    merged = recommendation_service_v2._cached_recommendations(None, "me", _overlay_model(), None, 10)
+    assert [item["user_id"] for item in merged] == ["a", "c", "b"]
+    assert overlays == [[1]]
+
+
+def test_rank_query_checks_eligibility_once_per_widening_round(model):
+    query = model.profiles.row(model.profiles.find("database-uuid-0"))
+    scored = model.profiles.rank(query, recommendation_service_v2.transform_query(query, model.artifact))
+    user_ids = model.profiles.user_ids[scored["rows"]]
+    ordered = [str(user_id) for user_id in user_ids[priority_order(scored, user_ids)]]
+    assert len(ordered) >= 12
+    # The whole first shortlist and part of the second are no longer eligible.
+    ineligible = set(ordered[:4])
+
+    calls = []
+
+    def eligible_among(batch):
+        calls.append(batch)
+        return set(batch) - ineligible
+
+    results = recommendation_service_v2.rank_query(model, query, 3, eligible_among)
+
+    assert calls == [ordered[:3], ordered[3:6], ordered[6:12]]
+    assert [item["user_id"] for item in results] == [
+        user_id for user_id in ordered if user_id not in ineligible
+    ][:3]
+
+
+def test_lazy_explanations_match_the_eager_ones(model, monkeypatch):
+    query = model.profiles.row(model.profiles.find("database-uuid-0"))
+    scored = model.profiles.rank(query, recommendation_service_v2.transform_query(query, model.artifact))
+    user_ids = model.profiles.user_ids[scored["rows"]]
+    positions = priority_order(scored, user_ids)[:5]
+    eager = {
+        str(user_ids[position]): _build_match_explanation(
+            query, model.profiles.row(scored["rows"][position]), *pair_preferences(scored, position),
+            float(scored["similarity"][position]), float(scored["preference"][position]),
+        )
+        for position in positions
+    }
+
+    # Stored lists go through JSON; explanations are rebuilt from their scoring codes.
+    stored = json.loads(json.dumps(
+        recommendation_service_v2.rank_query(model, query, 5, lambda batch: set(batch))
+    ))
+    assert [item["user_id"] for item in stored] == list(eager)
+    assert all("match_explanation" not in item for item in stored)
+    monkeypatch.setattr(recommendation_service_v2, "_current_query", lambda user_id, db: (model, query))
+    recommendation_service_v2.add_match_explanations("database-uuid-0", None, stored)
+    assert {item["user_id"]: item["match_explanation"] for item in stored} == eager
+
+    # A single candidate is explained from the cached list or, without one, scored live.
+    candidate = stored[2]["user_id"]
+    monkeypatch.setattr(recommendation_service_v2, "_eligible_ids", lambda db, ids: set(ids))
+    for cached in (SimpleNamespace(results=stored), None):
+        monkeypatch.setattr(recommendation_service_v2, "_cached_result", lambda *args: cached)
+        assert recommendation_service_v2.get_match_explanation("database-uuid-0", candidate, None) == eager[candidate]
+
+    # Candidates the user could not be shown are not explained.
+    monkeypatch.setattr(recommendation_service_v2, "_eligible_ids", lambda db, ids: set())
+    assert recommendation_service_v2.get_match_explanation("database-uuid-0", candidate, None) is None
@@ -0,0 +1,147 @@
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from sqlalchemy import func
+
+from database import SessionLocal
+from shared.http_cache import REVALIDATE_CACHE_CONTROL, etag_matches
+
+CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def byte_range(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """Inclusive (start, end) selected by a single-range ``Range`` header, or None for the whole body
+
+    Malformed and multi-range headers are ignored, which RFC 9110 permits.
+    Raises RangeNotSatisfiable when the range starts past the end.
+    """
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None
+    first, separator, last = spec.partition("-")
+    if not separator:
+        return None
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _selected_range(
+    size: int,
+    etag: str,
+    range_header: Optional[str],
+    if_range: Optional[str],
+    if_none_match: Optional[str],
+) -> Union[Response, tuple[int, int, int, dict]]:
+    """Evaluate the conditional headers: a 304/416 response, or (status, start, end, headers) to send"""
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if if_range is not None and if_range.strip() != etag:
+        range_header = None
+    try:
+        selected = byte_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if selected is None:
+        return 200, 0, size - 1, headers
+    start, end = selected
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return 206, start, end, headers
+
+
+def ranged_response(
+    read: Callable[[int, int], Iterator[bytes]],
+    size: int,
+    etag: str,
+    media_type: str,
+    range_header: Optional[str] = None,
+    if_range: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+) -> Response:
+    """Stream ``read(start, end)`` as a 200, 206, 304 or 416 response
+
+    ``If-Range`` only accepts the current ETag; anything else, including an
+    HTTP date, sends the full body.
+    """
+    selected = _selected_range(size, etag, range_header, if_range, if_none_match)
+    if isinstance(selected, Response):
+        return selected
+    status_code, start, end, headers = selected
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(read(start, end), status_code=status_code, media_type=media_type, headers=headers)
+
+
+def file_chunks(path: Path, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            yield chunk
+            remaining -= len(chunk)
+
+
+def file_response(
+    path: Path,
+    etag: str,
+    media_type: str,
+    range_header: Optional[str] = None,
+    if_range: Optional[str] = None,
+    if_none_match: Optional[str] = None,
+) -> Response:
+    """Serve a stored file like :func:`ranged_response`; whole files go through FileResponse for sendfile"""
+    selected = _selected_range(path.stat().st_size, etag, range_header, if_range, if_none_match)
+    if isinstance(selected, Response):
+        return selected
+    status_code, start, end, headers = selected
+    if status_code == 200:
+        return FileResponse(path, media_type=media_type, headers=headers)
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        file_chunks(path, start, end), status_code=status_code, media_type=media_type, headers=headers
+    )
+
+
+def blob_chunks(column, criteria, start: int, end: int) -> Iterator[bytes]:
+    """Yield bytes ``start..end`` of one binary column value, CHUNK_SIZE at a time
+
+    Each chunk is a separate ``substring`` query, so memory stays bounded
+    whatever the blob size. The body is streamed after the request's session
+    is closed, so this opens its own. ``criteria`` should pin the content
+    hash: if the value is replaced mid-stream the response ends early
+    instead of mixing two versions.
+    """
+    db = SessionLocal()
+    try:
+        position = start
+        while position <= end:
+            length = min(CHUNK_SIZE, end - position + 1)
+            chunk = db.query(func.substring(column, position + 1, length)).filter(*criteria).scalar()
+            if not chunk:
+                return
+            yield bytes(chunk)
+            position += len(chunk)
+    finally:
+        db.close()
@@ -0,0 +1,11 @@
+from shared.http_cache import etag_matches, strong_etag
+
+
+def test_etag_matches_if_none_match():
+    etag = strong_etag("abc")
+
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('"other", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
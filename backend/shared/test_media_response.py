@@ -0,0 +1,34 @@
+import pytest
+
+from shared.media_response import RangeNotSatisfiable, byte_range, ranged_response
+
+
+def test_byte_range_forms():
+    assert byte_range(None, 100) is None
+    assert byte_range("bytes=10-19", 100) == (10, 19)
+    assert byte_range("bytes=90-", 100) == (90, 99)
+    assert byte_range("bytes=-30", 100) == (70, 99)
+    assert byte_range("bytes=50-500", 100) == (50, 99)
+    assert byte_range("bytes=0-1,5-6", 100) is None
+    assert byte_range("items=0-1", 100) is None
+
+
+def test_byte_range_past_end_is_not_satisfiable():
+    with pytest.raises(RangeNotSatisfiable):
+        byte_range("bytes=100-", 100)
+
+
+def test_ranged_response_statuses():
+    def read(start, end):
+        yield bytes(range(start, end + 1))
+
+    etag = '"abc"'
+    assert ranged_response(read, 100, etag, "video/mp4").status_code == 200
+    partial = ranged_response(read, 100, etag, "video/mp4", range_header="bytes=0-9")
+    assert partial.status_code == 206
+    assert partial.headers["content-range"] == "bytes 0-9/100"
+    assert partial.headers["content-length"] == "10"
+    stale = ranged_response(read, 100, etag, "video/mp4", range_header="bytes=0-9", if_range='"old"')
+    assert stale.status_code == 200
+    assert ranged_response(read, 100, etag, "video/mp4", if_none_match=etag).status_code == 304
+    assert ranged_response(read, 100, etag, "video/mp4", range_header="bytes=200-").status_code == 416
@@ -62,9 +62,13 @@ const IntroVideoDisplay: React.FC<IntroVideoDisplayProps> = ({
           return;
         }
 
-        const response = await fetch(`${API_BASE_URL}/api/profile/video/${actualUserId}`, {
+        const streamUrl = `${API_BASE_URL}/api/profile/video/${actualUserId}`;
+
+        // Probe with a one-byte range; the player then streams and seeks with its own range requests
+        const response = await fetch(streamUrl, {
           headers: {
-            'Authorization': `Bearer ${token}`
+            'Authorization': `Bearer ${token}`,
+            'Range': 'bytes=0-0'
           }
         });
 
@@ -77,10 +81,7 @@ const IntroVideoDisplay: React.FC<IntroVideoDisplayProps> = ({
           throw new Error(`Failed to load video: ${response.status}`);
         }
 
-        // Convert response to blob and create object URL
-        const blob = await response.blob();
-        const url = URL.createObjectURL(blob);
-        setVideoUrl(url);
+        setVideoUrl(streamUrl);
 
       } catch (err) {
         console.error('Error loading intro video:', err);
@@ -94,7 +95,7 @@ const IntroVideoDisplay: React.FC<IntroVideoDisplayProps> = ({
 
     // Cleanup function to revoke object URL
     return () => {
-      if (videoUrl) {
+      if (videoUrl?.startsWith('blob:')) {
         URL.revokeObjectURL(videoUrl);
       }
     };
@@ -103,7 +104,7 @@ const IntroVideoDisplay: React.FC<IntroVideoDisplayProps> = ({
   // Cleanup object URL when component unmounts
   useEffect(() => {
     return () => {
-      if (videoUrl) {
+      if (videoUrl?.startsWith('blob:')) {
         URL.revokeObjectURL(videoUrl);
       }
     };
@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useRef } from "react";
 import { Link, useNavigate } from "react-router-dom";
-import { interestApi, notificationApi } from "../services/api";
+import { interestApi, notificationApi, mediaUrl } from "../services/api";
 
 interface Notification {
   id: string;
@@ -285,7 +285,7 @@ const NotificationDropdown: React.FC = () => {
                           <div className="flex-shrink-0 mr-3">
                             <img
                               className="h-10 w-10 rounded-full object-cover"
-                              src={notification.from_user.profile_picture}
+                              src={mediaUrl(notification.from_user.profile_picture)}
                               alt={notification.from_user.name || "User"}
                             />
                           </div>
@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import { interestApi, trustSafetyApi } from "../services/api";
+import { interestApi, trustSafetyApi, mediaUrl } from "../services/api";
 import { useNavigate } from "react-router-dom";
 
 type MatchExplanationRow = {
@@ -549,7 +549,7 @@ const FindMatches: React.FC = () => {
                     <div key={user.id} className="flex items-center justify-between rounded-lg border border-gray-200 px-4 py-3">
                       <div className="flex items-center gap-3">
                         {user.profile_picture ? (
-                          <img src={user.profile_picture} alt={user.name} className="h-12 w-12 rounded-full object-cover" />
+                          <img src={mediaUrl(user.profile_picture)} alt={user.name} className="h-12 w-12 rounded-full object-cover" />
                         ) : (
                           <div className="h-12 w-12 rounded-full bg-indigo-100 text-indigo-700 flex items-center justify-center font-semibold">
                             {user.name.charAt(0)}
@@ -597,7 +597,7 @@ const FindMatches: React.FC = () => {
                     <div className="relative">
                       {user.profile_picture ? (
                         <img 
-                          src={user.profile_picture} 
+                          src={mediaUrl(user.profile_picture)} 
                           alt={`${user.name}'s profile`}
                           className="h-48 w-full object-cover object-center"
                           onError={(e) => {
@@ -816,7 +816,7 @@ const FindMatches: React.FC = () => {
                 <div className="flex items-center gap-4">
                   {selectedUser.profile_picture ? (
                     <img 
-                      src={selectedUser.profile_picture} 
+                      src={mediaUrl(selectedUser.profile_picture)} 
                       alt={selectedUser.name}
                       className="w-16 h-16 rounded-full object-cover border-4 border-white shadow-lg"
                     />
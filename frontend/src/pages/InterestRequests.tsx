@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from "react";
-import { interestApi } from "../services/api";
+import { interestApi, mediaUrl } from "../services/api";
 import { useNavigate } from "react-router-dom";
 
 interface Interest {
@@ -206,7 +206,7 @@ const InterestRequests: React.FC = () => {
           <div className="flex-shrink-0 mr-4">
             {user.profile_picture ? (
               <img
-                src={user.profile_picture}
+                src={mediaUrl(user.profile_picture)}
                 alt={user.name}
                 className="h-16 w-16 rounded-full object-cover"
                 onError={(e) => {
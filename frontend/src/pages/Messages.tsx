@@ -1,6 +1,6 @@
 import React, { useEffect, useMemo, useRef, useState } from 'react';
 import { useSearchParams } from 'react-router-dom';
-import { API_BASE_URL, getAccessToken, messageApi, trustSafetyApi } from '../services/api';
+import { API_BASE_URL, getAccessToken, messageApi, trustSafetyApi, mediaUrl } from '../services/api';
 
 type ChatUser = {
   id: string;
@@ -328,7 +328,7 @@ const Messages: React.FC = () => {
                     >
                       <div className="flex items-center gap-3">
                         {conv.user.profile_picture ? (
-                          <img src={conv.user.profile_picture} alt={conv.user.name} className="h-10 w-10 rounded-full object-cover" />
+                          <img src={mediaUrl(conv.user.profile_picture)} alt={conv.user.name} className="h-10 w-10 rounded-full object-cover" />
                         ) : (
                           <div className="h-10 w-10 rounded-full bg-indigo-100 text-indigo-700 flex items-center justify-center font-semibold">
                             {conv.user.name.charAt(0)}
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
-import { interestApi, notificationApi } from "../services/api";
+import { interestApi, notificationApi, mediaUrl } from "../services/api";
 
 // Define notification types from backend
 interface Notification {
@@ -358,7 +358,7 @@ const Notifications: React.FC = () => {
                         <div className="flex-shrink-0">
                           {notification.from_user?.profile_picture ? (
                             <img
-                              src={notification.from_user.profile_picture}
+                              src={mediaUrl(notification.from_user.profile_picture)}
                               alt={notification.from_user.name}
                               className="h-14 w-14 rounded-[1.1rem] object-cover shadow-[0_12px_24px_rgba(136,65,89,0.14)]"
                               onError={(e) => {
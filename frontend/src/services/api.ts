@@ -1,6 +1,12 @@
 // API Service for backend communication
 export const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000';
 
+// Media paths in API responses are relative to the backend origin
+export const mediaUrl = (path: string | null | undefined): string | undefined => {
+  if (!path) return undefined;
+  return path.startsWith('/') ? `${API_BASE_URL}${path}` : path;
+};
+
 export const getAccessToken = (): string | null => {
   return localStorage.getItem('accessToken');
 };